@@ -0,0 +1,52 @@
+"""
+Configuração do gunicorn: ``gunicorn -c config/gunicorn.conf.py``.
+
+``SERVIDOR_MODO`` escolhe como o projeto é servido:
+
+- ``wsgi`` (padrão): workers síncronos; cada requisição ocupa um worker
+  inteiro, inclusive enquanto espera o banco;
+- ``asgi``: workers uvicorn com as views assíncronas do portal (a
+  comparação medida está no README, "Modo WSGI ou ASGI").
+
+Recusa o cache de páginas ``locmem`` (por processo) com mais de um worker.
+Ao iniciar, apaga as métricas gravadas pelos workers da execução anterior
+(``portal.metricas``).
+"""
+import glob
+import os
+
+import decouple
+
+modo = os.environ.get('SERVIDOR_MODO', 'wsgi')
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+timeout = 120
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+
+if modo == 'asgi':
+    worker_class = 'uvicorn_worker.UvicornWorker'
+    wsgi_app = 'config.asgi:application'
+elif modo == 'wsgi':
+    wsgi_app = 'config.wsgi:application'
+else:
+    raise RuntimeError(f'SERVIDOR_MODO inválido: {modo} (use wsgi ou asgi)')
+
+# O cache locmem é por processo: as invalidações não chegariam aos outros workers
+if (workers > 1 and decouple.config('CACHE_PAGINAS_ATIVO', default=True, cast=bool)
+        and decouple.config('CACHE_PAGINAS_BACKEND', default='locmem') == 'locmem'):
+    raise RuntimeError(
+        f'CACHE_PAGINAS_BACKEND=locmem com {workers} workers: use arquivo ou banco (ou GUNICORN_WORKERS=1)'
+    )
+
+
+# Mesmo padrão de config/settings.py (o nome ``config`` é uma configuração do gunicorn)
+diretorio_metricas = decouple.config(
+    'METRICAS_DIRETORIO', default=os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache', 'metricas')
+)
+
+
+def on_starting(server):
+    for caminho in glob.glob(os.path.join(diretorio_metricas, '*.json*')):
+        os.remove(caminho)
@@ -42,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primeiro: mede os demais middlewares e a view (portal.metricas)
+    'portal.metricas.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -49,13 +51,18 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Cookie que fixa no primário quem acabou de escrever (a réplica é escolhida em @ler_de_replica)
+    'portal.replicas.ReplicasMiddleware',
+    # Só ativo em DEBUG; deve ficar por último (executa a view em process_view)
+    'portal.middleware.OrcamentoConsultasMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que mede o tempo de renderização para as métricas
+        'BACKEND': 'portal.metricas.TemplatesMedidos',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -63,6 +70,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'portal.context_processors.site',
             ],
         },
     },
@@ -97,6 +105,68 @@ else:
         }
     }
 
+# Réplicas de leitura das páginas públicas (portal.replicas), separadas por
+# vírgula: host[:porta] no PostgreSQL, arquivo no SQLite
+DB_REPLICAS = config('DB_REPLICAS', default='', cast=Csv())
+REPLICAS = []
+for _indice, _replica in enumerate(DB_REPLICAS, 1):
+    if DB_ENGINE == 'django.db.backends.postgresql':
+        _host, _, _porta = _replica.partition(':')
+        _conexao = {'HOST': _host, 'PORT': int(_porta or DATABASES['default']['PORT'])}
+    else:
+        _conexao = {'NAME': _replica}
+    # Nos testes a réplica é o próprio banco de teste do default
+    DATABASES[f'replica{_indice}'] = {**DATABASES['default'], **_conexao, 'TEST': {'MIRROR': 'default'}}
+    REPLICAS.append(f'replica{_indice}')
+
+DATABASE_ROUTERS = ['portal.replicas.RoteadorReplicas']
+# Segundos em que as leituras ficam no primário depois de uma escrita
+REPLICAS_JANELA = config('REPLICAS_JANELA', default=10, cast=int)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# Backend do cache de páginas (portal.cache_paginas): locmem, arquivo ou banco.
+# locmem é por processo: só para um processo (runserver, testes). Com vários
+# workers use arquivo ou banco para compartilhar as invalidações (o
+# config/gunicorn.conf.py recusa locmem com mais de um worker); o backend
+# banco exige `python manage.py createcachetable`.
+CACHE_PAGINAS_BACKEND = config('CACHE_PAGINAS_BACKEND', default='locmem')
+CACHE_PAGINAS_ATIVO = config('CACHE_PAGINAS_ATIVO', default=True, cast=bool)
+CACHE_PAGINAS_TIMEOUT = config('CACHE_PAGINAS_TIMEOUT', default=300, cast=int)
+
+# Intervalo, em segundos, entre as verificações de versão do contexto do site
+# (configuração e temas da navegação) guardado em memória por processo
+CONTEXTO_SITE_VERIFICACAO = config('CONTEXTO_SITE_VERIFICACAO', default=5, cast=int)
+# Segundos após os quais o contexto do site é recarregado mesmo sem mudança de versão
+CONTEXTO_SITE_TTL = config('CONTEXTO_SITE_TTL', default=300, cast=int)
+
+_BACKENDS_CACHE_PAGINAS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'paginas',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    'arquivo': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('CACHE_PAGINAS_DIRETORIO', default=str(BASE_DIR / 'cache' / 'paginas')),
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+    'banco': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'portal_cache_paginas',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'paginas': _BACKENDS_CACHE_PAGINAS[CACHE_PAGINAS_BACKEND],
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -138,6 +208,23 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
 
+# Em produção o collectstatic grava nomes com hash do conteúdo, o manifesto e
+# as cópias .gz/.br que o nginx entrega direto (portal.estaticos). Exige rodar
+# o collectstatic antes de servir; fica desligado no desenvolvimento e nos testes.
+ESTATICOS_COMPRIMIDOS = config('ESTATICOS_COMPRIMIDOS', default=False, cast=bool)
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'portal.estaticos.ArmazenamentoEstaticoComprimido' if ESTATICOS_COMPRIMIDOS
+            else 'django.contrib.staticfiles.storage.StaticFilesStorage'
+        ),
+    },
+}
+
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
@@ -151,7 +238,70 @@ EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = config('EMAIL_FROM', default='noreply@portal.com')
 SERVER_EMAIL = config('EMAIL_FROM', default='noreply@portal.com')
 
+# Orçamento de consultas por view (portal.orcamento), verificado em DEBUG:
+# com True a requisição que exceder o orçamento falha, senão gera um aviso no log
+ORCAMENTO_CONSULTAS_ESTRITO = config('ORCAMENTO_CONSULTAS_ESTRITO', default=False, cast=bool)
+
+# Contador de visualizações (portal.visualizacoes)
+# Intervalo, em segundos, entre as gravações em lote; 0 desativa a thread
+VISUALIZACOES_INTERVALO_FLUSH = config('VISUALIZACOES_INTERVALO_FLUSH', default=10, cast=int)
+# Quantidade de editoriais distintos no buffer que antecipa a gravação
+VISUALIZACOES_LIMITE_BUFFER = config('VISUALIZACOES_LIMITE_BUFFER', default=1000, cast=int)
+
+# Editoriais relacionados pré-calculados (portal.relacionados)
+# Quantos ficam guardados por editorial e quantos candidatos são avaliados
+RELACIONADOS_QUANTIDADE = config('RELACIONADOS_QUANTIDADE', default=8, cast=int)
+RELACIONADOS_CANDIDATOS = config('RELACIONADOS_CANDIDATOS', default=500, cast=int)
+
+# Variantes redimensionadas das imagens (portal.imagens)
+IMAGENS_LARGURAS = tuple(
+    int(largura) for largura in config('IMAGENS_LARGURAS', default='320,640,1024,1600').split(',')
+)
+IMAGENS_QUALIDADE = config('IMAGENS_QUALIDADE', default=80, cast=int)
+# Processos que geram as variantes; 0 gera no próprio processo, após o commit
+IMAGENS_WORKERS = config('IMAGENS_WORKERS', default=2, cast=int)
+
+# Envio de newsletter (portal.newsletter)
+# Lotes enviados em paralelo, cada um por uma única conexão SMTP
+NEWSLETTER_WORKERS = config('NEWSLETTER_WORKERS', default=4, cast=int)
+NEWSLETTER_LOTE = config('NEWSLETTER_LOTE', default=100, cast=int)
+# Limite de mensagens por segundo somando todos os workers; 0 desativa
+NEWSLETTER_TAXA = config('NEWSLETTER_TAXA', default=10, cast=float)
+# Tentativas por destinatário em falhas temporárias e espera base entre rodadas
+NEWSLETTER_MAX_TENTATIVAS = config('NEWSLETTER_MAX_TENTATIVAS', default=3, cast=int)
+NEWSLETTER_INTERVALO_TENTATIVAS = config('NEWSLETTER_INTERVALO_TENTATIVAS', default=30, cast=int)
+# Segundos sem sinal de vida para um envio em andamento ser retomado por outro processo
+NEWSLETTER_TIMEOUT_ENVIO = config('NEWSLETTER_TIMEOUT_ENVIO', default=600, cast=int)
+# Processa os envios criados pelo admin em threads do próprio servidor (só para
+# desenvolvimento); por padrão ficam para `enviar_newsletter --daemon`
+NEWSLETTER_ENVIO_AUTOMATICO = config('NEWSLETTER_ENVIO_AUTOMATICO', default=False, cast=bool)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Métricas das requisições (portal.metricas): cabeçalho Server-Timing e /metrics
+METRICAS_ATIVO = config('METRICAS_ATIVO', default=True, cast=bool)
+METRICAS_SERVER_TIMING = config('METRICAS_SERVER_TIMING', default=True, cast=bool)
+# Cada processo grava ali as suas métricas a cada METRICAS_INTERVALO segundos;
+# precisa ser o mesmo para todos os workers (o gunicorn o limpa ao iniciar)
+METRICAS_DIRETORIO = config('METRICAS_DIRETORIO', default=str(BASE_DIR / 'cache' / 'metricas'))
+METRICAS_INTERVALO = config('METRICAS_INTERVALO', default=5, cast=int)
+# Se definido, /metrics exige o cabeçalho "Authorization: Bearer <token>";
+# sem ele, só usuários da equipe (is_staff) acessam
+METRICAS_TOKEN = config('METRICAS_TOKEN', default='')
+
+# Páginas públicas exportadas para HTML estático (portal.exportacao), servidas
+# pelo nginx; com EXPORTACAO_ATIVA cada alteração regenera as páginas afetadas
+EXPORTACAO_DIRETORIO = config('EXPORTACAO_DIRETORIO', default=str(BASE_DIR / 'exportado'))
+EXPORTACAO_ATIVA = config('EXPORTACAO_ATIVA', default=False, cast=bool)
+
+# Listagens do admin (portal.admin_listas): a partir dessa quantidade de linhas,
+# no PostgreSQL, o total das listagens sem filtro é estimado; 0 conta sempre
+ADMIN_CONTAGEM_ESTIMADA = config('ADMIN_CONTAGEM_ESTIMADA', default=100000, cast=int)
+
+# Sitemaps (portal.sitemaps) e feeds RSS/Atom (portal.feeds): URLs por arquivo
+# de sitemap (até 50.000) e editoriais por feed
+SITEMAP_TAMANHO = config('SITEMAP_TAMANHO', default=50000, cast=int)
+FEEDS_ITENS = config('FEEDS_ITENS', default=20, cast=int)
@@ -0,0 +1,12 @@
+# config/settings_testes.py
+# Configurações da suíte de testes: python manage.py test --settings=config.settings_testes
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES, DB_ENGINE
+
+# Um segundo banco independente faz o papel de réplica
+# (portal.tests.ReplicasTests, com override_settings(REPLICAS=...))
+DATABASES['replica_teste'] = {
+    **DATABASES['default'],
+    'TEST': {'NAME': None if DB_ENGINE == 'django.db.backends.sqlite3' else f"test_{DATABASES['default']['NAME']}_replica"},
+}
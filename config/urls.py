@@ -19,9 +19,11 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from config.health import HealthCheckView
+from portal import metricas
 
 urlpatterns = [
     path('health/', HealthCheckView.as_view(), name='health'),
+    path('metrics', metricas.exportar, name='metricas'),
     path('admin/', admin.site.urls),
     path('', include('portal.urls')),
 ]
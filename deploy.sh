@@ -38,7 +38,7 @@ docker-compose exec -T django python manage.py collectstatic --noinput
 # Run tests
 if [ "$ENVIRONMENT" != "production" ]; then
     echo "🧪 Running tests..."
-    docker-compose exec -T django python manage.py test --verbosity=2
+    docker-compose exec -T django python manage.py test --settings=config.settings_testes --verbosity=2
 fi
 
 echo "✅ Deploy to $ENVIRONMENT complete!"
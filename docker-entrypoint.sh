@@ -10,8 +10,11 @@ echo "PostgreSQL está pronto!"
 echo "Executando migrations..."
 python manage.py migrate --noinput
 
+echo "Criando tabela do cache de páginas (se configurado)..."
+python manage.py createcachetable
+
 echo "Coletando arquivos estáticos..."
 python manage.py collectstatic --noinput
 
-echo "Iniciando Gunicorn..."
-exec gunicorn --bind 0.0.0.0:8000 --workers 4 --timeout 120 --access-logfile - --error-logfile - config.wsgi:application
+echo "Iniciando Gunicorn (modo ${SERVIDOR_MODO:-wsgi})..."
+exec gunicorn -c config/gunicorn.conf.py
@@ -1,9 +1,13 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.utils import timezone
-from django.core.mail import send_mass_mail
+from django.conf import settings
 from django.contrib import messages
-from .models import Tema, Editorial, Autor, ConfiguracaoSite, Newsletter
+from django.db import transaction
+from django.db.models import Prefetch
+from . import newsletter
+from .admin_listas import FiltroAutocomplete, ListagemRapidaMixin
+from .models import Tema, Editorial, Autor, ConfiguracaoSite, Newsletter, EnvioNewsletter
 
 
 @admin.register(Tema)
@@ -61,9 +65,11 @@ class ConfiguracaoSiteAdmin(admin.ModelAdmin):
 
 
 @admin.register(Editorial)
-class EditorialAdmin(admin.ModelAdmin):
+class EditorialAdmin(ListagemRapidaMixin, admin.ModelAdmin):
     list_display = ['titulo', 'autor', 'status_badge', 'layout', 'estilo', 'data_publicacao', 'visualizacoes', 'acoes']
-    list_filter = ['status', 'layout', 'estilo', 'autor', 'data_criacao', 'ativo']
+    list_filter = ['status', 'layout', 'estilo', ('autor', FiltroAutocomplete), ('temas', FiltroAutocomplete),
+                   'data_criacao', 'ativo']
+    list_select_related = ['autor']
     search_fields = ['titulo', 'texto']
     filter_horizontal = ['temas']
     readonly_fields = ['data_criacao', 'data_atualizacao', 'visualizacoes']
@@ -119,33 +125,28 @@ class EditorialAdmin(admin.ModelAdmin):
     acoes.short_description = 'Ações'
 
     def publicar_agora(self, request, queryset):
-        """Action para publicar imediatamente"""
-        count = 0
-        for editorial in queryset:
-            if editorial.pode_publicar():
-                editorial.publicar_agora()
-                count += 1
+        """Action para publicar imediatamente (um UPDATE para a seleção)"""
+        count = queryset.publicar_agora()
         self.message_user(request, f'{count} editorial(is) publicado(s).')
     publicar_agora.short_description = 'Publicar agora'
 
     def desativar(self, request, queryset):
         """Action para desativar editoriais"""
-        queryset.update(ativo=False, status='desativado')
-        self.message_user(request, 'Editorial(is) desativado(s).')
+        count = queryset.desativar()
+        self.message_user(request, f'{count} editorial(is) desativado(s).')
     desativar.short_description = 'Desativar editorial'
 
     def reativar(self, request, queryset):
         """Action para reativar editoriais"""
-        for editorial in queryset:
-            editorial.reativar()
-        self.message_user(request, 'Editorial(is) reativado(s).')
+        count = queryset.reativar()
+        self.message_user(request, f'{count} editorial(is) reativado(s).')
     reativar.short_description = 'Reativar editorial'
 
 
 @admin.register(Newsletter)
-class NewsletterAdmin(admin.ModelAdmin):
+class NewsletterAdmin(ListagemRapidaMixin, admin.ModelAdmin):
     list_display = ['email', 'temas_display', 'ativo', 'criado_em']
-    list_filter = ['ativo', 'criado_em', 'temas']
+    list_filter = ['ativo', 'criado_em', ('temas', FiltroAutocomplete)]
     search_fields = ['email']
     filter_horizontal = ['temas']
     readonly_fields = ['criado_em', 'atualizado_em']
@@ -164,6 +165,12 @@ class NewsletterAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        # Os temas de todas as linhas da página em uma única consulta
+        return super().get_queryset(request).prefetch_related(
+            Prefetch('temas', queryset=Tema.objects.only('nome').order_by('nome'))
+        )
+
     def temas_display(self, obj):
         """Exibe os temas de forma legível"""
         temas_list = obj.temas.all()
@@ -175,23 +182,61 @@ class NewsletterAdmin(admin.ModelAdmin):
     actions = ['enviar_notificacao_teste']
 
     def enviar_notificacao_teste(self, request, queryset):
-        """Envia email de teste para inscritos"""
-        from django.core.mail import send_mail
-        from decouple import config
-        
-        count = 0
-        for subscriber in queryset:
-            try:
-                send_mail(
-                    'Teste de Notificação - Portal de Notícias',
-                    'Este é um email de teste. Você está inscrito em nossa newsletter!',
-                    config('EMAIL_FROM', default='noreply@portal.com'),
-                    [subscriber.email],
-                    fail_silently=False,
-                )
-                count += 1
-            except Exception as e:
-                self.message_user(request, f'Erro ao enviar para {subscriber.email}: {str(e)}', level=messages.ERROR)
-        
-        self.message_user(request, f'{count} email(is) de teste enviado(s).')
+        """Cria um envio de teste para os inscritos selecionados"""
+        envio = newsletter.criar_envio(
+            'Teste de Notificação - Portal de Notícias',
+            'Este é um email de teste. Você está inscrito em nossa newsletter!',
+            queryset,
+        )
+        if settings.NEWSLETTER_ENVIO_AUTOMATICO:
+            transaction.on_commit(lambda: newsletter.processar_em_segundo_plano(envio.pk))
+            self.message_user(request, f'Envio #{envio.pk} iniciado para {envio.total} inscrito(s).')
+        else:
+            self.message_user(
+                request,
+                f'Envio #{envio.pk} criado para {envio.total} inscrito(s); '
+                'será processado pelo comando enviar_newsletter.'
+            )
     enviar_notificacao_teste.short_description = 'Enviar email de teste'
+
+
+@admin.register(EnvioNewsletter)
+class EnvioNewsletterAdmin(admin.ModelAdmin):
+    list_display = ['assunto', 'status_badge', 'progresso', 'criado_em', 'concluido_em']
+    list_filter = ['status', 'criado_em']
+    search_fields = ['assunto']
+    readonly_fields = [
+        'status', 'total', 'enviados', 'falhas', 'criado_em', 'iniciado_em', 'atualizado_em', 'concluido_em'
+    ]
+    raw_id_fields = ['editorial']
+    actions = ['processar_envios']
+
+    def status_badge(self, obj):
+        """Exibe o status com cores"""
+        colors = {
+            'pendente': '#FFA500',
+            'enviando': '#1E90FF',
+            'concluido': '#008000',
+        }
+        return format_html(
+            '<span style="background-color: {}; color: white; padding: 5px 10px; border-radius: 3px;">{}</span>',
+            colors.get(obj.status, '#000000'),
+            obj.get_status_display()
+        )
+    status_badge.short_description = 'Status'
+
+    def progresso(self, obj):
+        return f'{obj.enviados + obj.falhas}/{obj.total} ({obj.falhas} falha(s))'
+    progresso.short_description = 'Progresso'
+
+    def processar_envios(self, request, queryset):
+        """Processa em segundo plano os envios pendentes ou interrompidos"""
+        if not settings.NEWSLETTER_ENVIO_AUTOMATICO:
+            self.message_user(request, 'Os envios pendentes são processados pelo comando enviar_newsletter.')
+            return
+        disponiveis = set(newsletter.envios_disponiveis())
+        ids = [pk for pk in queryset.values_list('pk', flat=True) if pk in disponiveis]
+        for envio_id in ids:
+            newsletter.processar_em_segundo_plano(envio_id)
+        self.message_user(request, f'{len(ids)} envio(s) em processamento.')
+    processar_envios.short_description = 'Processar / retomar envios selecionados'
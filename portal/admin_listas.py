@@ -0,0 +1,104 @@
+"""
+Listagens do admin para tabelas grandes (editoriais e inscritos).
+
+- ``PaginadorEstimado``: no PostgreSQL, a listagem sem filtros usa a
+  estimativa de linhas das estatísticas da tabela (``pg_class.reltuples``)
+  em vez de um ``COUNT(*)`` sobre a tabela inteira, a partir de
+  ``ADMIN_CONTAGEM_ESTIMADA`` linhas. Com filtro ou busca a contagem é exata.
+- ``FiltroAutocomplete``: filtro lateral por uma relação que mostra uma caixa
+  de busca (o autocomplete do próprio admin) em vez de listar todos os
+  objetos relacionados.
+- ``ListagemRapidaMixin``: junta os dois e desliga a contagem total que o
+  admin faz a cada página filtrada (``show_full_result_count``).
+"""
+from django import forms
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from django.utils.translation import gettext as _
+
+
+def contagem_estimada(queryset):
+    """Linhas estimadas da tabela, ou None se a contagem deve ser exata"""
+    limite = getattr(settings, 'ADMIN_CONTAGEM_ESTIMADA', 0)
+    conexao = connections[queryset.db]
+    consulta = queryset.query
+    if not limite or conexao.vendor != 'postgresql':
+        return None
+    if consulta.where or consulta.distinct or consulta.is_sliced or consulta.combinator:
+        return None
+    with conexao.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table]
+        )
+        linha = cursor.fetchone()
+    # reltuples é -1 enquanto a tabela não foi analisada
+    if linha is None or linha[0] < limite:
+        return None
+    return linha[0]
+
+
+class PaginadorEstimado(Paginator):
+    """Paginator que estima o total das listagens sem filtro de tabelas grandes"""
+
+    @cached_property
+    def count(self):
+        estimativa = contagem_estimada(self.object_list)
+        return super().count if estimativa is None else estimativa
+
+
+class FiltroAutocomplete(admin.RelatedFieldListFilter):
+    """
+    Filtro por uma relação com busca: só o objeto selecionado é carregado.
+    O admin do modelo relacionado precisa de ``search_fields``.
+    """
+    template = 'admin/filtro_autocomplete.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.model_admin_site = model_admin.admin_site
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+    def field_choices(self, field, request, model_admin):
+        if not self.lookup_val:
+            return []
+        return field.get_choices(include_blank=False, limit_choices_to={'pk__in': self.lookup_val})
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        # Só "Todos"; o autocomplete adiciona o parâmetro a essa URL
+        yield {
+            'selected': self.lookup_val is None,
+            'query_string': changelist.get_query_string(remove=[self.lookup_kwarg, self.lookup_kwarg_isnull]),
+            'display': _('All'),
+        }
+
+    def autocomplete(self):
+        campo = forms.ModelChoiceField(
+            queryset=self.field.remote_field.model._default_manager.all(),
+            widget=AutocompleteSelect(self.field, self.model_admin_site),
+            required=False,
+        )
+        valor = self.lookup_val[-1] if self.lookup_val else None
+        return campo.widget.render(self.lookup_kwarg, valor, attrs={'id': f'filtro_{self.lookup_kwarg}'})
+
+
+class ListagemRapidaMixin:
+    """Paginação estimada, sem contagem total e com o JS dos filtros com busca"""
+    paginator = PaginadorEstimado
+    show_full_result_count = False
+
+    @property
+    def media(self):
+        media = super().media
+        for filtro in self.list_filter:
+            if isinstance(filtro, (list, tuple)) and filtro[1] is FiltroAutocomplete:
+                campo = self.model._meta.get_field(filtro[0])
+                media += AutocompleteSelect(campo, self.admin_site).media
+                media += forms.Media(js=['js/admin-filtro-autocomplete.js'])
+                break
+        return media
@@ -0,0 +1,64 @@
+"""
+Publicação dos editoriais agendados.
+
+Os editoriais vencidos (status 'agendado' e data_agendada <= agora) são
+reservados com ``SELECT ... FOR UPDATE SKIP LOCKED`` (no PostgreSQL) e
+publicados com um único UPDATE condicional por lote. Várias réplicas do
+comando ``publicar_agendados`` podem rodar juntas: cada uma pula as linhas
+reservadas pelas outras, e o filtro ``status='agendado'`` no UPDATE impede
+publicação dupla mesmo em bancos sem SKIP LOCKED (SQLite); nesse caso cada
+processo informa (e invalida) só as linhas que o seu UPDATE alterou.
+"""
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Editorial, editoriais_alterados
+
+
+def vencidos(agora=None):
+    """Editoriais agendados cuja data de publicação já chegou"""
+    return Editorial.objects.filter(
+        status='agendado',
+        data_agendada__lte=agora or timezone.now(),
+    )
+
+
+def publicar_lote(tamanho=100, agora=None):
+    """Publica um lote de editoriais vencidos; retorna os ids que este lote de fato publicou"""
+    agora = agora or timezone.now()
+    with transaction.atomic():
+        fila = vencidos(agora).order_by('data_agendada')
+        if connection.features.has_select_for_update_skip_locked:
+            fila = fila.select_for_update(skip_locked=True)
+        ids = list(fila.values_list('pk', flat=True)[:tamanho])
+        if not ids:
+            return []
+
+        # A data de publicação é a agendada, não a hora em que o lote rodou
+        publicados = Editorial.objects.filter(pk__in=ids, status='agendado').update(
+            status='publicado',
+            data_publicacao=F('data_agendada'),
+            agendado=False,
+            data_atualizacao=agora,
+        )
+        if publicados < len(ids):
+            # Sem SKIP LOCKED outro processo pode ter publicado parte do lote:
+            # ficam só as linhas que este UPDATE alterou (marcadas com ``agora``)
+            ids = list(
+                Editorial.objects.filter(pk__in=ids, status='publicado', data_atualizacao=agora)
+                .order_by('data_agendada').values_list('pk', flat=True)
+            )
+        if ids:
+            editoriais_alterados.send(sender=Editorial, ids=ids)
+    return ids
+
+
+def publicar_vencidos(tamanho=100, agora=None):
+    """Publica todos os editoriais vencidos, lote a lote; retorna o total"""
+    total = 0
+    # Um lote menor que ``tamanho`` não indica o fim da fila: outro processo
+    # pode ter publicado parte dele
+    while ids := publicar_lote(tamanho, agora):
+        total += len(ids)
+    return total
@@ -0,0 +1,317 @@
+"""
+API JSON pública, somente leitura, em ``/api/v1/``: editoriais, temas e autores.
+
+- ``fields=id,titulo,...`` escolhe os campos (sparse fieldsets); só as colunas
+  necessárias são lidas, então as listagens nunca carregam o ``texto``, a
+  menos que ele seja pedido.
+- As listagens são paginadas por cursor (``portal.paginacao``): ``proxima`` e
+  ``anterior`` trazem a URL da página seguinte/anterior, e ``limite`` define
+  o tamanho da página (até ``LIMITE_MAXIMO``).
+- Editoriais podem ser filtrados por ``tema`` (slug), ``autor`` (apelido) e
+  data de publicação (``desde``/``ate``, data ou data e hora ISO 8601).
+- As consultas usam ``values()`` (sem instanciar modelos) e a resposta é
+  serializada com o ``orjson``, se instalado. As respostas ficam no cache de
+  páginas, com ETag e Last-Modified, e expiram nas mesmas publicações que as
+  páginas HTML.
+"""
+import json
+from datetime import datetime, time
+
+from asgiref.sync import sync_to_async
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.http import require_http_methods
+
+from . import cache_paginas, paginacao
+from .cache_paginas import cache_pagina
+from .contexto import contexto
+from .models import Autor, Editorial
+from .orcamento import orcamento_consultas
+from .replicas import ler_de_replica
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+LIMITE_PADRAO = 20
+LIMITE_MAXIMO = 100
+
+
+class ErroApi(Exception):
+    """Parâmetro inválido: vira uma resposta 400"""
+
+
+def resposta_json(dados, status=200):
+    if orjson is not None:
+        conteudo = orjson.dumps(dados)
+    else:
+        conteudo = json.dumps(dados, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+    return HttpResponse(conteudo, content_type='application/json', status=status)
+
+
+def campos_pedidos(request, disponiveis, padrao):
+    """Campos do parâmetro ``fields``, na ordem pedida (``padrao`` se ausente)"""
+    valor = request.GET.get('fields', '')
+    pedidos = list(dict.fromkeys(campo.strip() for campo in valor.split(',') if campo.strip()))
+    if not pedidos:
+        return list(padrao)
+    desconhecidos = [campo for campo in pedidos if campo not in disponiveis]
+    if desconhecidos:
+        raise ErroApi(f'Campos desconhecidos: {", ".join(desconhecidos)} (disponíveis: {", ".join(disponiveis)})')
+    return pedidos
+
+
+def limite(request):
+    valor = request.GET.get('limite', '')
+    if not valor:
+        return LIMITE_PADRAO
+    # isdecimal(): isdigit() aceita '²', que int() recusa
+    if not valor.isdecimal() or not 1 <= int(valor) <= LIMITE_MAXIMO:
+        raise ErroApi(f'limite deve ser um número entre 1 e {LIMITE_MAXIMO}')
+    return int(valor)
+
+
+def instante(request, parametro, fim_do_dia=False):
+    """Data/hora do parâmetro; uma data sozinha vale o início do dia (o fim, em ``ate``)"""
+    valor = request.GET.get(parametro, '')
+    if not valor:
+        return None
+    try:
+        # parse_datetime também aceita uma data sozinha: a data é testada antes
+        data = parse_date(valor)
+        if data is not None:
+            resultado = datetime.combine(data, time.max if fim_do_dia else time.min)
+        else:
+            resultado = parse_datetime(valor)
+            if resultado is None:
+                raise ValueError
+    except ValueError:
+        raise ErroApi(f'{parametro} deve ser uma data ou data e hora ISO 8601')
+    if timezone.is_naive(resultado):
+        resultado = timezone.make_aware(resultado)
+    return resultado
+
+
+def _url_midia(caminho):
+    return default_storage.url(caminho) if caminho else None
+
+
+def _pagina(request, janela, por_pagina):
+    """Itens da página do cursor e as URLs vizinhas"""
+    pagina = paginacao.PaginadorCursor(janela, por_pagina).pagina(request.GET.get(paginacao.PARAMETRO), request)
+    return pagina.object_list, {
+        'proxima': request.path + pagina.url_proxima if pagina.has_next() else None,
+        'anterior': request.path + pagina.url_anterior if pagina.has_previous() else None,
+    }
+
+
+class JanelaValores(paginacao.JanelaQuerySet):
+    """JanelaQuerySet de um queryset ``values()``: a chave vem do dicionário"""
+
+    def chave(self, objeto):
+        return tuple(objeto[campo] for campo in self.campos)
+
+
+# Campo da API -> colunas lidas com values()
+COLUNAS_EDITORIAL = {
+    'id': ['id'],
+    'titulo': ['titulo'],
+    'texto': ['texto'],
+    'url': ['id'],
+    'autor': ['autor__apelido', 'autor__nome_completo'],
+    'temas': [],
+    'layout': ['layout'],
+    'estilo': ['estilo'],
+    'data_publicacao': ['data_publicacao'],
+    'data_atualizacao': ['data_atualizacao'],
+}
+CAMPOS_LISTA_EDITORIAL = ('id', 'titulo', 'url', 'autor', 'temas', 'data_publicacao')
+
+
+def _temas_dos_editoriais(ids):
+    """{id do editorial: [{slug, nome}]} em uma consulta"""
+    temas = {}
+    linhas = Editorial.temas.through.objects.filter(editorial_id__in=ids).order_by('tema__nome').values_list(
+        'editorial_id', 'tema__slug', 'tema__nome'
+    )
+    for editorial_id, slug, nome in linhas:
+        temas.setdefault(editorial_id, []).append({'slug': slug, 'nome': nome})
+    return temas
+
+
+def _editoriais(linhas, campos):
+    """Monta os editoriais da resposta a partir das linhas de values()"""
+    temas = _temas_dos_editoriais([linha['id'] for linha in linhas]) if 'temas' in campos else {}
+    resultado = []
+    for linha in linhas:
+        item = {}
+        for campo in campos:
+            if campo == 'url':
+                item['url'] = reverse('portal:detalhe', args=[linha['id']])
+            elif campo == 'autor':
+                apelido = linha['autor__apelido']
+                item['autor'] = {'apelido': apelido, 'nome': linha['autor__nome_completo']} if apelido else None
+            elif campo == 'temas':
+                item['temas'] = temas.get(linha['id'], [])
+            else:
+                item[campo] = linha[campo]
+        resultado.append(item)
+    return resultado
+
+
+def _colunas(campos, tabela, chave=('id',)):
+    return list(dict.fromkeys([*chave, *(coluna for campo in campos for coluna in tabela[campo])]))
+
+
+def listar_editoriais(request):
+    campos = campos_pedidos(request, COLUNAS_EDITORIAL, CAMPOS_LISTA_EDITORIAL)
+    por_pagina = limite(request)
+    queryset = Editorial.objects.publicados()
+    if request.GET.get('tema'):
+        # Um único tema não gera duplicatas (editorial/tema é único)
+        queryset = queryset.filter(temas__slug=request.GET['tema'])
+    if request.GET.get('autor'):
+        queryset = queryset.filter(autor__apelido=request.GET['autor'])
+    desde, ate = instante(request, 'desde'), instante(request, 'ate', fim_do_dia=True)
+    if desde:
+        queryset = queryset.filter(data_publicacao__gte=desde)
+    if ate:
+        queryset = queryset.filter(data_publicacao__lte=ate)
+
+    valores = queryset.values(*_colunas(campos, COLUNAS_EDITORIAL, ('id', 'data_publicacao')))
+    linhas, links = _pagina(request, JanelaValores(valores), por_pagina)
+    return {'resultados': _editoriais(linhas, campos), **links}
+
+
+def obter_editorial(request, pk):
+    campos = campos_pedidos(request, COLUNAS_EDITORIAL, COLUNAS_EDITORIAL)
+    colunas = _colunas(campos, COLUNAS_EDITORIAL, ('id', 'autor_id'))
+    linha = Editorial.objects.publicados().filter(pk=pk).values(*colunas).first()
+    if linha is None:
+        return None
+    cache_paginas.marcar(request, f'editorial:{pk}')
+    if linha['autor_id']:
+        cache_paginas.marcar(request, f'autor:{linha["autor_id"]}')
+    return _editoriais([linha], campos)[0]
+
+
+COLUNAS_AUTOR = {
+    'id': ['id'],
+    'apelido': ['apelido'],
+    'nome': ['nome_completo'],
+    'resumo': ['resumo'],
+    'url': ['apelido'],
+    'foto': ['foto'],
+    'twitter': ['twitter'],
+    'linkedin': ['linkedin'],
+    'instagram': ['instagram'],
+    'facebook': ['facebook'],
+    'website': ['website'],
+}
+CAMPOS_LISTA_AUTOR = ('id', 'apelido', 'nome', 'url')
+
+
+def _autores(linhas, campos):
+    resultado = []
+    for linha in linhas:
+        item = {}
+        for campo in campos:
+            if campo == 'nome':
+                item['nome'] = linha['nome_completo']
+            elif campo == 'url':
+                item['url'] = reverse('portal:detalhe_autor', args=[linha['apelido']])
+            elif campo == 'foto':
+                item['foto'] = _url_midia(linha['foto'])
+            else:
+                item[campo] = linha[campo]
+        resultado.append(item)
+    return resultado
+
+
+def listar_autores(request):
+    campos = campos_pedidos(request, COLUNAS_AUTOR, CAMPOS_LISTA_AUTOR)
+    valores = Autor.objects.filter(ativo=True).values(*_colunas(campos, COLUNAS_AUTOR))
+    linhas, links = _pagina(request, JanelaValores(valores, ordenacao=('id',)), limite(request))
+    return {'resultados': _autores(linhas, campos), **links}
+
+
+def obter_autor(request, apelido):
+    campos = campos_pedidos(request, COLUNAS_AUTOR, COLUNAS_AUTOR)
+    linha = Autor.objects.filter(ativo=True, apelido=apelido).values(*_colunas(campos, COLUNAS_AUTOR)).first()
+    if linha is None:
+        return None
+    cache_paginas.marcar(request, f'autor:{linha["id"]}')
+    return _autores([linha], campos)[0]
+
+
+CAMPOS_TEMA = ('id', 'nome', 'slug', 'descricao', 'url')
+
+
+def listar_temas(request):
+    campos = campos_pedidos(request, CAMPOS_TEMA, CAMPOS_TEMA)
+    resultado = []
+    # Os temas ativos já estão em memória (portal.contexto)
+    for tema in contexto.temas():
+        item = {campo: getattr(tema, campo) for campo in campos if campo != 'url'}
+        if 'url' in campos:
+            item['url'] = reverse('portal:tema', args=[tema.slug])
+        resultado.append({campo: item[campo] for campo in campos})
+    return {'resultados': resultado}
+
+
+async def _responder(funcao, request, *args):
+    try:
+        dados = await sync_to_async(funcao)(request, *args)
+    except ErroApi as erro:
+        return resposta_json({'error': str(erro)}, status=400)
+    if dados is None:
+        return resposta_json({'error': 'Não encontrado'}, status=404)
+    return resposta_json(dados)
+
+
+@ler_de_replica
+@orcamento_consultas(2)
+@require_http_methods(["GET"])
+@cache_pagina('home')
+async def editoriais(request):
+    """Editoriais publicados, do mais recente ao mais antigo"""
+    return await _responder(listar_editoriais, request)
+
+
+@ler_de_replica
+@orcamento_consultas(2)
+@require_http_methods(["GET"])
+@cache_pagina()
+async def editorial(request, pk):
+    return await _responder(obter_editorial, request, pk)
+
+
+@ler_de_replica
+@orcamento_consultas(1)
+@require_http_methods(["GET"])
+@cache_pagina('autores')
+async def autores(request):
+    """Autores ativos, por id"""
+    return await _responder(listar_autores, request)
+
+
+@ler_de_replica
+@orcamento_consultas(1)
+@require_http_methods(["GET"])
+@cache_pagina()
+async def autor(request, apelido):
+    return await _responder(obter_autor, request, apelido)
+
+
+@ler_de_replica
+@orcamento_consultas(0)
+@require_http_methods(["GET"])
+@cache_pagina()
+async def temas(request):
+    """Temas ativos (dependem só da tag ``navegacao``, padrão de todas as páginas)"""
+    return await _responder(listar_temas, request)
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class PortalConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'portal'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import cache_paginas, exportacao, metricas, signals  # noqa: F401
+
+        connection_created.connect(metricas.instalar_em_conexao, dispatch_uid='portal.metricas')
+        cache_paginas.paginas_invalidadas.connect(exportacao.regenerar, dispatch_uid='portal.exportacao')
@@ -0,0 +1,326 @@
+"""
+Busca textual dos editoriais.
+
+Cada Editorial possui um DocumentoBusca (título, nomes dos temas e texto),
+mantido atualizado pelos sinais em ``portal.signals``. O índice sobre esse
+documento depende do banco:
+
+- PostgreSQL: coluna gerada ``vetor`` (tsvector com a configuração
+  ``portal_pt`` = portuguese + unaccent) e índice GIN;
+- SQLite: tabela virtual FTS5 sincronizada por triggers (desenvolvimento).
+
+As duas implementações devolvem os editoriais publicados ordenados por
+relevância, com um trecho destacado em ``editorial.trecho``.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+# Marcadores usados pelo banco ao destacar os termos encontrados; são trocados
+# por <mark> depois que o trecho é escapado.
+INICIO_DESTAQUE = '\x02'
+FIM_DESTAQUE = '\x03'
+
+TAMANHO_LOTE = 500
+
+FILTRO_PUBLICADOS = 'e.status = %s AND e.ativo = %s AND e.data_publicacao <= %s'
+
+
+def formatar_trecho(trecho):
+    """Escapa o trecho e converte os marcadores de destaque em <mark>"""
+    if not trecho:
+        return ''
+    html = escape(trecho).replace(INICIO_DESTAQUE, '<mark>').replace(FIM_DESTAQUE, '</mark>')
+    return mark_safe(html)
+
+
+class ResultadoBusca:
+    """
+    Resultado de uma busca, ordenado por relevância.
+
+    Implementa ``count()`` e fatiamento para ser usado com o Paginator:
+    cada fatia executa uma consulta limitada e carrega só os editoriais
+    daquela página.
+    """
+
+    def __init__(self, backend, termo):
+        self.backend = backend
+        self.termo = termo
+        self._total = None
+
+    def count(self):
+        if self._total is None:
+            self._total = self.backend.contar(self.termo)
+        return self._total
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[0:self.count()])
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            inicio = indice.start or 0
+            fim = indice.stop if indice.stop is not None else self.count()
+            if fim <= inicio:
+                return []
+            return self.backend.pagina(self.termo, inicio, fim - inicio)
+        resultado = self[indice:indice + 1]
+        if not resultado:
+            raise IndexError('Índice fora do resultado da busca')
+        return resultado[0]
+
+    # Paginação por cursor (portal.paginacao): chave = (relevância, data, id)
+
+    def chave(self, editorial):
+        return (editorial.relevancia, editorial.data_publicacao, editorial.pk)
+
+    def converter_chave(self, valores):
+        relevancia, data, pk = valores
+        data = parse_datetime(data)
+        if data is None:
+            raise ValueError('Data inválida no cursor')
+        return float(relevancia), data, int(pk)
+
+    def janela(self, chave, quantidade, reverso=False):
+        return self.backend.janela(self.termo, chave, quantidade, reverso)
+
+
+class BackendBusca:
+    """Base dos backends de busca textual"""
+
+    def buscar(self, termo):
+        return ResultadoBusca(self, termo)
+
+    def contar(self, termo):
+        raise NotImplementedError
+
+    def pagina(self, termo, inicio, quantidade):
+        raise NotImplementedError
+
+    def janela(self, termo, chave, quantidade, reverso=False):
+        """Até ``quantidade`` resultados depois da chave (relevância, data, id)"""
+        raise NotImplementedError
+
+    def _params_chave(self, chave):
+        relevancia, data, pk = chave
+        return [relevancia, connection.ops.adapt_datetimefield_value(data), pk]
+
+    def otimizar(self):
+        """Manutenção do índice após uma reconstrução completa"""
+
+    def _params_publicados(self):
+        agora = connection.ops.adapt_datetimefield_value(timezone.now())
+        return ['publicado', True, agora]
+
+    def _carregar(self, linhas):
+        """Carrega os editoriais de (id, relevância, trecho) mantendo a ordem"""
+        from .models import Editorial
+
+        ids = [linha[0] for linha in linhas]
+        editoriais = Editorial.objects.feed().defer('secoes_html').in_bulk(ids)
+        resultado = []
+        for editorial_id, relevancia, trecho in linhas:
+            editorial = editoriais.get(editorial_id)
+            if editorial is None:
+                continue
+            editorial.relevancia = relevancia
+            editorial.trecho = formatar_trecho(trecho)
+            resultado.append(editorial)
+        return resultado
+
+    def _executar(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+class BackendPostgres(BackendBusca):
+    """Busca com tsvector/tsquery, stemming em português e unaccent"""
+
+    SQL_BASE = (
+        "FROM portal_documentobusca d "
+        "JOIN portal_editorial e ON e.id = d.editorial_id, "
+        "websearch_to_tsquery('portal_pt', %s) q "
+        "WHERE d.vetor @@ q AND " + FILTRO_PUBLICADOS
+    )
+
+    OPCOES_TRECHO = (
+        f'StartSel={INICIO_DESTAQUE}, StopSel={FIM_DESTAQUE}, '
+        'MaxWords=35, MinWords=15, MaxFragments=2'
+    )
+
+    def contar(self, termo):
+        linhas = self._executar('SELECT count(*) ' + self.SQL_BASE, [termo] + self._params_publicados())
+        return linhas[0][0]
+
+    def pagina(self, termo, inicio, quantidade):
+        # O ts_headline fica na consulta externa para rodar só nas linhas da página
+        sql = (
+            "SELECT r.editorial_id, r.relevancia, ts_headline('portal_pt', r.corpo, r.q, %s) FROM ("
+            "SELECT d.editorial_id, d.corpo, q, ts_rank_cd(d.vetor, q) AS relevancia, e.data_publicacao "
+            + self.SQL_BASE +
+            " ORDER BY relevancia DESC, e.data_publicacao DESC, e.id DESC LIMIT %s OFFSET %s"
+            ") r ORDER BY r.relevancia DESC, r.data_publicacao DESC, r.editorial_id DESC"
+        )
+        params = [self.OPCOES_TRECHO, termo] + self._params_publicados() + [quantidade, inicio]
+        return self._carregar(self._executar(sql, params))
+
+    def janela(self, termo, chave, quantidade, reverso=False):
+        sentido, comparacao = ('ASC', '>') if reverso else ('DESC', '<')
+        filtro, params_chave = '', []
+        if chave is not None:
+            filtro = f'WHERE (c.relevancia, c.data_publicacao, c.editorial_id) {comparacao} (%s, %s, %s)'
+            params_chave = self._params_chave(chave)
+        ordem = f'relevancia {sentido}, data_publicacao {sentido}, editorial_id {sentido}'
+        sql = (
+            "SELECT r.editorial_id, r.relevancia, ts_headline('portal_pt', r.corpo, r.q, %s) FROM ("
+            "SELECT c.* FROM ("
+            "SELECT d.editorial_id, d.corpo, q, ts_rank_cd(d.vetor, q) AS relevancia, e.data_publicacao "
+            + self.SQL_BASE +
+            f") c {filtro} ORDER BY {ordem} LIMIT %s"
+            f") r ORDER BY {ordem}"
+        )
+        params = [self.OPCOES_TRECHO, termo] + self._params_publicados() + params_chave + [quantidade]
+        return self._carregar(self._executar(sql, params))
+
+    def otimizar(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE portal_documentobusca')
+
+
+class BackendSQLite(BackendBusca):
+    """Busca com FTS5 para desenvolvimento (sem stemming; usa prefixos)"""
+
+    PALAVRA = re.compile(r'\w+')
+
+    SQL_BASE = (
+        "FROM portal_documentobusca_fts "
+        "JOIN portal_documentobusca d ON d.id = portal_documentobusca_fts.rowid "
+        "JOIN portal_editorial e ON e.id = d.editorial_id "
+        "WHERE portal_documentobusca_fts MATCH %s AND " + FILTRO_PUBLICADOS
+    )
+
+    def _consulta(self, termo):
+        """Converte o termo digitado em uma consulta FTS5 segura"""
+        return ' '.join(f'"{palavra}"*' for palavra in self.PALAVRA.findall(termo))
+
+    def contar(self, termo):
+        consulta = self._consulta(termo)
+        if not consulta:
+            return 0
+        linhas = self._executar('SELECT count(*) ' + self.SQL_BASE, [consulta] + self._params_publicados())
+        return linhas[0][0]
+
+    def pagina(self, termo, inicio, quantidade):
+        consulta = self._consulta(termo)
+        if not consulta:
+            return []
+        # bm25: pesos título > temas > corpo; valores menores são mais relevantes
+        sql = (
+            "SELECT d.editorial_id, bm25(portal_documentobusca_fts, 10.0, 5.0, 1.0) AS relevancia, "
+            "snippet(portal_documentobusca_fts, 2, %s, %s, '…', 30) "
+            + self.SQL_BASE +
+            " ORDER BY relevancia, e.data_publicacao DESC, e.id DESC LIMIT %s OFFSET %s"
+        )
+        params = [INICIO_DESTAQUE, FIM_DESTAQUE, consulta] + self._params_publicados() + [quantidade, inicio]
+        return self._carregar(self._executar(sql, params))
+
+    def janela(self, termo, chave, quantidade, reverso=False):
+        consulta = self._consulta(termo)
+        if not consulta:
+            return []
+        # Relevância crescente (bm25), data e id decrescentes; invertidos se reverso
+        relevancia, data = ('<', '>') if reverso else ('>', '<')
+        filtro, params_chave = '', []
+        if chave is not None:
+            filtro = (
+                f'WHERE relevancia {relevancia} %s OR (relevancia = %s AND '
+                f'(data {data} %s OR (data = %s AND editorial_id {data} %s)))'
+            )
+            valor_relevancia, valor_data, pk = self._params_chave(chave)
+            params_chave = [valor_relevancia, valor_relevancia, valor_data, valor_data, pk]
+        sentido_relevancia, sentido = ('DESC', 'ASC') if reverso else ('ASC', 'DESC')
+        sql = (
+            "SELECT editorial_id, relevancia, trecho FROM ("
+            "SELECT d.editorial_id, bm25(portal_documentobusca_fts, 10.0, 5.0, 1.0) AS relevancia, "
+            "snippet(portal_documentobusca_fts, 2, %s, %s, '…', 30) AS trecho, e.data_publicacao AS data "
+            + self.SQL_BASE +
+            f") {filtro} ORDER BY relevancia {sentido_relevancia}, data {sentido}, editorial_id {sentido} LIMIT %s"
+        )
+        params = [INICIO_DESTAQUE, FIM_DESTAQUE, consulta] + self._params_publicados() + params_chave + [quantidade]
+        return self._carregar(self._executar(sql, params))
+
+    def otimizar(self):
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO portal_documentobusca_fts(portal_documentobusca_fts) VALUES ('optimize')")
+
+
+class BackendIcontains(BackendBusca):
+    """Busca antiga por icontains, usada em bancos sem índice textual"""
+
+    def buscar(self, termo):
+        from .models import Editorial
+
+        return Editorial.obter_publicados().filter(
+            Q(titulo__icontains=termo) |
+            Q(texto__icontains=termo) |
+            Q(temas__nome__icontains=termo)
+        ).distinct()
+
+
+BACKENDS = {
+    'postgresql': BackendPostgres,
+    'sqlite': BackendSQLite,
+}
+
+
+def obter_backend():
+    """Retorna o backend de busca adequado ao banco em uso"""
+    return BACKENDS.get(connection.vendor, BackendIcontains)()
+
+
+def indexar_editoriais(ids):
+    """Recria (upsert) os documentos de busca dos editoriais informados"""
+    from .models import DocumentoBusca, Editorial, Tema
+
+    editoriais = Editorial.objects.filter(pk__in=ids).only('id', 'titulo', 'texto').prefetch_related(
+        Prefetch('temas', queryset=Tema.objects.only('id', 'nome'))
+    )
+    documentos = [
+        DocumentoBusca(
+            editorial_id=editorial.pk,
+            titulo=editorial.titulo,
+            temas=' '.join(tema.nome for tema in editorial.temas.all()),
+            corpo=editorial.texto,
+        )
+        for editorial in editoriais
+    ]
+    DocumentoBusca.objects.bulk_create(
+        documentos,
+        update_conflicts=True,
+        unique_fields=['editorial'],
+        update_fields=['titulo', 'temas', 'corpo', 'atualizado_em'],
+    )
+    return len(documentos)
+
+
+def indexar_tema(tema_id):
+    """Reindexa, em lotes, os editoriais de um tema (ex.: tema renomeado)"""
+    from .models import Editorial
+
+    ids = Editorial.objects.filter(temas__id=tema_id).values_list('pk', flat=True)
+    lote = []
+    for editorial_id in ids.iterator(chunk_size=TAMANHO_LOTE):
+        lote.append(editorial_id)
+        if len(lote) >= TAMANHO_LOTE:
+            indexar_editoriais(lote)
+            lote = []
+    if lote:
+        indexar_editoriais(lote)
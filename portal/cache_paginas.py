@@ -0,0 +1,260 @@
+"""
+Cache de páginas completas para visitantes anônimos.
+
+A chave de cada página é o caminho mais a query string (inclusive ``page``).
+Cada página guardada depende de *tags* (``home``, ``tema:<id>``,
+``editorial:<id>``, ``autor:<id>``...), e cada tag tem uma versão no cache.
+Ao salvar um Editorial, Tema, Autor ou a ConfiguracaoSite, os sinais em
+``portal.signals`` trocam a versão só das tags afetadas; uma página cuja
+versão guardada difere da atual é considerada expirada e renderizada de novo.
+Assim uma publicação aparece imediatamente sem esvaziar o cache inteiro.
+
+As mesmas versões servem de validadores HTTP: o ETag é o hash das versões
+das tags da página e o Last-Modified é a mais recente delas (a versão é o
+instante da última invalidação). Uma requisição condicional cuja página
+guardada ainda vale recebe 304 sem consultar o banco nem renderizar.
+Por isso as páginas em cache não podem exibir dados que mudam sem uma
+invalidação (como o número de visualizações).
+
+O backend é o alias ``paginas`` de ``CACHES`` (memória local, arquivo ou
+banco, conforme ``CACHE_PAGINAS_BACKEND``). Com mais de um worker use
+arquivo ou banco, para que as versões das tags sejam compartilhadas.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.dispatch import Signal
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+ALIAS = 'paginas'
+
+# Tags de todas as páginas: a navegação (temas ativos) e a configuração do site
+TAGS_PADRAO = ('navegacao', 'site')
+
+_lock = threading.Lock()
+_contadores = Counter()
+
+
+def obter_cache():
+    return caches[ALIAS]
+
+
+def _chave_tag(tag):
+    return f'tag:{tag}'
+
+
+def _chave_pagina(request):
+    parametros = '&'.join(sorted(request.GET.urlencode().split('&')))
+    # Sitemaps, feeds e links canônicos têm URLs absolutas: esquema e domínio fazem parte da chave
+    bruto = f'{request.scheme}://{request.get_host()}{request.path}?{parametros}'
+    return 'pagina:' + hashlib.md5(bruto.encode('utf-8')).hexdigest()
+
+
+def _registrar(rota, evento):
+    with _lock:
+        _contadores[(rota, evento)] += 1
+
+
+def estatisticas():
+    """Hits, misses e ignorados por rota neste processo"""
+    with _lock:
+        itens = list(_contadores.items())
+    resultado = {}
+    for (rota, evento), total in itens:
+        resultado.setdefault(rota, {'hits': 0, 'misses': 0, 'ignorados': 0})[evento] = total
+    return resultado
+
+
+def versoes(tags):
+    """Versões atuais das tags, criando as que ainda não existem"""
+    cache = obter_cache()
+    chaves = {_chave_tag(tag): tag for tag in tags}
+    atuais = cache.get_many(chaves.keys())
+    faltantes = {chave: time.time_ns() for chave in chaves if chave not in atuais}
+    if faltantes:
+        cache.set_many(faltantes, None)
+        atuais.update(faltantes)
+    return {chaves[chave]: versao for chave, versao in atuais.items()}
+
+
+# Instante da invalidação mais recente, de qualquer tag (portal.replicas)
+CHAVE_ULTIMA_INVALIDACAO = 'ultima-invalidacao'
+
+# Enviado com ``tags`` depois de cada invalidação (portal.exportacao)
+paginas_invalidadas = Signal()
+
+
+def invalidar(*tags):
+    """Expira todas as páginas que dependem de alguma das tags"""
+    if tags:
+        agora = time.time_ns()
+        chaves = {_chave_tag(tag): agora for tag in tags}
+        chaves[CHAVE_ULTIMA_INVALIDACAO] = agora
+        obter_cache().set_many(chaves, None)
+        paginas_invalidadas.send(sender=None, tags=tags)
+
+
+def ultima_invalidacao():
+    """Instante (ns) da invalidação mais recente; 0 se não houve nenhuma"""
+    return obter_cache().get(CHAVE_ULTIMA_INVALIDACAO, 0)
+
+
+def marcar(request, *tags):
+    """Declara, dentro da view, tags adicionais de que a página depende"""
+    if hasattr(request, '_tags_cache'):
+        request._tags_cache.update(tags)
+
+
+def validadores(versoes_tags):
+    """(ETag, Last-Modified em segundos) derivados das versões das tags"""
+    bruto = repr(sorted(versoes_tags.items()))
+    etag = '"' + hashlib.md5(bruto.encode('utf-8')).hexdigest() + '"'
+    return etag, max(versoes_tags.values()) // 1_000_000_000
+
+
+def responder_condicional(request, response, versoes_tags):
+    """Adiciona ETag/Last-Modified à resposta e troca por 304 se o cliente já a tem"""
+    etag, ultima_alteracao = validadores(versoes_tags)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(ultima_alteracao)
+    # Sempre revalidar: sem isso o navegador pode reaproveitar a página por heurística
+    patch_cache_control(response, max_age=0, must_revalidate=True)
+    return get_conditional_response(request, etag=etag, last_modified=ultima_alteracao, response=response)
+
+
+def verificar_condicional(request, tags):
+    """
+    (resposta 304 ou None, versões das tags) de uma requisição condicional;
+    depois de gerar a resposta, passe as versões a ``responder_condicional``.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return None, None
+    versoes_tags = versoes(tags)
+    etag, ultima_alteracao = validadores(versoes_tags)
+    return get_conditional_response(request, etag=etag, last_modified=ultima_alteracao), versoes_tags
+
+
+def condicional(*tags):
+    """
+    Decorator de views que não usam o cache de páginas (ex.: APIs): responde
+    304 antes de executar a view se as versões das ``tags`` não mudaram.
+    """
+    def decorator(view):
+        def depois(request, response, versoes_tags):
+            if versoes_tags is not None and response.status_code == 200:
+                response = responder_condicional(request, response, versoes_tags)
+            return response
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                # O backend do cache pode ser o banco: fora do event loop
+                nao_modificada, versoes_tags = await sync_to_async(verificar_condicional)(request, tags)
+                if nao_modificada is not None:
+                    return nao_modificada
+                return depois(request, await view(request, *args, **kwargs), versoes_tags)
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                nao_modificada, versoes_tags = verificar_condicional(request, tags)
+                if nao_modificada is not None:
+                    return nao_modificada
+                return depois(request, view(request, *args, **kwargs), versoes_tags)
+
+        return wrapper
+
+    return decorator
+
+
+def _pode_usar_cache(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if getattr(request, 'exportacao', False):
+        # Renderização para portal.exportacao: sempre a página atual
+        return False
+    if request.COOKIES.get('messages'):
+        return False
+    return not request.user.is_authenticated
+
+
+def cache_pagina(*tags):
+    """
+    Decorator que guarda a página renderizada para visitantes anônimos.
+
+    ``tags`` são as dependências fixas da view; as que dependem do objeto
+    exibido são declaradas com ``marcar(request, ...)``.
+    """
+    def decorator(view):
+        rota = view.__name__
+
+        def antes(request):
+            """(página guardada ou None, estado para ``depois``; None se não usa o cache)"""
+            if not _pode_usar_cache(request):
+                _registrar(rota, 'ignorados')
+                return None, None
+
+            ativo = getattr(settings, 'CACHE_PAGINAS_ATIVO', True)
+            chave = _chave_pagina(request)
+            if ativo:
+                guardada = obter_cache().get(chave)
+                if guardada is not None:
+                    versoes_guardadas, conteudo, content_type = guardada
+                    if versoes(versoes_guardadas.keys()) == versoes_guardadas:
+                        _registrar(rota, 'hits')
+                        response = HttpResponse(conteudo, content_type=content_type)
+                        return responder_condicional(request, response, versoes_guardadas), None
+                _registrar(rota, 'misses')
+            else:
+                _registrar(rota, 'ignorados')
+
+            request._tags_cache = set(TAGS_PADRAO) | set(tags)
+            # Versões lidas antes de renderizar: uma invalidação durante a
+            # renderização faz a página guardada já nascer expirada
+            return None, (ativo, chave, versoes(request._tags_cache))
+
+        def depois(request, response, estado):
+            ativo, chave, versoes_pagina = estado
+            if response.status_code == 200 and not response.streaming and not response.cookies:
+                versoes_pagina.update(versoes(request._tags_cache - versoes_pagina.keys()))
+                if ativo:
+                    obter_cache().set(
+                        chave,
+                        (versoes_pagina, response.content, response['Content-Type']),
+                        getattr(settings, 'CACHE_PAGINAS_TIMEOUT', 300),
+                    )
+                response = responder_condicional(request, response, versoes_pagina)
+            return response
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                # request.user e os backends arquivo/banco bloqueiam: rodam em thread
+                guardada, estado = await sync_to_async(antes)(request)
+                if guardada is not None:
+                    return guardada
+                response = await view(request, *args, **kwargs)
+                if estado is None:
+                    return response
+                return await sync_to_async(depois)(request, response, estado)
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                guardada, estado = antes(request)
+                if guardada is not None:
+                    return guardada
+                response = view(request, *args, **kwargs)
+                if estado is None:
+                    return response
+                return depois(request, response, estado)
+
+        return wrapper
+
+    return decorator
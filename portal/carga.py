@@ -0,0 +1,184 @@
+"""
+Carga HTTP concorrente para medir o portal.
+
+``ServidorLocal`` sobe o projeto com o gunicorn de produção
+(``config/gunicorn.conf.py``) em modo WSGI ou ASGI e ``executar`` dispara requisições em paralelo,
+cada thread com a própria conexão keep-alive, medindo a latência de cada
+uma. O resultado traz, por alvo, a vazão e os percentis de latência.
+"""
+import http.client
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+
+from django.conf import settings
+
+Alvo = namedtuple('Alvo', 'nome caminho metodo corpo', defaults=('GET', None))
+
+# Valores de SERVIDOR_MODO aceitos por config/gunicorn.conf.py
+MODOS = ('wsgi', 'asgi')
+
+
+def percentil(ordenados, p):
+    """Percentil ``p`` (0-100) de uma lista ordenada, pelo posto mais próximo"""
+    if not ordenados:
+        return None
+    posto = math.ceil(p / 100 * len(ordenados)) - 1
+    return ordenados[max(0, min(len(ordenados) - 1, posto))]
+
+
+def _ms(segundos):
+    return None if segundos is None else round(segundos * 1000, 2)
+
+
+class Medicoes:
+    """Latências e erros por alvo; ``registrar`` pode ser chamado de várias threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = {}
+        self.erros = {}
+        self.duracao = 0.0
+
+    def registrar(self, nome, segundos, erro=False):
+        with self._lock:
+            self.latencias.setdefault(nome, []).append(segundos)
+            if erro:
+                self.erros[nome] = self.erros.get(nome, 0) + 1
+
+    @staticmethod
+    def _resumo(latencias, erros, duracao):
+        ordenadas = sorted(latencias)
+        return {
+            'requisicoes': len(ordenadas),
+            'erros': erros,
+            'vazao': round(len(ordenadas) / duracao, 1) if duracao else None,
+            'p50_ms': _ms(percentil(ordenadas, 50)),
+            'p95_ms': _ms(percentil(ordenadas, 95)),
+            'p99_ms': _ms(percentil(ordenadas, 99)),
+        }
+
+    def resumo(self):
+        """{'total': {...}, 'rotas': {nome: {...}}} com vazão em req/s e latências em ms"""
+        todas = [latencia for lista in self.latencias.values() for latencia in lista]
+        return {
+            'total': self._resumo(todas, sum(self.erros.values()), self.duracao),
+            'rotas': {
+                nome: self._resumo(lista, self.erros.get(nome, 0), self.duracao)
+                for nome, lista in sorted(self.latencias.items())
+            },
+        }
+
+
+def _requisitar(conexao, alvo, indice):
+    """Faz a requisição e lê a resposta inteira; retorna o status"""
+    cabecalhos = {}
+    # O corpo pode variar por requisição (ex.: um e-mail novo a cada inscrição)
+    corpo = alvo.corpo(indice) if callable(alvo.corpo) else alvo.corpo
+    if corpo is not None:
+        corpo = corpo.encode('utf-8') if isinstance(corpo, str) else corpo
+        cabecalhos['Content-Type'] = 'application/x-www-form-urlencoded'
+    conexao.request(alvo.metodo, alvo.caminho, body=corpo, headers=cabecalhos)
+    resposta = conexao.getresponse()
+    resposta.read()
+    return resposta.status
+
+
+def executar(host, porta, alvos, requisicoes, concorrencia, aquecimento=0, timeout=30):
+    """
+    Distribui ``requisicoes`` entre os ``alvos`` (em rodízio) com
+    ``concorrencia`` threads; as ``aquecimento`` primeiras não são medidas.
+    """
+    medicoes = Medicoes()
+    sequencia = count()
+    total = aquecimento + requisicoes
+
+    def trabalhador():
+        conexao = http.client.HTTPConnection(host, porta, timeout=timeout)
+        try:
+            while True:
+                indice = next(sequencia)
+                if indice >= total:
+                    return
+                alvo = alvos[indice % len(alvos)]
+                inicio = time.perf_counter()
+                try:
+                    erro = _requisitar(conexao, alvo, indice) >= 500
+                except (OSError, http.client.HTTPException):
+                    erro = True
+                    conexao.close()
+                    conexao = http.client.HTTPConnection(host, porta, timeout=timeout)
+                if indice >= aquecimento:
+                    medicoes.registrar(alvo.nome, time.perf_counter() - inicio, erro)
+        finally:
+            conexao.close()
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as pool:
+        for futuro in [pool.submit(trabalhador) for _ in range(concorrencia)]:
+            futuro.result()
+    medicoes.duracao = time.perf_counter() - inicio
+    return medicoes
+
+
+class ServidorLocal:
+    """Sobe o projeto com gunicorn (``modo`` wsgi ou asgi) enquanto o contexto durar"""
+
+    def __init__(self, modo, porta, workers=4, ambiente=None, host='127.0.0.1'):
+        if modo not in MODOS:
+            raise ValueError(f'Modo desconhecido: {modo}')
+        self.modo = modo
+        self.host = host
+        self.porta = porta
+        self.workers = workers
+        self.ambiente = ambiente or {}
+        self.processo = None
+
+    def __enter__(self):
+        comando = [sys.executable, '-m', 'gunicorn', '-c', 'config/gunicorn.conf.py', '--log-level', 'warning']
+        ambiente = {
+            **os.environ,
+            'SERVIDOR_MODO': self.modo,
+            'GUNICORN_BIND': f'{self.host}:{self.porta}',
+            'GUNICORN_WORKERS': str(self.workers),
+            'GUNICORN_ACCESS_LOG': '',
+            # locmem (por processo) é recusado com vários workers
+            'CACHE_PAGINAS_BACKEND': os.environ.get('CACHE_PAGINAS_BACKEND') or 'arquivo',
+            **self.ambiente,
+        }
+        self.processo = subprocess.Popen(comando, cwd=settings.BASE_DIR, env=ambiente)
+        try:
+            self.aguardar()
+        except Exception:
+            self.__exit__()
+            raise
+        return self
+
+    def aguardar(self, timeout=30):
+        limite = time.monotonic() + timeout
+        while time.monotonic() < limite:
+            if self.processo.poll() is not None:
+                raise RuntimeError(f'O servidor {self.modo} terminou ao iniciar (código {self.processo.returncode})')
+            try:
+                conexao = http.client.HTTPConnection(self.host, self.porta, timeout=2)
+                conexao.request('GET', '/health/')
+                if conexao.getresponse().status == 200:
+                    return
+            except OSError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f'O servidor {self.modo} não respondeu em {timeout}s')
+
+    def __exit__(self, *exc):
+        self.processo.terminate()
+        try:
+            self.processo.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.processo.kill()
+            self.processo.wait()
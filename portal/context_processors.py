@@ -0,0 +1,11 @@
+from django.utils.functional import SimpleLazyObject
+
+from .contexto import contexto
+
+
+def site(request):
+    """Configuração do site e temas ativos da navegação, em cache por processo"""
+    return {
+        'site_config': SimpleLazyObject(contexto.config),
+        'temas': SimpleLazyObject(contexto.temas),
+    }
@@ -0,0 +1,75 @@
+"""
+Cache, por processo, dos dados exibidos em todas as páginas: a
+ConfiguracaoSite e a lista de temas ativos da navegação.
+
+Os dados ficam em memória e são recarregados quando a versão das tags
+``site``/``navegacao`` do cache de páginas muda (os sinais trocam a versão ao
+salvar um Tema ou a configuração). Para não consultar a versão a cada
+requisição, ela é verificada no máximo a cada ``CONTEXTO_SITE_VERIFICACAO``
+segundos; no processo que fez a alteração a invalidação é imediata.
+
+Como reserva (uma versão que não chega a este processo, por exemplo com o
+cache de páginas ``locmem`` em vários workers), os dados são recarregados
+depois de ``CONTEXTO_SITE_TTL`` segundos mesmo sem mudança de versão.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from . import cache_paginas
+
+TAGS = ('site', 'navegacao')
+
+
+class ContextoSite:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.invalidar()
+
+    def invalidar(self):
+        """Descarta os dados deste processo"""
+        self._dados = None
+        self._versao = None
+        self._verificado_em = 0.0
+        self._carregado_em = 0.0
+
+    @property
+    def intervalo(self):
+        return getattr(settings, 'CONTEXTO_SITE_VERIFICACAO', 5)
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'CONTEXTO_SITE_TTL', 300)
+
+    def _carregar(self):
+        from .models import ConfiguracaoSite, Tema
+
+        config, _ = ConfiguracaoSite.objects.get_or_create(pk=1)
+        return {
+            'config': config,
+            'temas': tuple(Tema.objects.filter(ativo=True)),
+        }
+
+    def obter(self):
+        agora = time.monotonic()
+        with self._lock:
+            if self._dados is not None and agora - self._verificado_em < self.intervalo:
+                return self._dados
+
+            versao = cache_paginas.versoes(TAGS)
+            if self._dados is None or versao != self._versao or agora - self._carregado_em >= self.ttl:
+                self._dados = self._carregar()
+                self._versao = versao
+                self._carregado_em = agora
+            self._verificado_em = agora
+            return self._dados
+
+    def config(self):
+        return self.obter()['config']
+
+    def temas(self):
+        return self.obter()['temas']
+
+
+contexto = ContextoSite()
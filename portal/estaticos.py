@@ -0,0 +1,89 @@
+"""
+Armazenamento dos arquivos estáticos para produção.
+
+O ``collectstatic`` grava cada arquivo com o hash do conteúdo no nome
+(``style.3f2a9c1b7e4d.css``) e o manifesto usado pela tag ``{% static %}``,
+como o ManifestStaticFilesStorage. Depois grava, ao lado de cada arquivo de
+texto, as cópias pré-comprimidas ``.gz`` e ``.br`` (esta se o pacote
+``brotli`` estiver instalado), que o nginx entrega com ``gzip_static`` e
+``brotli_static``. Assim os estáticos podem ficar em cache para sempre e
+nunca são comprimidos a cada requisição.
+"""
+import gzip
+import logging
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+EXTENSOES_COMPRIMIVEIS = (
+    '.css', '.js', '.mjs', '.map', '.json', '.svg', '.xml', '.txt', '.html', '.ico', '.ttf', '.otf', '.eot',
+)
+
+# Arquivos menores que isso não compensam a cópia comprimida
+TAMANHO_MINIMO = 256
+
+
+def _gzip(conteudo):
+    # mtime fixo: a mesma entrada gera sempre o mesmo .gz
+    return gzip.compress(conteudo, compresslevel=9, mtime=0)
+
+
+def _brotli(conteudo):
+    return brotli.compress(conteudo, quality=11)
+
+
+def compressores():
+    """[(extensão, função)] disponíveis neste ambiente"""
+    disponiveis = [('.gz', _gzip)]
+    if brotli is not None:
+        disponiveis.append(('.br', _brotli))
+    return disponiveis
+
+
+def comprimir_arquivo(caminho):
+    """Grava as cópias comprimidas de ``caminho``; retorna as extensões gravadas"""
+    with open(caminho, 'rb') as arquivo:
+        conteudo = arquivo.read()
+    if len(conteudo) < TAMANHO_MINIMO:
+        return []
+
+    gravadas = []
+    estatisticas = os.stat(caminho)
+    for extensao, comprimir in compressores():
+        destino = caminho + extensao
+        comprimido = comprimir(conteudo)
+        if len(comprimido) >= len(conteudo):
+            # Sem ganho: o nginx entrega o original
+            if os.path.exists(destino):
+                os.remove(destino)
+            continue
+        temporario = f'{destino}.tmp'
+        with open(temporario, 'wb') as arquivo:
+            arquivo.write(comprimido)
+        os.utime(temporario, ns=(estatisticas.st_atime_ns, estatisticas.st_mtime_ns))
+        os.replace(temporario, destino)
+        gravadas.append(extensao)
+    return gravadas
+
+
+class ArmazenamentoEstaticoComprimido(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage que também grava as cópias .gz e .br"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+
+        if brotli is None:
+            logger.warning('Pacote brotli não instalado: apenas as cópias .gz serão geradas')
+        nomes = set(paths) | set(self.hashed_files.values()) | {self.manifest_name}
+        for nome in sorted(nomes):
+            if nome.lower().endswith(EXTENSOES_COMPRIMIVEIS) and self.exists(nome):
+                comprimir_arquivo(self.path(nome))
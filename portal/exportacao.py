@@ -0,0 +1,280 @@
+"""
+Exportação das páginas públicas para HTML estático.
+
+``exportar_site`` renderiza a home, as páginas dos temas e autores ativos e
+os editoriais publicados em ``EXPORTACAO_DIRETORIO/paginas/<caminho>/index.html``,
+que o nginx entrega com ``try_files`` antes de repassar ao Django (só sem
+query string: as demais páginas da paginação e a busca continuam dinâmicas).
+A exportação completa divide as páginas entre processos.
+
+As páginas são renderizadas pelas próprias views, sem o cache de páginas e
+sem contar visualizações; no editorial exportado a visualização é contada
+por um beacon assinado para ``/api/visualizacao/<id>/`` (portal.visualizacoes).
+
+Com ``EXPORTACAO_ATIVA``, cada invalidação do cache de páginas põe na fila
+``PaginaPendente`` só os caminhos das tags afetadas: ``home``,
+``editorial:<id>``, ``tema:<id>``, ``autor:<id>`` e ``autores`` (todas as
+páginas de autor); ``exportar_site --pendentes`` as regenera fora da
+requisição, em lotes no mesmo pool de processos da exportação completa, e
+apaga as de objetos despublicados ou removidos. As tags ``site`` e
+``navegacao`` mudam todas as páginas: a exportação é descartada (o Django
+volta a servir tudo) até o próximo ``exportar_site``.
+"""
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from urllib.parse import unquote
+
+import django
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import connections
+from django.http import Http404
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from .models import Autor, Editorial, PaginaPendente, Tema
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_LOTE = 200
+TAGS_TUDO = frozenset({'site', 'navegacao'})
+
+
+def diretorio():
+    return Path(settings.EXPORTACAO_DIRETORIO) / 'paginas'
+
+
+def arquivo(caminho):
+    # O nginx procura pelo caminho decodificado ($uri)
+    return diretorio() / unquote(caminho).strip('/') / 'index.html'
+
+
+def renderizar(caminho):
+    """HTML da página pela própria view, ou None se ela não responde 200"""
+    request = RequestFactory().get(caminho)
+    request.user = AnonymousUser()
+    request.exportacao = True
+    request.resolver_match = correspondencia = resolve(caminho)
+    view = correspondencia.func
+    if iscoroutinefunction(view):
+        view = async_to_sync(view)
+    try:
+        response = view(request, *correspondencia.args, **correspondencia.kwargs)
+    except Http404:
+        return None
+    return response.content if response.status_code == 200 else None
+
+
+def gravar(caminho, conteudo):
+    destino = arquivo(caminho)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    temporario = destino.with_name(f'.index.html.{os.getpid()}.tmp')
+    temporario.write_bytes(conteudo)
+    os.replace(temporario, destino)
+
+
+def remover(caminho):
+    try:
+        arquivo(caminho).unlink()
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def exportar(caminhos):
+    """Regenera os arquivos dos caminhos; retorna (gravados, removidos)"""
+    gravados = removidos = 0
+    for caminho in caminhos:
+        conteudo = renderizar(caminho)
+        if conteudo is None:
+            removidos += remover(caminho)
+        else:
+            gravar(caminho, conteudo)
+            gravados += 1
+    return gravados, removidos
+
+
+def caminhos_site():
+    """Todas as páginas exportadas"""
+    caminhos = [reverse('portal:home')]
+    caminhos += [
+        reverse('portal:tema', args=[slug])
+        for slug in Tema.objects.filter(ativo=True).order_by('pk').values_list('slug', flat=True)
+    ]
+    caminhos += [
+        reverse('portal:detalhe_autor', args=[apelido])
+        for apelido in Autor.objects.filter(ativo=True).order_by('pk').values_list('apelido', flat=True)
+    ]
+    caminhos += [
+        reverse('portal:detalhe', args=[pk])
+        for pk in Editorial.objects.publicados().order_by('pk').values_list('pk', flat=True).iterator()
+    ]
+    return caminhos
+
+
+def _existentes():
+    """Caminhos que têm arquivo exportado"""
+    raiz = diretorio()
+    if not raiz.exists():
+        return set()
+    caminhos = set()
+    for encontrado in raiz.rglob('index.html'):
+        relativo = encontrado.parent.relative_to(raiz).as_posix()
+        caminhos.add('/' if relativo == '.' else f'/{relativo}/')
+    return caminhos
+
+
+def criar_pool(workers):
+    """Pool de processos que renderizam as páginas"""
+    # Cada worker configura o Django e abre as próprias conexões
+    connections.close_all()
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup
+    )
+
+
+def exportar_em_lotes(caminhos, pool=None, progresso=None):
+    """Exporta os caminhos em lotes de ``TAMANHO_LOTE``, no pool se houver; retorna (gravados, removidos)"""
+    lotes = [caminhos[inicio:inicio + TAMANHO_LOTE] for inicio in range(0, len(caminhos), TAMANHO_LOTE)]
+    gravados = removidos = feitos = 0
+
+    def somar(resultado, quantidade):
+        nonlocal gravados, removidos, feitos
+        gravados += resultado[0]
+        removidos += resultado[1]
+        feitos += quantidade
+        if progresso:
+            progresso(feitos, len(caminhos))
+
+    if pool is None or len(lotes) <= 1:
+        for lote in lotes:
+            somar(exportar(lote), len(lote))
+    else:
+        futuros = {pool.submit(exportar, lote): len(lote) for lote in lotes}
+        for futuro in as_completed(futuros):
+            somar(futuro.result(), futuros[futuro])
+    return gravados, removidos
+
+
+def exportar_tudo(workers=4, progresso=None):
+    """
+    Exporta o site inteiro, em lotes distribuídos entre ``workers`` processos,
+    e apaga os arquivos de páginas que não existem mais. Retorna as contagens.
+    """
+    inicio = timezone.now()
+    caminhos = caminhos_site()
+    if workers <= 1 or len(caminhos) <= TAMANHO_LOTE:
+        gravados, removidos = exportar_em_lotes(caminhos, progresso=progresso)
+    else:
+        with criar_pool(workers) as pool:
+            gravados, removidos = exportar_em_lotes(caminhos, pool, progresso)
+
+    for caminho in _existentes() - {unquote(caminho) for caminho in caminhos}:
+        removidos += remover(caminho)
+    # A fila anterior à exportação completa já foi atendida
+    PaginaPendente.objects.filter(marcado_em__lte=inicio).delete()
+    return {'paginas': len(caminhos), 'gravadas': gravados, 'removidas': removidos}
+
+
+def _orfaos(prefixo, validos=frozenset()):
+    """Caminhos exportados em ``/<prefixo>/`` cujo objeto não existe mais (todos, sem ``validos``)"""
+    pasta = diretorio() / prefixo
+    if not pasta.exists():
+        return []
+    return [f'/{prefixo}/{nome.name}/' for nome in pasta.iterdir() if nome.is_dir() and nome.name not in validos]
+
+
+def caminhos_das_tags(tags):
+    """Caminhos afetados pelas tags invalidadas (None: todos)"""
+    if TAGS_TUDO & set(tags):
+        return None
+    ids = {'editorial': set(), 'tema': set(), 'autor': set()}
+    caminhos = set()
+    for tag in tags:
+        if tag == 'home':
+            caminhos.add(reverse('portal:home'))
+        elif tag == 'autores':
+            # Cada página de autor lista os demais: todas mudam, e as de
+            # autores desativados ou removidos são apagadas
+            caminhos.update(
+                reverse('portal:detalhe_autor', args=[apelido])
+                for apelido in Autor.objects.filter(ativo=True).values_list('apelido', flat=True)
+            )
+            caminhos.update(_orfaos('autor'))
+        tipo, _, pk = tag.partition(':')
+        if tipo in ids and pk.isdecimal():
+            ids[tipo].add(int(pk))
+
+    caminhos.update(reverse('portal:detalhe', args=[pk]) for pk in ids['editorial'])
+    if ids['tema']:
+        slugs = dict(Tema.objects.filter(pk__in=ids['tema']).values_list('pk', 'slug'))
+        caminhos.update(reverse('portal:tema', args=[slug]) for slug in slugs.values())
+        if len(slugs) < len(ids['tema']):
+            # Tema removido: o slug só existe no nome da pasta
+            caminhos.update(_orfaos('tema', set(Tema.objects.values_list('slug', flat=True))))
+    if ids['autor']:
+        apelidos = dict(Autor.objects.filter(pk__in=ids['autor']).values_list('pk', 'apelido'))
+        caminhos.update(reverse('portal:detalhe_autor', args=[apelido]) for apelido in apelidos.values())
+        if len(apelidos) < len(ids['autor']):
+            caminhos.update(_orfaos('autor', set(Autor.objects.values_list('apelido', flat=True))))
+    return sorted(caminhos)
+
+
+def descartar():
+    """Tira a exportação do ar (renomeia a pasta) e apaga os arquivos em segundo plano"""
+    raiz = diretorio()
+    if not raiz.exists():
+        return
+    antiga = raiz.with_name(f'{raiz.name}.descartada-{time.time_ns()}')
+    os.replace(raiz, antiga)
+    threading.Thread(target=shutil.rmtree, args=(antiga,), kwargs={'ignore_errors': True}, daemon=True).start()
+
+
+def enfileirar(caminhos):
+    """Põe os caminhos na fila de ``processar_pendentes`` (uma consulta)"""
+    agora = timezone.now()
+    PaginaPendente.objects.bulk_create(
+        [PaginaPendente(caminho=caminho, marcado_em=agora) for caminho in caminhos],
+        update_conflicts=True,
+        unique_fields=['caminho'],
+        update_fields=['marcado_em'],
+    )
+
+
+def processar_pendentes(pool=None, lote=TAMANHO_LOTE * 5):
+    """Regenera as páginas da fila, ``lote`` caminhos por vez; retorna o total"""
+    total = 0
+    while True:
+        pendentes = dict(PaginaPendente.objects.order_by('marcado_em').values_list('caminho', 'marcado_em')[:lote])
+        if not pendentes:
+            return total
+        exportar_em_lotes(list(pendentes), pool)
+        # Os marcados de novo durante a renderização continuam na fila
+        PaginaPendente.objects.filter(caminho__in=pendentes, marcado_em__lte=max(pendentes.values())).delete()
+        total += len(pendentes)
+
+
+def regenerar(sender, tags, **kwargs):
+    """
+    Receptor de ``cache_paginas.paginas_invalidadas``: só enfileira os
+    caminhos, a renderização fica para ``exportar_site --pendentes``
+    """
+    if not getattr(settings, 'EXPORTACAO_ATIVA', False):
+        return
+    try:
+        caminhos = caminhos_das_tags(tags)
+        if caminhos is None:
+            descartar()
+        elif caminhos:
+            enfileirar(caminhos)
+    except Exception:
+        # A exportação nunca impede a alteração; o próximo exportar_site corrige
+        logger.exception('Falha ao enfileirar as páginas exportadas')
@@ -0,0 +1,167 @@
+"""
+Exportação dos dados (editoriais, autores, temas e inscritos) em fluxo.
+
+Cada tabela é lida com ``values_list(...).iterator(chunk_size=lote)`` (cursor
+no servidor no PostgreSQL), sem instanciar os modelos; os temas das linhas
+de cada lote vêm de uma consulta à tabela de ligação. As linhas saem em
+NDJSON (um objeto JSON por linha) ou CSV, opcionalmente em gzip, em blocos
+de ``lote`` linhas: a memória usada não depende do tamanho da tabela.
+
+Usado pelo comando ``exportar_dados`` e pela view ``exportar_dados_api``
+(somente equipe).
+"""
+import csv
+import io
+import json
+import zlib
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import Autor, Editorial, Newsletter, Tema
+
+TAMANHO_LOTE = 2000
+FORMATOS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+# Separador dos temas na coluna "temas" do CSV (o mesmo de importar_inscritos)
+SEPARADOR_TEMAS = ';'
+
+
+class Tabela:
+    """Colunas exportadas de um modelo: (nome da coluna, lookup do values_list)"""
+
+    def __init__(self, modelo, colunas, temas=None):
+        self.modelo = modelo
+        self.colunas = colunas
+        # Tabela de ligação com os temas e o campo que aponta para o modelo
+        self.temas = temas
+
+    @property
+    def cabecalho(self):
+        nomes = [nome for nome, _ in self.colunas]
+        return nomes + ['temas'] if self.temas else nomes
+
+    def consulta(self):
+        return self.modelo._default_manager.order_by('pk').values_list(*[lookup for _, lookup in self.colunas])
+
+    def temas_do_lote(self, ids):
+        """{id: [slugs]} dos temas das linhas do lote, em uma consulta"""
+        relacao, campo = self.temas
+        resultado = {}
+        linhas = relacao.objects.filter(**{f'{campo}__in': ids}).order_by('tema__slug').values_list(
+            campo, 'tema__slug'
+        )
+        for pk, slug in linhas:
+            resultado.setdefault(pk, []).append(slug)
+        return resultado
+
+
+TABELAS = {
+    'editoriais': Tabela(
+        Editorial,
+        [
+            ('id', 'pk'), ('titulo', 'titulo'), ('texto', 'texto'), ('autor', 'autor__apelido'),
+            ('status', 'status'), ('ativo', 'ativo'), ('layout', 'layout'), ('estilo', 'estilo'),
+            ('data_publicacao', 'data_publicacao'), ('data_agendada', 'data_agendada'),
+            ('visualizacoes', 'visualizacoes'), ('data_criacao', 'data_criacao'),
+            ('data_atualizacao', 'data_atualizacao'),
+        ],
+        temas=(Editorial.temas.through, 'editorial_id'),
+    ),
+    'autores': Tabela(
+        Autor,
+        [
+            ('id', 'pk'), ('nome_completo', 'nome_completo'), ('apelido', 'apelido'), ('resumo', 'resumo'),
+            ('twitter', 'twitter'), ('linkedin', 'linkedin'), ('instagram', 'instagram'),
+            ('facebook', 'facebook'), ('website', 'website'), ('ativo', 'ativo'),
+            ('criado_em', 'criado_em'), ('atualizado_em', 'atualizado_em'),
+        ],
+    ),
+    'temas': Tabela(
+        Tema,
+        [
+            ('id', 'pk'), ('nome', 'nome'), ('slug', 'slug'), ('descricao', 'descricao'), ('ativo', 'ativo'),
+            ('criado_em', 'criado_em'), ('atualizado_em', 'atualizado_em'),
+        ],
+    ),
+    'inscritos': Tabela(
+        Newsletter,
+        [('id', 'pk'), ('email', 'email'), ('ativo', 'ativo'), ('criado_em', 'criado_em'),
+         ('atualizado_em', 'atualizado_em')],
+        temas=(Newsletter.temas.through, 'newsletter_id'),
+    ),
+}
+
+
+def lotes(tabela, lote=TAMANHO_LOTE):
+    """Gerador de lotes de até ``lote`` registros (dicts) da tabela"""
+    definicao = TABELAS[tabela]
+    nomes = [nome for nome, _ in definicao.colunas]
+    linhas = definicao.consulta().iterator(chunk_size=lote)
+    while bloco := list(islice(linhas, lote)):
+        registros = [dict(zip(nomes, linha)) for linha in bloco]
+        if definicao.temas:
+            temas = definicao.temas_do_lote([registro['id'] for registro in registros])
+            for registro in registros:
+                registro['temas'] = temas.get(registro['id'], [])
+        yield registros
+
+
+def _ndjson(tabela, lote):
+    for registros in lotes(tabela, lote):
+        yield ''.join(
+            json.dumps(registro, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n' for registro in registros
+        )
+
+
+def _valor_csv(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, list):
+        return SEPARADOR_TEMAS.join(valor)
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return valor
+
+
+def _csv(tabela, lote):
+    cabecalho = TABELAS[tabela].cabecalho
+    saida = io.StringIO()
+    escritor = csv.writer(saida)
+    escritor.writerow(cabecalho)
+    for registros in lotes(tabela, lote):
+        escritor.writerows([_valor_csv(registro[coluna]) for coluna in cabecalho] for registro in registros)
+        yield saida.getvalue()
+        saida.seek(0)
+        saida.truncate()
+    if saida.tell():
+        # Tabela vazia: só o cabeçalho
+        yield saida.getvalue()
+
+
+def _gzip(blocos):
+    compressor = zlib.compressobj(wbits=31)
+    for bloco in blocos:
+        comprimido = compressor.compress(bloco)
+        if comprimido:
+            yield comprimido
+    yield compressor.flush()
+
+
+def gerar(tabela, formato='ndjson', comprimir=False, lote=TAMANHO_LOTE):
+    """Gerador dos blocos (bytes) da exportação de ``tabela``"""
+    if tabela not in TABELAS:
+        raise ValueError(f'Tabela desconhecida: {tabela} (use {", ".join(TABELAS)})')
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato desconhecido: {formato} (use {", ".join(FORMATOS)})')
+    texto = _ndjson(tabela, lote) if formato == 'ndjson' else _csv(tabela, lote)
+    blocos = (parte.encode('utf-8') for parte in texto)
+    return _gzip(blocos) if comprimir else blocos
+
+
+def nome_arquivo(tabela, formato, comprimir=False):
+    return f'{tabela}-{timezone.localdate():%Y%m%d}.{formato}' + ('.gz' if comprimir else '')
@@ -0,0 +1,131 @@
+"""
+Feeds RSS e Atom dos últimos editoriais publicados: do portal, de um tema e
+de um autor. As views em ``portal.views`` os guardam no cache de páginas com
+as tags ``home``, ``tema:<id>`` e ``autor:<id>``, trocadas a cada publicação.
+"""
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.text import Truncator
+
+from . import cache_paginas
+from .contexto import contexto
+from .models import Autor, Editorial
+
+PALAVRAS_RESUMO = 60
+
+
+def quantidade():
+    return getattr(settings, 'FEEDS_ITENS', 20)
+
+
+class FeedEditoriais(Feed):
+    """Últimos editoriais publicados do portal"""
+
+    def title(self, obj):
+        return contexto.config().nome_site
+
+    def description(self, obj):
+        return contexto.config().tagline or f'Últimos editoriais de {self.title(obj)}'
+
+    def subtitle(self, obj):
+        # O Atom usa subtitle no lugar de description
+        return self.description(obj)
+
+    def link(self, obj):
+        return reverse('portal:home')
+
+    def publicados(self, obj):
+        return Editorial.obter_publicados()
+
+    def items(self, obj):
+        return self.publicados(obj)[:quantidade()]
+
+    def item_title(self, item):
+        return item.titulo
+
+    def item_description(self, item):
+        return Truncator(item.texto).words(PALAVRAS_RESUMO)
+
+    def item_link(self, item):
+        return reverse('portal:detalhe', args=[item.pk])
+
+    def item_pubdate(self, item):
+        return item.data_publicacao
+
+    def item_updateddate(self, item):
+        return item.data_atualizacao
+
+    def item_author_name(self, item):
+        return item.autor.nome_completo if item.autor else None
+
+    def item_categories(self, item):
+        return [tema.nome for tema in item.temas.all()]
+
+
+class FeedTema(FeedEditoriais):
+    """Últimos editoriais publicados de um tema"""
+
+    def get_object(self, request, tema_slug):
+        # Os temas ativos já estão em memória (portal.contexto)
+        tema = next((tema for tema in contexto.temas() if tema.slug == tema_slug), None)
+        if tema is None:
+            raise Http404('Tema não encontrado')
+        cache_paginas.marcar(request, f'tema:{tema.pk}')
+        return tema
+
+    def title(self, obj):
+        return f'{super().title(obj)} - {obj.nome}'
+
+    def description(self, obj):
+        return obj.descricao or f'Últimos editoriais sobre {obj.nome}'
+
+    def link(self, obj):
+        return reverse('portal:tema', args=[obj.slug])
+
+    def publicados(self, obj):
+        return Editorial.obter_por_tema(obj.slug)
+
+
+class FeedAutor(FeedEditoriais):
+    """Últimos editoriais publicados de um autor"""
+
+    def get_object(self, request, apelido):
+        autor = get_object_or_404(Autor, apelido=apelido, ativo=True)
+        cache_paginas.marcar(request, f'autor:{autor.pk}')
+        return autor
+
+    def title(self, obj):
+        return f'{super().title(obj)} - {obj.nome_completo}'
+
+    def description(self, obj):
+        return obj.resumo or f'Últimos editoriais de {obj.nome_completo}'
+
+    def link(self, obj):
+        return reverse('portal:detalhe_autor', args=[obj.apelido])
+
+    def publicados(self, obj):
+        return Editorial.obter_publicados().filter(autor=obj)
+
+
+def atom(classe):
+    """A mesma classe de feed no formato Atom"""
+    return type(f'{classe.__name__}Atom', (classe,), {'feed_type': Atom1Feed})
+
+
+FEEDS = {
+    'editoriais': {'rss': FeedEditoriais(), 'atom': atom(FeedEditoriais)()},
+    'tema': {'rss': FeedTema(), 'atom': atom(FeedTema)()},
+    'autor': {'rss': FeedAutor(), 'atom': atom(FeedAutor)()},
+}
+
+
+def obter(tipo, formato):
+    """Instância do feed, ou 404 para um formato desconhecido"""
+    try:
+        return FEEDS[tipo][formato]
+    except KeyError:
+        raise Http404('Formato de feed desconhecido')
@@ -0,0 +1,30 @@
+"""
+Respostas geradas em fluxo (sitemaps, exportações grandes).
+
+O conteúdo é um gerador síncrono que consulta o banco aos poucos
+(``iterator()``). No WSGI ele é entregue como está; no ASGI o Django
+acumularia um iterador síncrono inteiro em memória antes de enviar, então
+cada bloco é pedido ao gerador em thread (``sync_to_async``, sempre a mesma,
+com a mesma conexão) e entregue por um iterador assíncrono.
+"""
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+_FIM = object()
+
+
+async def _assincrono(partes):
+    proxima = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (parte := await proxima(partes, _FIM)) is not _FIM:
+            yield parte
+    finally:
+        await sync_to_async(partes.close, thread_sensitive=True)()
+
+
+def resposta_em_fluxo(request, partes, content_type, **kwargs):
+    """StreamingHttpResponse com o gerador ``partes``, sem acumulá-lo no ASGI"""
+    if isinstance(request, ASGIRequest):
+        partes = _assincrono(partes)
+    return StreamingHttpResponse(partes, content_type=content_type, **kwargs)
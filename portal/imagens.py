@@ -0,0 +1,237 @@
+"""
+Variantes redimensionadas das imagens enviadas (editoriais, autores e logo).
+
+Depois que um objeto é salvo com uma imagem nova, as variantes WebP e JPEG
+(PNG para imagens com transparência) são geradas nas larguras de
+``IMAGENS_LARGURAS`` por um pool de processos, fora da requisição. O resultado
+fica no campo ``variantes_imagens`` do próprio objeto::
+
+    {'imagem1': {'nome': 'editoriais/foto.jpg', 'largura': 2400, 'altura': 1600,
+                 'variantes': {'webp': [[320, 'derivadas/...'], ...], 'jpeg': [...]}}}
+
+e os templates montam ``srcset``, ``width``/``height`` e ``loading="lazy"``
+com a tag ``{% imagem %}`` sem abrir o arquivo. Enquanto as variantes não
+existem a tag usa a imagem original.
+"""
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import PurePosixPath
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+PASTA = 'derivadas'
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _config(nome, padrao):
+    return getattr(settings, nome, padrao)
+
+
+def caminho_variante(nome, largura, formato):
+    caminho = PurePosixPath(nome)
+    extensao = 'jpg' if formato == 'jpeg' else formato
+    return str(PurePosixPath(PASTA) / caminho.parent / f'{caminho.stem}-{largura}.{extensao}')
+
+
+def _larguras(largura_original):
+    configuradas = sorted(_config('IMAGENS_LARGURAS', (320, 640, 1024, 1600)))
+    larguras = {largura for largura in configuradas if largura < largura_original}
+    larguras.add(min(largura_original, configuradas[-1]))
+    return sorted(larguras)
+
+
+def _tem_transparencia(imagem):
+    if imagem.mode in ('RGBA', 'LA') or (imagem.mode == 'P' and 'transparency' in imagem.info):
+        return imagem.convert('RGBA').getchannel('A').getextrema()[0] < 255
+    return False
+
+
+def gerar_variantes(nome):
+    """
+    Gera as variantes da imagem ``nome`` no storage; roda nos processos do pool.
+
+    Não acessa o banco. Retorna as informações gravadas em ``variantes_imagens``.
+    """
+    from PIL import Image, ImageOps
+
+    with default_storage.open(nome, 'rb') as arquivo:
+        with Image.open(arquivo) as original:
+            imagem = ImageOps.exif_transpose(original)
+            imagem.load()
+
+    transparente = _tem_transparencia(imagem)
+    imagem = imagem.convert('RGBA' if transparente else 'RGB')
+    largura, altura = imagem.size
+    qualidade = _config('IMAGENS_QUALIDADE', 80)
+    alternativo = 'png' if transparente else 'jpeg'
+
+    variantes = {'webp': [], alternativo: []}
+    for largura_variante in _larguras(largura):
+        if largura_variante == largura:
+            redimensionada = imagem
+        else:
+            altura_variante = max(1, round(altura * largura_variante / largura))
+            redimensionada = imagem.resize((largura_variante, altura_variante), Image.LANCZOS)
+        for formato in variantes:
+            conteudo = io.BytesIO()
+            opcoes = {'optimize': True}
+            if formato != 'png':
+                opcoes['quality'] = qualidade
+            if formato == 'jpeg':
+                opcoes['progressive'] = True
+            redimensionada.save(conteudo, formato.upper(), **opcoes)
+            caminho = caminho_variante(nome, largura_variante, formato)
+            if default_storage.exists(caminho):
+                default_storage.delete(caminho)
+            caminho = default_storage.save(caminho, ContentFile(conteudo.getvalue()))
+            variantes[formato].append([largura_variante, caminho])
+
+    return {'nome': nome, 'largura': largura, 'altura': altura, 'variantes': variantes}
+
+
+def remover_variantes(info):
+    """Apaga do storage os arquivos das variantes descritas em ``info``"""
+    for lista in (info or {}).get('variantes', {}).values():
+        for _, caminho in lista:
+            try:
+                default_storage.delete(caminho)
+            except Exception:
+                logger.warning('Não foi possível apagar a variante %s', caminho)
+
+
+def _invalidar_paginas(modelo, pk):
+    from . import cache_paginas
+    from .contexto import contexto
+    from .signals import invalidar_paginas_editoriais
+
+    if modelo._meta.model_name == 'editorial':
+        invalidar_paginas_editoriais([pk])
+    elif modelo._meta.model_name == 'autor':
+        cache_paginas.invalidar(f'autor:{pk}', 'autores')
+    else:
+        cache_paginas.invalidar('site')
+        contexto.invalidar()
+
+
+def aplicar(rotulo, pk, campo, info):
+    """Grava as variantes geradas se o objeto ainda usa a mesma imagem"""
+    modelo = apps.get_model(rotulo)
+    with transaction.atomic():
+        objeto = modelo.objects.select_for_update().only('pk', campo, 'variantes_imagens').filter(pk=pk).first()
+        if objeto is None or getattr(objeto, campo).name != info['nome']:
+            # A imagem foi trocada ou removida enquanto as variantes eram geradas
+            transaction.on_commit(lambda: remover_variantes(info))
+            return False
+        variantes = dict(objeto.variantes_imagens or {})
+        anterior = variantes.get(campo)
+        variantes[campo] = info
+        modelo.objects.filter(pk=pk).update(variantes_imagens=variantes)
+        if anterior and anterior.get('nome') != info['nome']:
+            transaction.on_commit(lambda: remover_variantes(anterior))
+        transaction.on_commit(lambda: _invalidar_paginas(modelo, pk))
+    return True
+
+
+def _inicializar_processo():
+    import django
+
+    django.setup()
+
+
+def criar_pool(workers):
+    # spawn: o servidor tem threads, e fork com threads ativas é inseguro
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_inicializar_processo,
+    )
+
+
+def obter_pool():
+    """Pool de processos do processo atual, criado sob demanda"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = criar_pool(_config('IMAGENS_WORKERS', 2))
+        return _pool
+
+
+def _descartar_pool():
+    global _pool
+    _pool = None
+
+
+# O pool pertence ao processo que o criou
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_descartar_pool)
+
+
+def _concluir(rotulo, pk, campo, futuro):
+    try:
+        aplicar(rotulo, pk, campo, futuro.result())
+    except Exception:
+        logger.exception('Falha ao gerar as variantes de %s %s.%s', rotulo, pk, campo)
+    finally:
+        connection.close()
+
+
+def pendentes(objeto):
+    """Campos cuja imagem atual ainda não tem variantes: [(campo, nome)]"""
+    variantes = objeto.variantes_imagens or {}
+    resultado = []
+    for campo in type(objeto).CAMPOS_IMAGEM:
+        nome = getattr(objeto, campo).name
+        if nome and variantes.get(campo, {}).get('nome') != nome:
+            resultado.append((campo, nome))
+    return resultado
+
+
+def processar(objeto, campos=None, sincrono=None):
+    """
+    Gera as variantes pendentes do objeto.
+
+    Com ``IMAGENS_WORKERS`` = 0 (ou ``sincrono=True``) roda no processo atual;
+    senão envia ao pool e grava o resultado quando o processo terminar.
+    """
+    campos = pendentes(objeto) if campos is None else campos
+    if sincrono is None:
+        sincrono = _config('IMAGENS_WORKERS', 2) <= 0
+    rotulo = objeto._meta.label
+    for campo, nome in campos:
+        if sincrono:
+            try:
+                aplicar(rotulo, objeto.pk, campo, gerar_variantes(nome))
+            except Exception:
+                logger.exception('Falha ao gerar as variantes de %s %s.%s', rotulo, objeto.pk, campo)
+        else:
+            futuro = obter_pool().submit(gerar_variantes, nome)
+            futuro.add_done_callback(partial(_concluir, rotulo, objeto.pk, campo))
+
+
+def sincronizar(objeto):
+    """Após salvar: descarta variantes de imagens removidas e agenda as novas"""
+    variantes = objeto.variantes_imagens or {}
+    removidos = [campo for campo in variantes if not getattr(objeto, campo, None)]
+    if removidos:
+        restantes = {campo: info for campo, info in variantes.items() if campo not in removidos}
+        type(objeto).objects.filter(pk=objeto.pk).update(variantes_imagens=restantes)
+        objeto.variantes_imagens = restantes
+        antigos = [variantes[campo] for campo in removidos]
+        transaction.on_commit(lambda: [remover_variantes(info) for info in antigos])
+
+    campos = pendentes(objeto)
+    if campos:
+        transaction.on_commit(lambda: processar(objeto, campos))
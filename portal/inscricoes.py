@@ -0,0 +1,191 @@
+"""
+Inscrições na newsletter com upserts.
+
+``inscrever`` grava a inscrição em um único ``INSERT ... ON CONFLICT (email)
+DO UPDATE`` que só reativa uma inscrição cancelada; o ``RETURNING`` diz se ela
+foi criada, reativada ou já estava ativa. Inscrições simultâneas do mesmo
+e-mail não disputam um SELECT seguido de INSERT, e os temas são gravados com
+um DELETE e um ``INSERT ... SELECT`` (que descarta ids de temas
+inexistentes), na mesma transação.
+
+``importar`` lê um CSV em lotes (``importar_inscritos``): cada lote é um
+``bulk_create`` com ``ON CONFLICT`` para as inscrições e outro para a tabela
+de ligação com os temas.
+"""
+import csv
+
+from django.contrib.auth.base_user import BaseUserManager
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Newsletter, Tema
+
+CRIADA = 'criada'
+REATIVADA = 'reativada'
+JA_ATIVA = 'ja_ativa'
+
+TAMANHO_LOTE = 5000
+
+
+def normalizar_email(email):
+    """E-mail com o domínio em minúsculas, ou None se for inválido"""
+    email = BaseUserManager.normalize_email((email or '').strip())
+    try:
+        validate_email(email)
+    except ValidationError:
+        return None
+    return email
+
+
+def ids_temas(valores):
+    """Inteiros válidos de uma lista de ids vinda do formulário"""
+    # isdecimal(): isdigit() aceita '²', que int() recusa
+    return sorted({int(valor) for valor in valores if str(valor).strip().isdecimal()})
+
+
+def inscrever(email, temas_ids=()):
+    """
+    Inscreve (ou reativa) o e-mail já normalizado. Retorna ``(situacao, id)``;
+    os temas só são gravados se a inscrição foi criada ou reativada, e uma
+    reativação sem temas mantém os que estavam salvos.
+    """
+    tabela = connection.ops.quote_name(Newsletter._meta.db_table)
+    agora = connection.ops.adapt_datetimefield_value(timezone.now())
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            # Na inserção criado_em = atualizado_em; na reativação só o segundo muda
+            cursor.execute(
+                f'INSERT INTO {tabela} (email, ativo, criado_em, atualizado_em) VALUES (%s, %s, %s, %s) '
+                f'ON CONFLICT (email) DO UPDATE SET ativo = %s, atualizado_em = EXCLUDED.atualizado_em '
+                f'WHERE {tabela}.ativo = %s '
+                f'RETURNING id, criado_em = atualizado_em',
+                [email, True, agora, agora, True, False],
+            )
+            linha = cursor.fetchone()
+        if linha is None:
+            # Conflito com uma inscrição ativa: o UPDATE não se aplicou
+            return JA_ATIVA, None
+        pk, criada = linha
+        situacao = CRIADA if criada else REATIVADA
+        if temas_ids:
+            definir_temas(pk, temas_ids, substituir=situacao == REATIVADA)
+    return situacao, pk
+
+
+def definir_temas(newsletter_id, temas_ids, substituir=True):
+    """Substitui os temas da inscrição (dois comandos, sem ler os atuais); sem temas, mantém os atuais"""
+    if not temas_ids:
+        return
+    Relacao = Newsletter.temas.through
+    if substituir:
+        Relacao.objects.filter(newsletter_id=newsletter_id).exclude(tema_id__in=temas_ids).delete()
+    marcadores = ', '.join(['%s'] * len(temas_ids))
+    relacao, temas = (connection.ops.quote_name(modelo._meta.db_table) for modelo in (Relacao, Tema))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {relacao} (newsletter_id, tema_id) '
+            f'SELECT %s, id FROM {temas} WHERE id IN ({marcadores}) '
+            f'ON CONFLICT DO NOTHING',
+            [newsletter_id, *temas_ids],
+        )
+
+
+def cancelar(email):
+    """
+    Desativa a inscrição em um UPDATE; retorna se o e-mail existia. A parte
+    local é guardada como foi digitada: a comparação ignora maiúsculas.
+    """
+    return Newsletter.objects.filter(email__iexact=email).update(ativo=False, atualizado_em=timezone.now()) > 0
+
+
+def _mapa_temas():
+    """id, slug e nome (minúsculo) de cada tema -> id"""
+    mapa = {}
+    for pk, slug, nome in Tema.objects.values_list('pk', 'slug', 'nome'):
+        mapa[str(pk)] = mapa[slug.lower()] = mapa[nome.strip().lower()] = pk
+    return mapa
+
+
+def _ativo(valor):
+    return (valor or '').strip().lower() not in ('0', 'false', 'nao', 'não', 'n', 'inativo')
+
+
+def importar_lote(linhas, atualizar=False):
+    """
+    Grava um lote de ``{email: (ativo, {tema_id})}``. Com ``atualizar``, as
+    inscrições existentes recebem o ``ativo`` do arquivo; sem, ficam como
+    estão (quem cancelou não é reinscrito). Os temas são somados aos atuais.
+    Retorna quantas inscrições foram criadas.
+    """
+    Relacao = Newsletter.temas.through
+    agora = timezone.now()
+    emails = list(linhas)
+    with transaction.atomic():
+        existentes = Newsletter.objects.filter(email__in=emails).count()
+        objetos = [Newsletter(email=email, ativo=ativo, atualizado_em=agora) for email, (ativo, _) in linhas.items()]
+        if atualizar:
+            Newsletter.objects.bulk_create(
+                objetos, update_conflicts=True, unique_fields=['email'], update_fields=['ativo', 'atualizado_em']
+            )
+        else:
+            Newsletter.objects.bulk_create(objetos, ignore_conflicts=True)
+        ids = dict(Newsletter.objects.filter(email__in=emails).values_list('email', 'pk'))
+        Relacao.objects.bulk_create(
+            [
+                Relacao(newsletter_id=ids[email], tema_id=tema_id)
+                for email, (_, temas) in linhas.items()
+                for tema_id in sorted(temas)
+            ],
+            ignore_conflicts=True,
+        )
+    return len(emails) - existentes
+
+
+def importar(arquivo, atualizar=False, lote=TAMANHO_LOTE, delimitador=',', separador_temas=';', progresso=None):
+    """
+    Importa um CSV com a coluna ``email`` e, opcionais, ``temas`` (ids, slugs
+    ou nomes separados por ``separador_temas``) e ``ativo``. Lê o arquivo em
+    fluxo, ``lote`` linhas por vez. Retorna as contagens.
+    """
+    leitor = csv.DictReader(arquivo, delimiter=delimitador)
+    colunas = {(coluna or '').strip().lower(): coluna for coluna in (leitor.fieldnames or [])}
+    if 'email' not in colunas:
+        raise ValueError('O arquivo precisa de uma coluna "email"')
+
+    mapa = _mapa_temas()
+    resultado = {'linhas': 0, 'invalidas': 0, 'criadas': 0, 'temas_desconhecidos': set()}
+    pendentes = {}
+
+    def gravar():
+        resultado['criadas'] += importar_lote(pendentes, atualizar)
+        pendentes.clear()
+        if progresso:
+            progresso(resultado)
+
+    for linha in leitor:
+        resultado['linhas'] += 1
+        email = normalizar_email(linha.get(colunas['email']))
+        if email is None:
+            resultado['invalidas'] += 1
+            continue
+        temas = set()
+        for valor in (linha.get(colunas.get('temas', ''), '') or '').split(separador_temas):
+            valor = valor.strip()
+            if not valor:
+                continue
+            if valor.lower() in mapa:
+                temas.add(mapa[valor.lower()])
+            else:
+                resultado['temas_desconhecidos'].add(valor)
+        ativo = _ativo(linha.get(colunas['ativo'])) if 'ativo' in colunas else True
+        # E-mail repetido no arquivo: a última linha vale para o ativo, os temas se somam
+        if email in pendentes:
+            temas |= pendentes[email][1]
+        pendentes[email] = (ativo, temas)
+        if len(pendentes) >= lote:
+            gravar()
+    if pendentes:
+        gravar()
+    return resultado
@@ -0,0 +1,281 @@
+import io
+import json
+import platform
+import random
+import subprocess
+from datetime import datetime, timezone as dt_timezone
+from urllib.parse import quote, urlencode, urlsplit
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Q
+from django.test import Client, override_settings
+
+from portal import carga, massa, paginacao
+from portal.contexto import contexto
+from portal.models import Autor, Editorial, Tema
+from portal.orcamento import contar_consultas
+
+# Peso de cada rota na mistura de tráfego (proporção das requisições)
+PESOS = {
+    'home': 20,
+    'tema': 15,
+    'tema_profunda': 5,
+    'detalhe': 30,
+    'autor': 5,
+    'busca': 10,
+    'temas_api': 10,
+    'newsletter': 5,
+}
+
+TERMOS_BUSCA = ['governo', 'saúde', 'mercado', 'educação', 'tecnologia', 'cidade', 'projeto', 'brasil']
+
+
+class Command(BaseCommand):
+    help = 'Mede vazão, latência (p50/p95/p99) e consultas SQL por rota do portal, com uma mistura realista de tráfego'
+
+    def add_arguments(self, parser):
+        massa_grupo = parser.add_argument_group('massa de dados')
+        massa_grupo.add_argument('--semear', action='store_true', help='Gera a massa de dados antes de medir')
+        massa_grupo.add_argument('--editoriais', type=int, default=2000, help='Editoriais gerados com --semear')
+        massa_grupo.add_argument('--temas', type=int, default=8, help='Temas gerados com --semear')
+        massa_grupo.add_argument('--autores', type=int, default=30, help='Autores gerados com --semear')
+        massa_grupo.add_argument('--inscritos', type=int, default=0, help='Inscritos gerados com --semear')
+        massa_grupo.add_argument('--semente', type=int, default=42, help='Semente da massa e da mistura de URLs')
+
+        carga_grupo = parser.add_argument_group('carga')
+        carga_grupo.add_argument(
+            '--url',
+            help='Mede um servidor já em execução (ex.: http://127.0.0.1:8000) em vez de subir um'
+        )
+        carga_grupo.add_argument('--modo', choices=carga.MODOS, default='wsgi', help='Modo do servidor iniciado')
+        carga_grupo.add_argument('--workers', type=int, default=4, help='Workers do servidor iniciado')
+        carga_grupo.add_argument('--porta', type=int, default=8765, help='Porta do servidor iniciado')
+        carga_grupo.add_argument('--concorrencia', type=int, default=20, help='Requisições simultâneas')
+        carga_grupo.add_argument('--requisicoes', type=int, default=2000, help='Requisições medidas')
+        carga_grupo.add_argument('--aquecimento', type=int, default=200, help='Requisições descartadas no início')
+        carga_grupo.add_argument(
+            '--profundidade',
+            type=int,
+            default=600,
+            help='Posição do primeiro item da página profunda de tema (paginação por cursor)'
+        )
+        carga_grupo.add_argument(
+            '--sem-cache',
+            action='store_true',
+            help='Desliga o cache de páginas no servidor iniciado'
+        )
+
+        saida_grupo = parser.add_argument_group('resultado')
+        saida_grupo.add_argument('--saida', help='Grava o resultado (JSON) neste arquivo')
+        saida_grupo.add_argument('--comparar', help='Compara com um resultado anterior (JSON)')
+
+    def handle(self, *args, **options):
+        quantidades = None
+        if options['semear']:
+            quantidades = self.semear(options)
+        if not Editorial.objects.publicados().exists():
+            raise CommandError('Não há editoriais publicados; use --semear para gerar a massa de dados.')
+
+        aleatorio = random.Random(options['semente'])
+        alvos = self.mistura(aleatorio, options)
+        self.stdout.write(f'{len(alvos)} URLs na mistura; contando consultas por rota...')
+        consultas = self.consultas_por_rota(alvos)
+
+        self.stdout.write(f'Medindo {options["requisicoes"]} requisições com {options["concorrencia"]} simultâneas...')
+        if options['url']:
+            partes = urlsplit(options['url'])
+            medicoes = carga.executar(
+                partes.hostname, partes.port or 80, alvos,
+                options['requisicoes'], options['concorrencia'], options['aquecimento'],
+            )
+        else:
+            ambiente = {'CACHE_PAGINAS_ATIVO': 'False'} if options['sem_cache'] else {}
+            with carga.ServidorLocal(options['modo'], options['porta'], options['workers'], ambiente) as servidor:
+                medicoes = carga.executar(
+                    servidor.host, servidor.porta, alvos,
+                    options['requisicoes'], options['concorrencia'], options['aquecimento'],
+                )
+
+        resultado = self.montar_resultado(options, quantidades, medicoes.resumo(), consultas)
+        self.imprimir(resultado)
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f'Resultado gravado em {options["saida"]}'))
+        if options['comparar']:
+            with open(options['comparar'], encoding='utf-8') as arquivo:
+                self.imprimir_comparacao(json.load(arquivo), resultado)
+
+    def semear(self, options):
+        self.stdout.write('Gerando a massa de dados...')
+        quantidades = massa.gerar(
+            options['editoriais'], options['temas'], options['autores'], options['inscritos'], options['semente']
+        )
+        # bulk_create não dispara os sinais que mantêm a busca e os relacionados
+        call_command('reindexar_busca', stdout=io.StringIO())
+        call_command('calcular_relacionados', stdout=io.StringIO())
+        self.stdout.write(self.style.SUCCESS(f'Massa gerada: {quantidades}'))
+        return quantidades
+
+    def mistura(self, aleatorio, options):
+        """Alvos repetidos conforme PESOS e embaralhados (determinístico pela semente)"""
+        temas = list(
+            Tema.objects.filter(ativo=True).annotate(
+                total=Count('editoriais', filter=Q(editoriais__status='publicado'))
+            ).order_by('-total', 'pk')[:10]
+        )
+        ids = list(
+            Editorial.objects.publicados().order_by(*paginacao.ORDEM_PUBLICACAO).values_list('pk', flat=True)[:5000]
+        )
+        apelidos = list(Autor.objects.filter(ativo=True).order_by('pk').values_list('apelido', flat=True)[:50])
+
+        por_rota = {
+            'home': [('/', None)],
+            'tema': [(f'/tema/{tema.slug}/', None) for tema in temas],
+            'tema_profunda': self.paginas_profundas(temas, options['profundidade']),
+            'detalhe': [(f'/editorial/{pk}/', None) for pk in aleatorio.sample(ids, min(len(ids), 200))],
+            'autor': [(f'/autor/{quote(apelido)}/', None) for apelido in apelidos],
+            'busca': [(f'/buscar/?{urlencode({"q": termo})}', None) for termo in TERMOS_BUSCA],
+            'temas_api': [('/api/temas/', None)],
+            'newsletter': [('/api/inscrever-newsletter/', self.corpo_inscricao(options['semente']))],
+        }
+
+        alvos = []
+        for nome, peso in PESOS.items():
+            opcoes = por_rota[nome]
+            if not opcoes:
+                continue
+            for indice in range(peso * 10):
+                caminho, corpo = opcoes[indice % len(opcoes)]
+                metodo = 'POST' if corpo is not None else 'GET'
+                alvos.append(carga.Alvo(nome, caminho, metodo, corpo))
+        aleatorio.shuffle(alvos)
+        return alvos
+
+    def paginas_profundas(self, temas, profundidade):
+        """Páginas de tema a partir do item ``profundidade`` (cursor assinado)"""
+        paginas = []
+        for tema in temas[:3]:
+            chaves = Editorial.obter_por_tema(tema.slug).order_by(*paginacao.ORDEM_PUBLICACAO).values_list(
+                'data_publicacao', 'pk'
+            )
+            chave = chaves[profundidade:profundidade + 1].first()
+            if chave is not None:
+                cursor = paginacao.codificar_cursor(paginacao.PROXIMA, chave)
+                paginas.append((f'/tema/{tema.slug}/?{urlencode({paginacao.PARAMETRO: cursor})}', None))
+        return paginas
+
+    @staticmethod
+    def corpo_inscricao(semente):
+        execucao = datetime.now().strftime('%Y%m%d%H%M%S')
+
+        def corpo(indice):
+            return urlencode({'email': f'benchmark-{semente}-{execucao}-{indice}@exemplo.com'})
+
+        return corpo
+
+    def consultas_por_rota(self, alvos):
+        """Consultas SQL de uma requisição de cada rota, sem o cache de páginas; a inscrição é desfeita"""
+        cliente = Client()
+        consultas = {}
+        primeiros = {}
+        for alvo in alvos:
+            primeiros.setdefault(alvo.nome, alvo)
+        # Carrega o contexto do site antes, para que não conte na primeira rota
+        contexto.obter()
+        with override_settings(CACHE_PAGINAS_ATIVO=False, ALLOWED_HOSTS=['testserver']):
+            for nome, alvo in sorted(primeiros.items()):
+                with transaction.atomic():
+                    with contar_consultas() as contador:
+                        if alvo.metodo == 'POST':
+                            resposta = cliente.post(
+                                alvo.caminho, alvo.corpo(0), content_type='application/x-www-form-urlencoded'
+                            )
+                        else:
+                            resposta = cliente.get(alvo.caminho)
+                    transaction.set_rollback(True)
+                if resposta.status_code >= 400:
+                    self.stderr.write(f'{nome}: {alvo.caminho} respondeu {resposta.status_code}')
+                consultas[nome] = len(contador)
+        return consultas
+
+    def montar_resultado(self, options, quantidades, resumo, consultas):
+        for nome, dados in resumo['rotas'].items():
+            dados['consultas'] = consultas.get(nome)
+        return {
+            'versao': self.versao(),
+            'data': datetime.now(dt_timezone.utc).isoformat(timespec='seconds'),
+            'ambiente': {
+                'python': platform.python_version(),
+                'banco': settings.DATABASES['default']['ENGINE'].rsplit('.', 1)[-1],
+                'servidor': options['url'] or options['modo'],
+                'workers': None if options['url'] else options['workers'],
+                'cache_paginas': not options['sem_cache'],
+            },
+            'carga': {
+                'requisicoes': options['requisicoes'],
+                'concorrencia': options['concorrencia'],
+                'aquecimento': options['aquecimento'],
+                'semente': options['semente'],
+            },
+            'massa': quantidades or {
+                'temas': Tema.objects.count(),
+                'autores': Autor.objects.count(),
+                'editoriais': Editorial.objects.publicados().count(),
+            },
+            'total': resumo['total'],
+            'rotas': resumo['rotas'],
+        }
+
+    @staticmethod
+    def versao():
+        try:
+            return subprocess.run(
+                ['git', 'describe', '--always', '--dirty'],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def imprimir(self, resultado):
+        self.stdout.write(
+            f'\n{"rota":<14} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"SQL":>5} {"erros":>6}'
+        )
+        linhas = list(resultado['rotas'].items()) + [('total', resultado['total'])]
+        for rota, dados in linhas:
+            consultas = dados.get('consultas')
+            self.stdout.write(
+                f'{rota:<14} {dados["vazao"]:>8} {dados["p50_ms"]:>8} {dados["p95_ms"]:>8} '
+                f'{dados["p99_ms"]:>8} {"" if consultas is None else consultas:>5} {dados["erros"]:>6}'
+            )
+
+    def imprimir_comparacao(self, anterior, atual):
+        self.stdout.write(f'\nComparação com {anterior.get("versao")} ({anterior.get("data")}):')
+        self.stdout.write(f'{"rota":<14} {"req/s":>10} {"p99 ms":>10} {"SQL":>6}')
+        rotas = sorted(set(anterior['rotas']) | set(atual['rotas'])) + ['total']
+        for rota in rotas:
+            antes = anterior['total'] if rota == 'total' else anterior['rotas'].get(rota)
+            depois = atual['total'] if rota == 'total' else atual['rotas'].get(rota)
+            if not antes or not depois:
+                self.stdout.write(f'{rota:<14} {"(só em um dos resultados)":>28}')
+                continue
+            self.stdout.write(
+                f'{rota:<14} {self.variacao(antes["vazao"], depois["vazao"]):>10} '
+                f'{self.variacao(antes["p99_ms"], depois["p99_ms"]):>10} '
+                f'{self.diferenca(antes.get("consultas"), depois.get("consultas")):>6}'
+            )
+
+    @staticmethod
+    def variacao(antes, depois):
+        if not antes or depois is None:
+            return '-'
+        return f'{(depois - antes) / antes * 100:+.1f}%'
+
+    @staticmethod
+    def diferenca(antes, depois):
+        if antes is None or depois is None:
+            return '-'
+        return f'{depois - antes:+d}'
@@ -0,0 +1,99 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from portal import relacionados
+from portal.models import Editorial, EditorialRelacionado, RelacionadoPendente
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula a tabela de editoriais relacionados de todos os editoriais publicados, '
+        'ou só os da fila (--pendentes)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limpar',
+            action='store_true',
+            help='Remove todas as relações antes de recalcular'
+        )
+        parser.add_argument(
+            '--pendentes',
+            action='store_true',
+            help='Processa só a fila das alterações em lote (RelacionadoPendente)'
+        )
+        parser.add_argument(
+            '--daemon',
+            action='store_true',
+            help='Com --pendentes, continua rodando e verifica a fila periodicamente'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=int,
+            default=30,
+            help='Segundos entre as verificações no modo daemon'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=relacionados.TAMANHO_LOTE,
+            help='Editoriais recalculados por transação (uma invalidação do cache por lote)'
+        )
+
+    def handle(self, *args, **options):
+        if options['pendentes']:
+            return self.processar_fila(options)
+
+        inicio = timezone.now()
+        if options['limpar']:
+            EditorialRelacionado.objects.all().delete()
+
+        ids = list(Editorial.objects.publicados().order_by('pk').values_list('pk', flat=True))
+        for indice in range(0, len(ids), options['lote']):
+            # Todas as listas são recalculadas: não é preciso atualizar as dos candidatos
+            relacionados.atualizar_varios(ids[indice:indice + options['lote']], reciproco=False)
+            self.stdout.write(f'{min(indice + options["lote"], len(ids))}/{len(ids)} editoriais processados')
+
+        # Relações de editoriais que deixaram de ser publicados
+        removidas, _ = EditorialRelacionado.objects.exclude(editorial_id__in=ids).delete()
+        # A fila anterior ao recálculo já foi atendida
+        RelacionadoPendente.objects.filter(marcado_em__lte=inicio).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Relacionados calculados para {len(ids)} editorial(is); {removidas} relação(ões) obsoleta(s) removida(s).'
+        ))
+
+    def processar_fila(self, options):
+        if not options['daemon']:
+            total = relacionados.processar_pendentes(options['lote'])
+            self.stdout.write(self.style.SUCCESS(f'{total} editorial(is) da fila recalculado(s).'))
+            return
+
+        self.executando = True
+        signal.signal(signal.SIGTERM, self.parar)
+        signal.signal(signal.SIGINT, self.parar)
+        self.stdout.write(f'Verificando a fila de relacionados a cada {options["intervalo"]}s...')
+
+        while self.executando:
+            close_old_connections()
+            try:
+                total = relacionados.processar_pendentes(options['lote'])
+            except Exception as e:
+                self.stderr.write(f'Erro ao recalcular relacionados: {e}')
+            else:
+                if total:
+                    self.stdout.write(self.style.SUCCESS(f'{total} editorial(is) da fila recalculado(s).'))
+            self.aguardar(options['intervalo'])
+
+        self.stdout.write('Encerrado.')
+
+    def parar(self, signum, frame):
+        self.executando = False
+
+    def aguardar(self, segundos):
+        fim = time.monotonic() + segundos
+        while self.executando and time.monotonic() < fim:
+            time.sleep(min(1, fim - time.monotonic()))
@@ -0,0 +1,77 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from portal import carga
+from portal.models import Autor, Editorial, Tema
+
+
+class Command(BaseCommand):
+    help = 'Compara vazão e latência do portal servido por gunicorn em modo WSGI e ASGI (uvicorn)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modos',
+            default='wsgi,asgi',
+            help='Modos comparados, separados por vírgula (wsgi, asgi)'
+        )
+        parser.add_argument('--workers', type=int, default=4, help='Workers do gunicorn')
+        parser.add_argument('--concorrencia', type=int, default=50, help='Requisições simultâneas')
+        parser.add_argument('--requisicoes', type=int, default=2000, help='Requisições medidas por modo')
+        parser.add_argument('--aquecimento', type=int, default=200, help='Requisições descartadas no início')
+        parser.add_argument('--porta', type=int, default=8765, help='Porta local do servidor')
+        parser.add_argument(
+            '--sem-cache',
+            action='store_true',
+            help='Desliga o cache de páginas no servidor, para medir o acesso ao banco'
+        )
+        parser.add_argument('--json', action='store_true', help='Imprime o resultado em JSON')
+
+    def alvos(self):
+        alvos = [carga.Alvo('home', '/'), carga.Alvo('temas_api', '/api/temas/')]
+        tema = Tema.objects.filter(ativo=True).order_by('pk').first()
+        if tema:
+            alvos.append(carga.Alvo('tema', f'/tema/{tema.slug}/'))
+        editorial = Editorial.obter_publicados().only('pk').first()
+        if editorial:
+            alvos.append(carga.Alvo('detalhe', f'/editorial/{editorial.pk}/'))
+        autor = Autor.objects.filter(ativo=True).exclude(apelido='').order_by('pk').first()
+        if autor:
+            alvos.append(carga.Alvo('autor', f'/autor/{autor.apelido}/'))
+        alvos.append(carga.Alvo('busca', '/buscar/?q=brasil'))
+        return alvos
+
+    def handle(self, *args, **options):
+        modos = [modo.strip() for modo in options['modos'].split(',') if modo.strip()]
+        desconhecidos = set(modos) - set(carga.MODOS)
+        if desconhecidos:
+            raise CommandError(f'Modos desconhecidos: {", ".join(sorted(desconhecidos))}')
+
+        alvos = self.alvos()
+        ambiente = {'CACHE_PAGINAS_ATIVO': 'False'} if options['sem_cache'] else {}
+        resultados = {}
+        for modo in modos:
+            if not options['json']:
+                self.stdout.write(f'Medindo {modo} ({options["workers"]} workers, '
+                                  f'{options["concorrencia"]} simultâneas)...')
+            with carga.ServidorLocal(modo, options['porta'], options['workers'], ambiente) as servidor:
+                medicoes = carga.executar(
+                    servidor.host, servidor.porta, alvos,
+                    options['requisicoes'], options['concorrencia'], options['aquecimento'],
+                )
+            resultados[modo] = medicoes.resumo()
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultados, indent=2, ensure_ascii=False))
+            return
+        self.imprimir(resultados)
+
+    def imprimir(self, resultados):
+        self.stdout.write(f'\n{"modo":<6} {"rota":<10} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"erros":>6}')
+        for modo, resumo in resultados.items():
+            linhas = [('total', resumo['total'])] + list(resumo['rotas'].items())
+            for rota, dados in linhas:
+                self.stdout.write(
+                    f'{modo:<6} {rota:<10} {dados["vazao"]:>8} {dados["p50_ms"]:>8} '
+                    f'{dados["p95_ms"]:>8} {dados["p99_ms"]:>8} {dados["erros"]:>6}'
+                )
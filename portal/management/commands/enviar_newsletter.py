@@ -0,0 +1,93 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from portal import newsletter
+from portal.models import Editorial
+
+
+class Command(BaseCommand):
+    help = 'Processa os envios de newsletter pendentes e retoma os interrompidos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--envio',
+            type=int,
+            help='Processa somente o envio informado'
+        )
+        parser.add_argument(
+            '--editorial',
+            type=int,
+            help='Cria e processa o envio do editorial para os inscritos nos seus temas'
+        )
+        parser.add_argument(
+            '--daemon',
+            action='store_true',
+            help='Continua rodando e processa novos envios periodicamente'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=int,
+            default=30,
+            help='Segundos entre as verificações no modo daemon'
+        )
+        parser.add_argument('--workers', type=int, help='Lotes enviados em paralelo')
+        parser.add_argument('--lote', type=int, help='Destinatários por conexão SMTP')
+        parser.add_argument('--taxa', type=float, help='Máximo de mensagens por segundo (0 = sem limite)')
+
+    def handle(self, *args, **options):
+        self.opcoes = {chave: options[chave] for chave in ('workers', 'lote', 'taxa')}
+
+        if options['editorial']:
+            try:
+                editorial = Editorial.objects.get(pk=options['editorial'])
+            except Editorial.DoesNotExist:
+                raise CommandError(f'Editorial {options["editorial"]} não encontrado.')
+            envio = newsletter.criar_envio_editorial(editorial)
+            self.stdout.write(f'Envio #{envio.pk} criado com {envio.total} destinatário(s).')
+            self.processar(envio.pk)
+            return
+
+        if options['envio']:
+            self.processar(options['envio'])
+            return
+
+        if not options['daemon']:
+            self.processar_disponiveis()
+            return
+
+        self.executando = True
+        signal.signal(signal.SIGTERM, self.parar)
+        signal.signal(signal.SIGINT, self.parar)
+        self.stdout.write(f'Verificando envios a cada {options["intervalo"]}s...')
+        while self.executando:
+            close_old_connections()
+            try:
+                self.processar_disponiveis()
+            except Exception as e:
+                self.stderr.write(f'Erro ao processar envios: {e}')
+            self.aguardar(options['intervalo'])
+        self.stdout.write('Encerrado.')
+
+    def processar_disponiveis(self):
+        for envio_id in newsletter.envios_disponiveis():
+            self.processar(envio_id)
+
+    def processar(self, envio_id):
+        envio = newsletter.processar_envio(envio_id, **self.opcoes)
+        if envio is None:
+            self.stdout.write(f'Envio #{envio_id} concluído ou em processamento por outro processo.')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Envio #{envio.pk}: {envio.enviados} enviado(s), {envio.falhas} falha(s) de {envio.total}.'
+        ))
+
+    def parar(self, signum, frame):
+        self.executando = False
+
+    def aguardar(self, segundos):
+        fim = time.monotonic() + segundos
+        while self.executando and time.monotonic() < fim:
+            time.sleep(min(1, fim - time.monotonic()))
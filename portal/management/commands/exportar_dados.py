@@ -0,0 +1,69 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from portal import extracao
+
+
+class Command(BaseCommand):
+    help = 'Exporta editoriais, autores, temas ou inscritos em NDJSON ou CSV, em fluxo (memória constante)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'tabela',
+            choices=list(extracao.TABELAS),
+            help='O que exportar'
+        )
+        parser.add_argument(
+            '--formato',
+            choices=list(extracao.FORMATOS),
+            default='ndjson',
+            help='Formato das linhas'
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='Comprime a saída (implícito quando --saida termina em .gz)'
+        )
+        parser.add_argument(
+            '--saida',
+            default='-',
+            help='Arquivo de destino (padrão: saída padrão)'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=extracao.TAMANHO_LOTE,
+            help='Linhas lidas do banco por vez'
+        )
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote precisa ser maior que zero')
+        comprimir = options['gzip'] or options['saida'].endswith('.gz')
+        blocos = extracao.gerar(options['tabela'], options['formato'], comprimir, options['lote'])
+
+        inicio = time.perf_counter()
+        try:
+            if options['saida'] == '-':
+                total = self.gravar(blocos, getattr(self.stdout, 'buffer', None) or sys.stdout.buffer)
+            else:
+                with open(options['saida'], 'wb') as destino:
+                    total = self.gravar(blocos, destino)
+        except OSError as erro:
+            raise CommandError(erro)
+        duracao = time.perf_counter() - inicio
+
+        # O resumo vai para stderr: a saída padrão pode ser o próprio arquivo
+        self.stderr.write(self.style.SUCCESS(
+            f'{options["tabela"]} exportados em {duracao:.1f}s ({total / 1024:.0f} KiB)'
+        ))
+
+    def gravar(self, blocos, destino):
+        total = 0
+        for bloco in blocos:
+            destino.write(bloco)
+            total += len(bloco)
+        destino.flush()
+        return total
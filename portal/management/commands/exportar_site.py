@@ -0,0 +1,98 @@
+import signal
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from portal import exportacao
+
+
+class Command(BaseCommand):
+    help = 'Exporta home, temas, autores e editoriais publicados para HTML estático servido pelo nginx'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Processos que renderizam as páginas em paralelo'
+        )
+        parser.add_argument(
+            '--limpar',
+            action='store_true',
+            help='Descarta a exportação atual antes de exportar'
+        )
+        parser.add_argument(
+            '--pendentes',
+            action='store_true',
+            help='Regenera só as páginas da fila das alterações (PaginaPendente)'
+        )
+        parser.add_argument(
+            '--daemon',
+            action='store_true',
+            help='Com --pendentes, continua rodando e verifica a fila periodicamente'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=int,
+            default=5,
+            help='Segundos entre as verificações no modo daemon'
+        )
+
+    def handle(self, *args, **options):
+        if options['pendentes']:
+            return self.processar_fila(options)
+
+        if options['limpar']:
+            exportacao.descartar()
+        inicio = time.perf_counter()
+        resultado = exportacao.exportar_tudo(workers=options['workers'], progresso=self.progresso)
+        duracao = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado["gravadas"]} páginas exportadas em {duracao:.1f}s para {exportacao.diretorio()} '
+            f'({resultado["removidas"]} removidas)'
+        ))
+        if not getattr(settings, 'EXPORTACAO_ATIVA', False):
+            self.stdout.write(self.style.WARNING(
+                'EXPORTACAO_ATIVA está desligada: as alterações não vão regenerar as páginas exportadas.'
+            ))
+
+    def progresso(self, feitas, total):
+        if feitas == total or feitas % 1000 < exportacao.TAMANHO_LOTE:
+            self.stdout.write(f'  {feitas}/{total} páginas')
+
+    def processar_fila(self, options):
+        # O pool é criado uma vez e atende todas as rodadas do daemon
+        with exportacao.criar_pool(options['workers']) if options['workers'] > 1 else nullcontext() as pool:
+            if not options['daemon']:
+                total = exportacao.processar_pendentes(pool)
+                self.stdout.write(self.style.SUCCESS(f'{total} página(s) da fila regenerada(s).'))
+                return
+
+            self.executando = True
+            signal.signal(signal.SIGTERM, self.parar)
+            signal.signal(signal.SIGINT, self.parar)
+            self.stdout.write(f'Verificando a fila de páginas a cada {options["intervalo"]}s...')
+
+            while self.executando:
+                close_old_connections()
+                try:
+                    total = exportacao.processar_pendentes(pool)
+                except Exception as e:
+                    self.stderr.write(f'Erro ao regenerar páginas: {e}')
+                else:
+                    if total:
+                        self.stdout.write(self.style.SUCCESS(f'{total} página(s) da fila regenerada(s).'))
+                self.aguardar(options['intervalo'])
+
+        self.stdout.write('Encerrado.')
+
+    def parar(self, signum, frame):
+        self.executando = False
+
+    def aguardar(self, segundos):
+        fim = time.monotonic() + segundos
+        while self.executando and time.monotonic() < fim:
+            time.sleep(min(1, fim - time.monotonic()))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from portal.models import Editorial
+
+
+class Command(BaseCommand):
+    help = 'Pré-renderiza as seções de texto (layout) dos editoriais em lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=500,
+            help='Quantidade de editoriais por lote'
+        )
+        parser.add_argument(
+            '--todos',
+            action='store_true',
+            help='Regera também os editoriais que já têm seções salvas'
+        )
+
+    def handle(self, *args, **options):
+        tamanho = options['lote']
+        editoriais = Editorial.objects.order_by('pk')
+        if not options['todos']:
+            editoriais = editoriais.filter(secoes_html__isnull=True)
+        ids = list(editoriais.values_list('pk', flat=True))
+
+        for inicio in range(0, len(ids), tamanho):
+            lote = list(Editorial.objects.filter(pk__in=ids[inicio:inicio + tamanho]).only('id', 'texto', 'layout'))
+            for editorial in lote:
+                editorial.secoes_html = editorial.gerar_secoes_html()
+            Editorial.objects.bulk_update(lote, ['secoes_html'])
+            self.stdout.write(f'{min(inicio + tamanho, len(ids))}/{len(ids)} editoriais processados')
+
+        self.stdout.write(self.style.SUCCESS(f'Seções geradas para {len(ids)} editorial(is).'))
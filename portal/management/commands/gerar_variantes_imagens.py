@@ -0,0 +1,81 @@
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from portal import imagens
+from portal.models import Autor, ConfiguracaoSite, Editorial
+
+MODELOS = (Editorial, Autor, ConfiguracaoSite)
+
+
+class Command(BaseCommand):
+    help = 'Gera as variantes redimensionadas das imagens já enviadas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Processos que geram as variantes em paralelo'
+        )
+        parser.add_argument(
+            '--todos',
+            action='store_true',
+            help='Regera também as imagens que já têm variantes'
+        )
+
+    def handle(self, *args, **options):
+        tarefas = list(self.gerar_tarefas(options['todos']))
+        self.stdout.write(f'{len(tarefas)} imagem(ns) para processar.')
+
+        total = falhas = 0
+        if options['workers'] <= 1:
+            for rotulo, pk, campo, nome in tarefas:
+                if self.aplicar(rotulo, pk, campo, lambda: imagens.gerar_variantes(nome)):
+                    total += 1
+                else:
+                    falhas += 1
+        else:
+            with imagens.criar_pool(options['workers']) as pool:
+                em_voo = {}
+                pendentes = iter(tarefas)
+                while True:
+                    # Mantém poucas tarefas na fila do pool para não acumular memória
+                    for rotulo, pk, campo, nome in pendentes:
+                        em_voo[pool.submit(imagens.gerar_variantes, nome)] = (rotulo, pk, campo)
+                        if len(em_voo) >= options['workers'] * 2:
+                            break
+                    if not em_voo:
+                        break
+                    prontos, _ = wait(em_voo, return_when=FIRST_COMPLETED)
+                    for futuro in prontos:
+                        rotulo, pk, campo = em_voo.pop(futuro)
+                        if self.aplicar(rotulo, pk, campo, futuro.result):
+                            total += 1
+                        else:
+                            falhas += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Variantes geradas para {total} imagem(ns); {falhas} falha(s).'))
+
+    def gerar_tarefas(self, todos):
+        for modelo in MODELOS:
+            com_imagem = Q()
+            for campo in modelo.CAMPOS_IMAGEM:
+                com_imagem |= ~Q(**{campo: ''}) & Q(**{f'{campo}__isnull': False})
+            objetos = modelo.objects.filter(com_imagem).only('pk', 'variantes_imagens', *modelo.CAMPOS_IMAGEM)
+            for objeto in objetos.order_by('pk').iterator(chunk_size=500):
+                if todos:
+                    campos = [(campo, getattr(objeto, campo).name) for campo in modelo.CAMPOS_IMAGEM
+                              if getattr(objeto, campo)]
+                else:
+                    campos = imagens.pendentes(objeto)
+                for campo, nome in campos:
+                    yield modelo._meta.label, objeto.pk, campo, nome
+
+    def aplicar(self, rotulo, pk, campo, gerar):
+        try:
+            return imagens.aplicar(rotulo, pk, campo, gerar())
+        except Exception as e:
+            self.stderr.write(f'Erro em {rotulo} {pk}.{campo}: {e}')
+            return False
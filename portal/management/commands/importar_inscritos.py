@@ -0,0 +1,76 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from portal import inscricoes
+
+
+class Command(BaseCommand):
+    help = 'Importa inscritos da newsletter de um CSV (colunas email, temas e ativo) em lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'arquivo',
+            help='Arquivo CSV (use - para ler da entrada padrão)'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=inscricoes.TAMANHO_LOTE,
+            help='Inscrições gravadas por transação'
+        )
+        parser.add_argument(
+            '--atualizar',
+            action='store_true',
+            help='Aplica o "ativo" do arquivo às inscrições existentes (sem isso, quem cancelou continua cancelado)'
+        )
+        parser.add_argument(
+            '--delimitador',
+            default=',',
+            help='Separador das colunas do CSV'
+        )
+        parser.add_argument(
+            '--separador-temas',
+            default=';',
+            help='Separador dos temas (ids, slugs ou nomes) dentro da coluna "temas"'
+        )
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote precisa ser maior que zero')
+        inicio = time.perf_counter()
+        try:
+            if options['arquivo'] == '-':
+                resultado = self.importar(sys.stdin, options)
+            else:
+                with open(options['arquivo'], newline='', encoding='utf-8-sig') as arquivo:
+                    resultado = self.importar(arquivo, options)
+        except (OSError, ValueError) as erro:
+            raise CommandError(erro)
+        duracao = time.perf_counter() - inicio
+
+        validas = resultado['linhas'] - resultado['invalidas']
+        self.stdout.write(self.style.SUCCESS(
+            f'{validas} inscrições importadas em {duracao:.1f}s ({resultado["criadas"]} novas, '
+            f'{resultado["invalidas"]} linhas com e-mail inválido)'
+        ))
+        if resultado['temas_desconhecidos']:
+            desconhecidos = sorted(resultado['temas_desconhecidos'])
+            self.stdout.write(self.style.WARNING(
+                f'Temas desconhecidos ignorados: {", ".join(desconhecidos[:20])}'
+                + (f' e mais {len(desconhecidos) - 20}' if len(desconhecidos) > 20 else '')
+            ))
+
+    def importar(self, arquivo, options):
+        return inscricoes.importar(
+            arquivo,
+            atualizar=options['atualizar'],
+            lote=options['lote'],
+            delimitador=options['delimitador'],
+            separador_temas=options['separador_temas'],
+            progresso=self.progresso,
+        )
+
+    def progresso(self, resultado):
+        self.stdout.write(f'  {resultado["linhas"]} linhas lidas')
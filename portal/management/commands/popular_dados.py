@@ -1,15 +1,14 @@
+import time
+
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
-from django.utils.text import slugify
-from django.utils import timezone
-from portal.models import Tema, Autor, Editorial
-from faker import Faker
-import random
+from django.db import connection
 
-fake = Faker('pt_BR')
+from portal import massa
 
 
 class Command(BaseCommand):
-    help = 'Popula o banco de dados com temas, autores e editoriais'
+    help = 'Popula o banco de dados com temas, autores, editoriais e inscritos da newsletter'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -17,93 +16,67 @@ class Command(BaseCommand):
             action='store_true',
             help='Limpa os dados existentes antes de popular'
         )
+        parser.add_argument('--temas', type=int, default=8, help='Quantidade de temas')
+        parser.add_argument('--autores', type=int, default=15, help='Quantidade de autores')
+        parser.add_argument('--editoriais', type=int, default=200, help='Quantidade de editoriais')
+        parser.add_argument('--inscritos', type=int, default=0, help='Quantidade de inscritos na newsletter')
+        parser.add_argument(
+            '--semente',
+            '--seed',
+            type=int,
+            default=42,
+            help='Semente dos dados gerados (a mesma semente gera os mesmos dados)'
+        )
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=365,
+            help='As datas de publicação ficam espalhadas por este número de dias'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Processos que criam os lotes de editoriais em paralelo (ignorado no SQLite)'
+        )
+        parser.add_argument(
+            '--indices',
+            action='store_true',
+            help='Reconstrói a busca e os relacionados ao final (demorado com milhões de editoriais)'
+        )
 
     def handle(self, *args, **options):
         if options['limpar']:
-            Editorial.objects.all().delete()
-            Autor.objects.all().delete()
-            Tema.objects.all().delete()
-            self.stdout.write('Dados limpos.')
-
-        temas = self.criar_temas()
-        autores = self.criar_autores()
-        self.criar_editoriais(temas, autores)
-        self.stdout.write(self.style.SUCCESS('Dados populados com sucesso!'))
-
-    def criar_temas(self):
-        nomes_temas = [
-            'Tecnologia',
-            'Saúde',
-            'Educação',
-            'Política',
-            'Economia',
-            'Esportes',
-            'Cultura',
-            'Meio Ambiente'
-        ]
-
-        temas = []
-        for nome in nomes_temas:
-            tema, criado = Tema.objects.get_or_create(
-                nome=nome,
-                defaults={
-                    'slug': slugify(nome),
-                    'descricao': f'Artigos sobre {nome.lower()}',
-                    'ativo': True,
-                }
-            )
-            temas.append(tema)
+            removidos = massa.limpar()
+            self.stdout.write(f'Dados limpos ({sum(removidos.values())} linhas).')
 
-        return temas
+        if options['workers'] > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite aceita um escritor por vez: usando um único worker.'))
 
-    def criar_autores(self):
-        autores = []
-        for i in range(15):
-            nome = fake.name()
-            apelido = fake.first_name().lower()
-            
-            contador = 1
-            apelido_original = apelido
-            while Autor.objects.filter(apelido=apelido).exists():
-                apelido = f"{apelido_original}{contador}"
-                contador += 1
-            
-            autor, criado = Autor.objects.get_or_create(
-                apelido=apelido,
-                defaults={
-                    'nome_completo': nome,
-                    'resumo': fake.paragraph(nb_sentences=3),
-                    'ativo': True,
-                }
+        inicio = time.perf_counter()
+        quantidades = massa.gerar(
+            options['editoriais'],
+            temas=options['temas'],
+            autores=options['autores'],
+            inscritos=options['inscritos'],
+            semente=options['semente'],
+            dias=options['dias'],
+            workers=options['workers'],
+            progresso=self.progresso,
+        )
+        if options['indices']:
+            # bulk_create não dispara os sinais que mantêm a busca e os relacionados
+            self.stdout.write('Reconstruindo a busca e os relacionados...')
+            call_command('reindexar_busca', workers=max(options['workers'], 4), stdout=self.stdout)
+            call_command('calcular_relacionados', stdout=self.stdout)
+        else:
+            self.stdout.write(
+                'A busca e os relacionados não foram reconstruídos: use --indices, ou rode '
+                'reindexar_busca e calcular_relacionados depois.'
             )
-            autores.append(autor)
-
-        return autores
 
-    def criar_editoriais(self, temas, autores):
-        for i in range(200):
-            titulo = fake.sentence(nb_words=8).rstrip('.')
-            
-            contador = 1
-            titulo_original = titulo
-            while Editorial.objects.filter(titulo=titulo).exists():
-                titulo = f"{titulo_original} ({contador})"
-                contador += 1
-
-            autor = random.choice(autores)
-            conteudo = '\n\n'.join(fake.paragraphs(nb=random.randint(3, 8)))
-            
-            editorial = Editorial.objects.create(
-                titulo=titulo,
-                texto=conteudo,
-                autor=autor,
-                status='publicado',
-                ativo=True,
-                layout=random.choice(['layout1', 'layout2', 'layout3']),
-                estilo=random.randint(1, 3),
-                data_publicacao=timezone.now(),
-            )
+        duracao = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(f'Dados populados em {duracao:.1f}s: {quantidades}'))
 
-            temas_selecionados = random.sample(temas, random.randint(2, 5))
-            for tema in temas_selecionados:
-                editorial.temas.add(tema)
+    def progresso(self, criados, total):
+        self.stdout.write(f'  {criados}/{total} editoriais')
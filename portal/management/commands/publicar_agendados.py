@@ -0,0 +1,62 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from portal import agendamento
+
+
+class Command(BaseCommand):
+    help = 'Publica os editoriais agendados cuja data chegou (uma vez ou como daemon)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--daemon',
+            action='store_true',
+            help='Continua rodando e verifica a fila periodicamente'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=int,
+            default=30,
+            help='Segundos entre as verificações no modo daemon'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=100,
+            help='Quantidade de editoriais publicados por transação'
+        )
+
+    def handle(self, *args, **options):
+        if not options['daemon']:
+            total = agendamento.publicar_vencidos(options['lote'])
+            self.stdout.write(self.style.SUCCESS(f'{total} editorial(is) publicado(s).'))
+            return
+
+        self.executando = True
+        signal.signal(signal.SIGTERM, self.parar)
+        signal.signal(signal.SIGINT, self.parar)
+        self.stdout.write(f'Verificando agendamentos a cada {options["intervalo"]}s...')
+
+        while self.executando:
+            close_old_connections()
+            try:
+                total = agendamento.publicar_vencidos(options['lote'])
+            except Exception as e:
+                self.stderr.write(f'Erro ao publicar agendados: {e}')
+            else:
+                if total:
+                    self.stdout.write(self.style.SUCCESS(f'{total} editorial(is) publicado(s).'))
+            self.aguardar(options['intervalo'])
+
+        self.stdout.write('Encerrado.')
+
+    def parar(self, signum, frame):
+        self.executando = False
+
+    def aguardar(self, segundos):
+        fim = time.monotonic() + segundos
+        while self.executando and time.monotonic() < fim:
+            time.sleep(min(1, fim - time.monotonic()))
@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from portal import busca
+from portal.models import DocumentoBusca, Editorial
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o índice da busca textual dos editoriais em lotes paralelos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=busca.TAMANHO_LOTE,
+            help='Quantidade de editoriais por lote'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Quantidade de lotes indexados em paralelo'
+        )
+        parser.add_argument(
+            '--limpar',
+            action='store_true',
+            help='Remove todos os documentos antes de reindexar'
+        )
+
+    def handle(self, *args, **options):
+        tamanho = options['lote']
+        workers = options['workers']
+        if connection.vendor == 'sqlite' and workers > 1:
+            # SQLite serializa as escritas; threads só disputariam o lock
+            self.stdout.write('SQLite detectado: usando 1 worker.')
+            workers = 1
+
+        if options['limpar']:
+            DocumentoBusca.objects.all().delete()
+            self.stdout.write('Documentos de busca removidos.')
+
+        lotes = self.gerar_lotes(tamanho)
+        total = 0
+        if workers <= 1:
+            for lote in lotes:
+                total += busca.indexar_editoriais(lote)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futuros = [executor.submit(self.indexar_lote, lote) for lote in lotes]
+                for futuro in as_completed(futuros):
+                    total += futuro.result()
+
+        busca.obter_backend().otimizar()
+        self.stdout.write(self.style.SUCCESS(f'{total} editorial(is) indexado(s) em {len(lotes)} lote(s).'))
+
+    def gerar_lotes(self, tamanho):
+        ids = Editorial.objects.order_by('pk').values_list('pk', flat=True)
+        lotes = []
+        lote = []
+        for editorial_id in ids.iterator(chunk_size=tamanho):
+            lote.append(editorial_id)
+            if len(lote) >= tamanho:
+                lotes.append(lote)
+                lote = []
+        if lote:
+            lotes.append(lote)
+        return lotes
+
+    def indexar_lote(self, ids):
+        """Indexa um lote dentro de uma thread do pool"""
+        try:
+            return busca.indexar_editoriais(ids)
+        finally:
+            # Cada thread abre a própria conexão; fecha ao terminar o lote
+            connection.close()
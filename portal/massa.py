@@ -0,0 +1,256 @@
+"""
+Massa de dados sintética para medir o portal.
+
+Gera temas, autores, editoriais publicados (datas espalhadas pelos últimos
+``dias``) e inscritos da newsletter com ``bulk_create`` em lotes de
+``TAMANHO_LOTE``, inclusive as tabelas de ligação com os temas. É
+determinística a partir de ``semente``: cada lote tem o próprio gerador
+(semente + número do lote), então a mesma semente gera os mesmos dados com
+qualquer quantidade de workers, o que permite comparar medições entre versões.
+
+Os textos são montados a partir de parágrafos gerados uma vez pelo Faker, e
+os títulos são únicos por construção (o índice do editorial vira uma
+combinação de palavras), sem consultar o banco.
+
+``bulk_create`` não dispara sinais; quem gera a massa deve reconstruir o
+índice da busca e os relacionados (``reindexar_busca`` e
+``calcular_relacionados``). ``limpar`` também não: apaga as tabelas com um
+DELETE direto cada, sem o coletor do ORM.
+"""
+import multiprocessing
+import random
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+from functools import lru_cache
+
+import django
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+from faker import Faker
+
+from . import cache_paginas
+from .contexto import contexto
+from .models import (
+    Autor, DestinatarioEnvio, DocumentoBusca, Editorial, EditorialRelacionado, EnvioNewsletter, Newsletter,
+    RelacionadoPendente, Tema,
+)
+
+NOMES_TEMAS = [
+    'Tecnologia', 'Saúde', 'Educação', 'Política', 'Economia', 'Esportes', 'Cultura', 'Meio Ambiente',
+    'Ciência', 'Internacional', 'Segurança', 'Turismo',
+]
+
+TAMANHO_LOTE = 1000
+DOMINIO_INSCRITOS = '@massa.exemplo'
+PARAGRAFOS = 2000
+PALAVRAS_TITULO = 5
+# Primo: embaralha os índices dos títulos sem repetir (é primo com o número de combinações)
+MULTIPLICADOR_TITULO = 2654435761
+
+
+def _faker(semente):
+    fake = Faker('pt_BR')
+    fake.seed_instance(semente)
+    return fake
+
+
+class Textos:
+    """Parágrafos e vocabulário de uma semente, gerados uma vez por processo"""
+
+    def __init__(self, semente):
+        fake = _faker(semente)
+        self.paragrafos = [fake.paragraph(nb_sentences=5) for _ in range(PARAGRAFOS)]
+        palavras = set()
+        for paragrafo in self.paragrafos:
+            palavras.update(re.findall(r'[^\W\d_]+', paragrafo.lower()))
+        self.vocabulario = sorted(palavras)
+        self.combinacoes = len(self.vocabulario) ** PALAVRAS_TITULO
+        self.deslocamento = random.Random(semente).randrange(self.combinacoes)
+
+    def titulo(self, indice):
+        """Título diferente para cada índice (com sufixo depois de esgotar as combinações)"""
+        volta, resto = divmod(indice, self.combinacoes)
+        codigo = (resto * MULTIPLICADOR_TITULO + self.deslocamento) % self.combinacoes
+        palavras = []
+        for _ in range(PALAVRAS_TITULO):
+            codigo, posicao = divmod(codigo, len(self.vocabulario))
+            palavras.append(self.vocabulario[posicao])
+        titulo = ' '.join(palavras).capitalize()
+        return f'{titulo} ({volta})' if volta else titulo
+
+    def texto(self, aleatorio):
+        return '\n\n'.join(aleatorio.sample(self.paragrafos, aleatorio.randint(3, 8)))
+
+
+@lru_cache(maxsize=4)
+def textos(semente):
+    return Textos(semente)
+
+
+def gerar_temas(quantidade):
+    nomes = NOMES_TEMAS[:quantidade] + [f'Tema {indice}' for indice in range(len(NOMES_TEMAS) + 1, quantidade + 1)]
+    Tema.objects.bulk_create(
+        [Tema(nome=nome, slug=slugify(nome), descricao=f'Artigos sobre {nome.lower()}') for nome in nomes],
+        ignore_conflicts=True,
+    )
+    return list(Tema.objects.filter(slug__in=[slugify(nome) for nome in nomes]).order_by('pk'))
+
+
+def gerar_autores(quantidade, semente=42):
+    """Cria ``quantidade`` autores; os apelidos continuam a numeração dos existentes"""
+    fake = _faker(semente)
+    inicio = Autor.objects.count()
+    apelidos = []
+    for primeiro in range(inicio, inicio + quantidade, TAMANHO_LOTE):
+        lote = [
+            Autor(nome_completo=fake.name(), apelido=f'autor-{indice + 1}', resumo=fake.paragraph(nb_sentences=2))
+            for indice in range(primeiro, min(inicio + quantidade, primeiro + TAMANHO_LOTE))
+        ]
+        Autor.objects.bulk_create(lote, ignore_conflicts=True)
+        apelidos.extend(autor.apelido for autor in lote)
+    return list(Autor.objects.filter(apelido__in=apelidos).order_by('pk'))
+
+
+def gerar_lote_editoriais(numero, inicio, quantidade, temas_ids, autores_ids, semente, agora, dias):
+    """
+    Cria o lote ``numero`` (editoriais ``inicio`` a ``inicio + quantidade``)
+    com 1 a 3 temas cada. Roda neste processo ou em um worker.
+    """
+    aleatorio = random.Random(f'{semente}:{numero}')
+    base = textos(semente)
+    lote = []
+    for indice in range(inicio, inicio + quantidade):
+        editorial = Editorial(
+            titulo=base.titulo(indice),
+            texto=base.texto(aleatorio),
+            autor_id=aleatorio.choice(autores_ids) if autores_ids else None,
+            layout=aleatorio.choice(['layout1', 'layout2', 'layout3']),
+            estilo=aleatorio.randint(1, 3),
+            status='publicado',
+            ativo=True,
+            data_publicacao=agora - timedelta(seconds=aleatorio.randint(60, dias * 86400)),
+        )
+        editorial.secoes_html = editorial.gerar_secoes_html()
+        lote.append(editorial)
+
+    Relacao = Editorial.temas.through
+    with transaction.atomic():
+        Editorial.objects.bulk_create(lote)
+        Relacao.objects.bulk_create([
+            Relacao(editorial_id=editorial.pk, tema_id=tema_id)
+            for editorial in lote
+            for tema_id in aleatorio.sample(temas_ids, min(len(temas_ids), aleatorio.randint(1, 3)))
+        ])
+    return len(lote)
+
+
+def gerar_editoriais(quantidade, temas, autores, semente=42, dias=365, workers=1, progresso=None):
+    """
+    Cria os editoriais em lotes, distribuídos entre ``workers`` processos se
+    houver mais de um; ``progresso(criados, total)`` é chamado a cada lote.
+    Retorna quantos criou.
+    """
+    agora = timezone.now()
+    inicio = Editorial.objects.count()
+    lotes = [
+        (numero, inicio + deslocamento, min(TAMANHO_LOTE, quantidade - deslocamento))
+        for numero, deslocamento in enumerate(range(0, quantidade, TAMANHO_LOTE))
+    ]
+    comuns = ([tema.pk for tema in temas], [autor.pk for autor in autores], semente, agora, dias)
+
+    criados = 0
+    if workers <= 1 or len(lotes) <= 1:
+        for lote in lotes:
+            criados += gerar_lote_editoriais(*lote, *comuns)
+            if progresso:
+                progresso(criados, quantidade)
+        return criados
+
+    # Cada worker configura o Django (antes de importar este módulo) e abre
+    # as próprias conexões; as deste processo não são herdadas
+    connections.close_all()
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup
+    ) as pool:
+        for futuro in as_completed([pool.submit(gerar_lote_editoriais, *lote, *comuns) for lote in lotes]):
+            criados += futuro.result()
+            if progresso:
+                progresso(criados, quantidade)
+    return criados
+
+
+def gerar_inscritos(quantidade, temas, semente=42):
+    """Cria ``quantidade`` inscrições em 1 a 3 temas, continuando a numeração dos e-mails"""
+    Relacao = Newsletter.temas.through
+    temas_ids = [tema.pk for tema in temas]
+    inicio = Newsletter.objects.count()
+    criados = 0
+    for numero, primeiro in enumerate(range(inicio, inicio + quantidade, TAMANHO_LOTE)):
+        aleatorio = random.Random(f'{semente}:inscritos:{numero}')
+        emails = [
+            f'leitor{indice + 1}{DOMINIO_INSCRITOS}'
+            for indice in range(primeiro, min(inicio + quantidade, primeiro + TAMANHO_LOTE))
+        ]
+        with transaction.atomic():
+            Newsletter.objects.bulk_create([Newsletter(email=email) for email in emails], ignore_conflicts=True)
+            ids = Newsletter.objects.filter(email__in=emails).order_by('pk').values_list('pk', flat=True)
+            Relacao.objects.bulk_create([
+                Relacao(newsletter_id=pk, tema_id=tema_id)
+                for pk in ids
+                for tema_id in aleatorio.sample(temas_ids, min(len(temas_ids), aleatorio.randint(1, 3)))
+            ], ignore_conflicts=True)
+        criados += len(emails)
+    return criados
+
+
+def gerar(editoriais, temas=8, autores=30, inscritos=0, semente=42, dias=365, workers=1, progresso=None):
+    """Gera a massa; retorna a quantidade criada de cada modelo"""
+    if workers > 1 and connections['default'].vendor == 'sqlite':
+        # O SQLite aceita um único escritor por vez: os workers só disputariam o lock
+        workers = 1
+    lista_temas = gerar_temas(temas)
+    lista_autores = gerar_autores(autores, semente)
+    quantidades = {
+        'temas': len(lista_temas),
+        'autores': len(lista_autores),
+        'editoriais': gerar_editoriais(editoriais, lista_temas, lista_autores, semente, dias, workers, progresso),
+        'inscritos': gerar_inscritos(inscritos, lista_temas, semente),
+    }
+    # Sem sinais, nada invalidou o cache: expira as páginas e o contexto do site
+    cache_paginas.invalidar('site', 'navegacao')
+    contexto.invalidar()
+    return quantidades
+
+
+def limpar():
+    """
+    Apaga editoriais, autores, temas e os inscritos da massa. Cada tabela sai
+    em um DELETE direto (``_raw_delete``), das dependentes para as principais:
+    o coletor do ORM buscaria os objetos e os receptores de ``pre_delete``
+    fariam consultas para cada um. Retorna as linhas apagadas por tabela.
+    """
+    inscritos_massa = Newsletter.objects.filter(email__endswith=DOMINIO_INSCRITOS)
+    apagar = [
+        EditorialRelacionado.objects.all(),
+        RelacionadoPendente.objects.all(),
+        DocumentoBusca.objects.all(),
+        Editorial.temas.through.objects.all(),
+        Editorial.objects.all(),
+        Autor.objects.all(),
+        # Os temas saem: as inscrições que ficam perdem os deles, como no CASCADE
+        Newsletter.temas.through.objects.all(),
+        Tema.objects.all(),
+        inscritos_massa,
+    ]
+    removidos = {}
+    with transaction.atomic():
+        # SET_NULL das referências que ficam
+        EnvioNewsletter.objects.filter(editorial__isnull=False).update(editorial=None)
+        DestinatarioEnvio.objects.filter(inscricao__in=inscritos_massa).update(inscricao=None)
+        for queryset in apagar:
+            removidos[queryset.model._meta.db_table] = queryset._raw_delete(queryset.db)
+    cache_paginas.invalidar('site', 'navegacao')
+    contexto.invalidar()
+    return removidos
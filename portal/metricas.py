@@ -0,0 +1,325 @@
+"""
+Métricas das requisições: cabeçalho ``Server-Timing`` e ``/metrics`` no
+formato texto do Prometheus.
+
+``MetricasMiddleware`` mede, por rota, a duração da requisição, a quantidade
+e o tempo das consultas SQL (um execute_wrapper instalado em cada conexão
+quando ela é criada, em qualquer banco e thread) e o tempo de renderização
+dos templates (backend ``TemplatesMedidos``).
+
+Cada processo acumula os contadores e histogramas em memória, e uma thread os
+grava a cada ``METRICAS_INTERVALO`` segundos em um arquivo próprio em
+``METRICAS_DIRETORIO`` (escrita atômica com ``os.replace``). ``/metrics``
+soma os arquivos de todos os processos, inclusive dos workers que já
+terminaram, para que os contadores nunca diminuam; o gunicorn limpa o
+diretório ao iniciar. Os dados herdados em um fork são descartados no filho.
+"""
+import atexit
+import contextvars
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.http import HttpResponse
+from django.template.backends.django import DjangoTemplates, Template
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger(__name__)
+
+BALDES_DURACAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BALDES_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# nome: (tipo, descrição, baldes dos histogramas)
+METRICAS = {
+    'portal_requisicoes_total': ('counter', 'Requisições atendidas', None),
+    'portal_requisicao_segundos': ('histogram', 'Duração das requisições', BALDES_DURACAO),
+    'portal_sql_consultas': ('histogram', 'Consultas SQL por requisição', BALDES_CONSULTAS),
+    'portal_sql_segundos': ('histogram', 'Tempo em consultas SQL por requisição', BALDES_DURACAO),
+    'portal_template_segundos': ('histogram', 'Tempo renderizando templates por requisição', BALDES_DURACAO),
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Medicao:
+    """Tempos da requisição em andamento"""
+
+    def __init__(self):
+        self.consultas = 0
+        self.sql = 0.0
+        self.template = 0.0
+
+
+# Propagada pelo asgiref para as threads de sync_to_async (views assíncronas)
+_medicao = contextvars.ContextVar('medicao', default=None)
+
+
+def medir_sql(execute, sql, params, many, context):
+    """execute_wrapper que soma as consultas à medição da requisição atual"""
+    medicao = _medicao.get()
+    if medicao is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicao.consultas += 1
+        medicao.sql += time.perf_counter() - inicio
+
+
+def instalar_em_conexao(sender, connection, **kwargs):
+    """Receptor de ``connection_created``"""
+    if medir_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(medir_sql)
+
+
+class TemplateMedido(Template):
+    def __init__(self, original):
+        super().__init__(original.template, original.backend)
+
+    def render(self, context=None, request=None):
+        medicao = _medicao.get()
+        if medicao is None:
+            return super().render(context, request)
+        inicio = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            medicao.template += time.perf_counter() - inicio
+
+
+class TemplatesMedidos(DjangoTemplates):
+    """Backend de templates do Django que soma o tempo de render à medição"""
+
+    def from_string(self, template_code):
+        return TemplateMedido(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TemplateMedido(super().get_template(template_name))
+
+
+def _chave(nome, rotulos):
+    return nome, tuple(sorted(rotulos.items()))
+
+
+class Registro:
+    """Contadores e histogramas deste processo, gravados periodicamente em arquivo"""
+
+    def __init__(self):
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Descarta os dados (usado no processo filho após um fork)"""
+        self._lock = threading.Lock()
+        self._valores = {}
+        self._arquivo = None
+        self._thread = None
+
+    @property
+    def intervalo(self):
+        return getattr(settings, 'METRICAS_INTERVALO', 5)
+
+    def incrementar(self, nome, rotulos, valor=1):
+        with self._lock:
+            valores = self._valores.setdefault(_chave(nome, rotulos), [0])
+            valores[0] += valor
+        self._garantir_thread()
+
+    def observar(self, nome, rotulos, valor):
+        """Histograma: [contagem de cada balde..., contagem acima do último, soma]"""
+        baldes = METRICAS[nome][2]
+        with self._lock:
+            valores = self._valores.setdefault(_chave(nome, rotulos), [0] * (len(baldes) + 2))
+            posicao = next((i for i, limite in enumerate(baldes) if valor <= limite), len(baldes))
+            valores[posicao] += 1
+            valores[-1] += valor
+        self._garantir_thread()
+
+    def valores(self):
+        with self._lock:
+            return {chave: list(valores) for chave, valores in self._valores.items()}
+
+    def gravar(self):
+        """Grava os valores no arquivo deste processo; retorna o caminho"""
+        diretorio = settings.METRICAS_DIRETORIO
+        if self._arquivo is None:
+            # pid + início: um pid reaproveitado não sobrescreve o arquivo de um worker encerrado
+            self._arquivo = f'{os.getpid()}-{time.time_ns()}.json'
+        os.makedirs(diretorio, exist_ok=True)
+        caminho = os.path.join(diretorio, self._arquivo)
+        dados = [[nome, dict(rotulos), valores] for (nome, rotulos), valores in self.valores().items()]
+        temporario = f'{caminho}.tmp'
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump(dados, arquivo)
+        os.replace(temporario, caminho)
+        return caminho
+
+    def _garantir_thread(self):
+        if self._thread is not None or self.intervalo <= 0:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._executar, name='metricas', daemon=True)
+            self._thread.start()
+
+    def _executar(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                self.gravar()
+            except OSError:
+                logger.exception('Falha ao gravar as métricas')
+
+
+registro = Registro()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=registro.reiniciar)
+
+
+def _gravar_na_saida():
+    if registro.valores():
+        registro.gravar()
+
+
+atexit.register(_gravar_na_saida)
+
+
+def coletar(diretorio):
+    """Soma os valores gravados por todos os processos"""
+    total = {}
+    for caminho in glob.glob(os.path.join(diretorio, '*.json')):
+        try:
+            with open(caminho, encoding='utf-8') as arquivo:
+                dados = json.load(arquivo)
+        except (OSError, ValueError):
+            logger.warning('Arquivo de métricas ilegível: %s', caminho)
+            continue
+        for nome, rotulos, valores in dados:
+            if nome not in METRICAS:
+                continue
+            acumulado = total.setdefault(_chave(nome, rotulos), [0] * len(valores))
+            for posicao, valor in enumerate(valores):
+                acumulado[posicao] += valor
+    return total
+
+
+def _rotulos(pares):
+    if not pares:
+        return ''
+    texto = ','.join(
+        '{}="{}"'.format(nome, str(valor).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"'))
+        for nome, valor in pares
+    )
+    return '{' + texto + '}'
+
+
+def _numero(valor):
+    return repr(float(valor))
+
+
+def formatar(valores):
+    """Valores somados -> formato texto do Prometheus"""
+    linhas = []
+    for nome, (tipo, descricao, baldes) in METRICAS.items():
+        series = sorted((rotulos, lista) for (metrica, rotulos), lista in valores.items() if metrica == nome)
+        linhas.append(f'# HELP {nome} {descricao}')
+        linhas.append(f'# TYPE {nome} {tipo}')
+        for rotulos, lista in series:
+            if tipo == 'counter':
+                linhas.append(f'{nome}{_rotulos(rotulos)} {_numero(lista[0])}')
+                continue
+            acumulado = 0
+            for limite, contagem in zip(baldes, lista):
+                acumulado += contagem
+                linhas.append(f'{nome}_bucket{_rotulos(rotulos + (("le", _numero(limite)),))} {_numero(acumulado)}')
+            acumulado += lista[len(baldes)]
+            linhas.append(f'{nome}_bucket{_rotulos(rotulos + (("le", "+Inf"),))} {_numero(acumulado)}')
+            linhas.append(f'{nome}_sum{_rotulos(rotulos)} {_numero(lista[-1])}')
+            linhas.append(f'{nome}_count{_rotulos(rotulos)} {_numero(acumulado)}')
+    return '\n'.join(linhas) + '\n'
+
+
+def exportar(request):
+    """
+    View de ``/metrics``; com ``METRICAS_TOKEN`` exige ``Authorization: Bearer
+    <token>``, sem ele só a equipe (``is_staff``) tem acesso.
+    """
+    token = getattr(settings, 'METRICAS_TOKEN', '')
+    if token:
+        if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            raise PermissionDenied
+    elif not request.user.is_staff:
+        raise PermissionDenied
+    registro.gravar()
+    return HttpResponse(formatar(coletar(settings.METRICAS_DIRETORIO)), content_type=CONTENT_TYPE)
+
+
+def rota(request):
+    correspondencia = getattr(request, 'resolver_match', None)
+    return correspondencia.view_name if correspondencia else 'desconhecida'
+
+
+class MetricasMiddleware:
+    """
+    Mede cada requisição e registra as métricas por rota (nome da URL);
+    com ``METRICAS_SERVER_TIMING`` devolve os tempos no cabeçalho
+    ``Server-Timing``. Deve ficar em primeiro lugar para medir os demais
+    middlewares.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICAS_ATIVO', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        # No modo ASGI a cadeia continua assíncrona (sem passar por uma thread)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        medicao = Medicao()
+        token = _medicao.set(medicao)
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _medicao.reset(token)
+        return self.registrar(request, response, medicao, time.perf_counter() - inicio)
+
+    async def __acall__(self, request):
+        medicao = Medicao()
+        token = _medicao.set(medicao)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medicao.reset(token)
+        return self.registrar(request, response, medicao, time.perf_counter() - inicio)
+
+    def registrar(self, request, response, medicao, duracao):
+        rotulos = {'rota': rota(request), 'metodo': request.method}
+        registro.incrementar('portal_requisicoes_total', {**rotulos, 'status': str(response.status_code)})
+        registro.observar('portal_requisicao_segundos', rotulos, duracao)
+        registro.observar('portal_sql_consultas', rotulos, medicao.consultas)
+        registro.observar('portal_sql_segundos', rotulos, medicao.sql)
+        registro.observar('portal_template_segundos', rotulos, medicao.template)
+
+        if getattr(settings, 'METRICAS_SERVER_TIMING', True):
+            response['Server-Timing'] = (
+                f'total;dur={duracao * 1000:.1f}, '
+                f'sql;dur={medicao.sql * 1000:.1f};desc="{medicao.consultas} consultas", '
+                f'template;dur={medicao.template * 1000:.1f}'
+            )
+        return response
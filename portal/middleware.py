@@ -0,0 +1,43 @@
+import logging
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .orcamento import OrcamentoConsultasExcedido, contar_consultas, obter_orcamento, verificar_orcamento
+
+logger = logging.getLogger(__name__)
+
+
+class OrcamentoConsultasMiddleware:
+    """
+    Em DEBUG, confere o número de consultas de cada view com o orçamento
+    declarado por ``@orcamento_consultas``. Com ``ORCAMENTO_CONSULTAS_ESTRITO``
+    a requisição falha; caso contrário o excesso é registrado no log.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DEBUG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        limite = obter_orcamento(view_func)
+        if limite is None:
+            return None
+        executar = view_func
+        if iscoroutinefunction(view_func):
+            # As consultas da view assíncrona voltam para esta thread (thread_sensitive)
+            executar = async_to_sync(view_func)
+        with contar_consultas() as contador:
+            response = executar(request, *view_args, **view_kwargs)
+        try:
+            verificar_orcamento(view_func.__name__, limite, contador)
+        except OrcamentoConsultasExcedido:
+            if getattr(settings, 'ORCAMENTO_CONSULTAS_ESTRITO', False):
+                raise
+            logger.warning('Orçamento de consultas excedido', exc_info=True)
+        return response
@@ -0,0 +1,106 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+SQL_POSTGRES = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "DROP TEXT SEARCH CONFIGURATION IF EXISTS portal_pt",
+    "CREATE TEXT SEARCH CONFIGURATION portal_pt (COPY = portuguese)",
+    "ALTER TEXT SEARCH CONFIGURATION portal_pt "
+    "ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem",
+    "ALTER TABLE portal_documentobusca ADD COLUMN vetor tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('portal_pt'::regconfig, coalesce(titulo, '')), 'A') || "
+    "setweight(to_tsvector('portal_pt'::regconfig, coalesce(temas, '')), 'B') || "
+    "setweight(to_tsvector('portal_pt'::regconfig, coalesce(corpo, '')), 'C')) STORED",
+    "CREATE INDEX portal_documentobusca_vetor_idx ON portal_documentobusca USING GIN (vetor)",
+    "INSERT INTO portal_documentobusca (editorial_id, titulo, temas, corpo, atualizado_em) "
+    "SELECT e.id, e.titulo, coalesce(string_agg(t.nome, ' '), ''), e.texto, now() "
+    "FROM portal_editorial e "
+    "LEFT JOIN portal_editorial_temas et ON et.editorial_id = e.id "
+    "LEFT JOIN portal_tema t ON t.id = et.tema_id "
+    "GROUP BY e.id",
+]
+
+SQL_POSTGRES_REVERSO = [
+    "DROP TEXT SEARCH CONFIGURATION IF EXISTS portal_pt",
+]
+
+SQL_SQLITE = [
+    "CREATE VIRTUAL TABLE portal_documentobusca_fts USING fts5("
+    "titulo, temas, corpo, content='portal_documentobusca', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER portal_documentobusca_ai AFTER INSERT ON portal_documentobusca BEGIN "
+    "INSERT INTO portal_documentobusca_fts(rowid, titulo, temas, corpo) "
+    "VALUES (new.id, new.titulo, new.temas, new.corpo); END",
+    "CREATE TRIGGER portal_documentobusca_ad AFTER DELETE ON portal_documentobusca BEGIN "
+    "INSERT INTO portal_documentobusca_fts(portal_documentobusca_fts, rowid, titulo, temas, corpo) "
+    "VALUES ('delete', old.id, old.titulo, old.temas, old.corpo); END",
+    "CREATE TRIGGER portal_documentobusca_au AFTER UPDATE ON portal_documentobusca BEGIN "
+    "INSERT INTO portal_documentobusca_fts(portal_documentobusca_fts, rowid, titulo, temas, corpo) "
+    "VALUES ('delete', old.id, old.titulo, old.temas, old.corpo); "
+    "INSERT INTO portal_documentobusca_fts(rowid, titulo, temas, corpo) "
+    "VALUES (new.id, new.titulo, new.temas, new.corpo); END",
+    "INSERT INTO portal_documentobusca (editorial_id, titulo, temas, corpo, atualizado_em) "
+    "SELECT e.id, e.titulo, coalesce(group_concat(t.nome, ' '), ''), e.texto, CURRENT_TIMESTAMP "
+    "FROM portal_editorial e "
+    "LEFT JOIN portal_editorial_temas et ON et.editorial_id = e.id "
+    "LEFT JOIN portal_tema t ON t.id = et.tema_id "
+    "GROUP BY e.id",
+]
+
+SQL_SQLITE_REVERSO = [
+    "DROP TRIGGER IF EXISTS portal_documentobusca_ai",
+    "DROP TRIGGER IF EXISTS portal_documentobusca_ad",
+    "DROP TRIGGER IF EXISTS portal_documentobusca_au",
+    "DROP TABLE IF EXISTS portal_documentobusca_fts",
+]
+
+
+def _executar(schema_editor, comandos):
+    for sql in comandos:
+        schema_editor.execute(sql)
+
+
+def criar_indice(apps, schema_editor):
+    """Cria o índice textual específico do banco e popula os documentos"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _executar(schema_editor, SQL_POSTGRES)
+    elif vendor == 'sqlite':
+        _executar(schema_editor, SQL_SQLITE)
+
+
+def remover_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _executar(schema_editor, SQL_POSTGRES_REVERSO)
+    elif vendor == 'sqlite':
+        _executar(schema_editor, SQL_SQLITE_REVERSO)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0004_configuracaosite_altura_logo_header'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentoBusca',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('titulo', models.CharField(max_length=200)),
+                ('temas', models.TextField(blank=True)),
+                ('corpo', models.TextField(blank=True)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('editorial', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='documento_busca', to='portal.editorial')),
+            ],
+            options={
+                'verbose_name': 'Documento de Busca',
+                'verbose_name_plural': 'Documentos de Busca',
+            },
+        ),
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
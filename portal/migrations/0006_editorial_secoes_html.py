@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0005_documentobusca'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='editorial',
+            name='secoes_html',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
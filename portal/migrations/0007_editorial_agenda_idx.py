@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0006_editorial_secoes_html'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='editorial',
+            index=models.Index(fields=['status', 'data_agendada'], name='portal_edit_agenda_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0007_editorial_agenda_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnvioNewsletter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('assunto', models.CharField(max_length=200)),
+                ('mensagem', models.TextField()),
+                ('mensagem_html', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('enviando', 'Enviando'), ('concluido', 'Concluído')], default='pendente', max_length=20)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('enviados', models.PositiveIntegerField(default=0)),
+                ('falhas', models.PositiveIntegerField(default=0)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True)),
+                ('atualizado_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('concluido_em', models.DateTimeField(blank=True, null=True)),
+                ('editorial', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='envios_newsletter', to='portal.editorial')),
+            ],
+            options={
+                'verbose_name': 'Envio de Newsletter',
+                'verbose_name_plural': 'Envios de Newsletter',
+                'ordering': ['-criado_em'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DestinatarioEnvio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254)),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('enviado', 'Enviado'), ('falhou', 'Falhou')], default='pendente', max_length=20)),
+                ('tentativas', models.PositiveSmallIntegerField(default=0)),
+                ('erro', models.TextField(blank=True)),
+                ('enviado_em', models.DateTimeField(blank=True, null=True)),
+                ('inscricao', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='portal.newsletter')),
+                ('envio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='destinatarios', to='portal.envionewsletter')),
+            ],
+            options={
+                'verbose_name': 'Destinatário de Envio',
+                'verbose_name_plural': 'Destinatários de Envio',
+                'indexes': [models.Index(fields=['envio', 'status', 'id'], name='portal_destinatario_fila_idx')],
+                'constraints': [models.UniqueConstraint(fields=('envio', 'email'), name='portal_destinatario_unico')],
+            },
+        ),
+    ]
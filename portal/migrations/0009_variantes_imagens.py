@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0008_envio_newsletter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='autor',
+            name='variantes_imagens',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='configuracaosite',
+            name='variantes_imagens',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='editorial',
+            name='variantes_imagens',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0009_variantes_imagens'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='editorial',
+            index=models.Index(fields=['-data_publicacao', '-id'], name='portal_edit_pub_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='editorial',
+            index=models.Index(fields=['autor', '-data_publicacao', '-id'], name='portal_edit_autor_pub_idx'),
+        ),
+    ]
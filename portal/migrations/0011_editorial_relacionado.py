@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0010_paginacao_cursor_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EditorialRelacionado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pontuacao', models.FloatField()),
+                ('editorial', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relacoes', to='portal.editorial')),
+                ('relacionado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='portal.editorial')),
+            ],
+            options={
+                'verbose_name': 'Editorial Relacionado',
+                'verbose_name_plural': 'Editoriais Relacionados',
+                'indexes': [models.Index(fields=['editorial', '-pontuacao'], name='portal_relacionado_pont_idx')],
+                'constraints': [models.UniqueConstraint(fields=('editorial', 'relacionado'), name='portal_relacionado_unico')],
+            },
+        ),
+    ]
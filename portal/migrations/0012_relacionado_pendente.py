@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0011_editorial_relacionado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelacionadoPendente',
+            fields=[
+                ('editorial_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('marcado_em', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Relacionado Pendente',
+                'verbose_name_plural': 'Relacionados Pendentes',
+                'indexes': [models.Index(fields=['marcado_em'], name='portal_rel_pendente_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0012_relacionado_pendente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaginaPendente',
+            fields=[
+                ('caminho', models.CharField(max_length=500, primary_key=True, serialize=False)),
+                ('marcado_em', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Página Pendente',
+                'verbose_name_plural': 'Páginas Pendentes',
+                'indexes': [models.Index(fields=['marcado_em'], name='portal_pagina_pendente_idx')],
+            },
+        ),
+    ]
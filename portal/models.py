@@ -1,7 +1,20 @@
-from django.db import models
+import re
+
+from django.db import models, transaction
+from django.dispatch import Signal
 from django.utils import timezone
+from django.utils.html import linebreaks
+from django.utils.safestring import mark_safe
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db.models import Q
+
+
+# Fim de sentença (. ! ?) seguido de espaço, usado na divisão do texto
+SEPARADOR_SENTENCAS = re.compile(r'(?<=[.!?])\s+')
+
+# Enviado (sender=Editorial, ids=[...]) pelas alterações em lote feitas com
+# update(), que não disparam post_save; portal.signals expira as páginas e
+# recalcula os relacionados uma vez para o lote inteiro
+editoriais_alterados = Signal()
 
 
 class Tema(models.Model):
@@ -24,10 +37,14 @@ class Tema(models.Model):
 
 class Autor(models.Model):
     """Modelo para autores de editoriais"""
+    CAMPOS_IMAGEM = ('foto',)
+
     nome_completo = models.CharField(max_length=200)
     apelido = models.CharField(max_length=100, unique=True)
     resumo = models.TextField(help_text="Breve descrição profissional do autor")
     foto = models.ImageField(upload_to='autores/', blank=True, null=True)
+    # Larguras, alturas e variantes redimensionadas das imagens (portal.imagens)
+    variantes_imagens = models.JSONField(default=dict, blank=True, editable=False)
     
     # Redes Sociais
     twitter = models.URLField(blank=True, null=True)
@@ -51,6 +68,8 @@ class Autor(models.Model):
 
 class ConfiguracaoSite(models.Model):
     """Modelo para configurações editáveis do site"""
+    CAMPOS_IMAGEM = ('logo',)
+
     # Informações Gerais
     nome_site = models.CharField(max_length=200, default='Portal de Notícias')
     tagline = models.CharField(max_length=300, blank=True, help_text="Slogan ou descrição breve do site")
@@ -70,6 +89,7 @@ class ConfiguracaoSite(models.Model):
     
     # Logo e Header
     logo = models.ImageField(upload_to='site/', blank=True, null=True)
+    variantes_imagens = models.JSONField(default=dict, blank=True, editable=False)
     altura_logo_header = models.IntegerField(
         default=80,
         validators=[MinValueValidator(50), MaxValueValidator(200)],
@@ -87,9 +107,63 @@ class ConfiguracaoSite(models.Model):
 
     @staticmethod
     def get_config():
-        """Retorna a configuração do site (sempre uma única instância)"""
-        config, created = ConfiguracaoSite.objects.get_or_create(pk=1)
-        return config
+        """Retorna a configuração do site (sempre uma única instância, em cache)"""
+        from .contexto import contexto
+        return contexto.config()
+
+
+class EditorialQuerySet(models.QuerySet):
+    def publicados(self):
+        """Editoriais publicados, ativos e com data de publicação já alcançada"""
+        return self.filter(
+            status='publicado',
+            ativo=True,
+            data_publicacao__lte=timezone.now()
+        )
+
+    def feed(self):
+        """
+        Carrega o que os cards das listagens exibem: o autor (join) e os temas
+        (uma consulta para a página inteira, só com id, nome e slug).
+        """
+        return self.select_related('autor').prefetch_related(
+            models.Prefetch('temas', queryset=Tema.objects.only('id', 'nome', 'slug'))
+        )
+
+    def _alterar(self, condicao, **valores):
+        """
+        Um UPDATE só das colunas alteradas, nas linhas selecionadas que
+        atendem à condição. Retorna quantas mudaram e envia um único
+        ``editoriais_alterados``.
+        """
+        with transaction.atomic():
+            ids = list(self.filter(condicao).order_by().values_list('pk', flat=True).distinct())
+            if not ids:
+                return 0
+            # A condição se repete no UPDATE: quem mudou no meio do caminho não conta
+            alterados = self.model._default_manager.filter(condicao, pk__in=ids).update(
+                data_atualizacao=timezone.now(), **valores
+            )
+            editoriais_alterados.send(sender=self.model, ids=ids)
+        return alterados
+
+    def publicar_agora(self):
+        """Publica agora os rascunhos e agendados selecionados; retorna quantos"""
+        return self._alterar(
+            models.Q(status__in=['rascunho', 'agendado']),
+            status='publicado', data_publicacao=timezone.now(), agendado=False,
+        )
+    publicar_agora.queryset_only = True
+
+    def desativar(self):
+        """Desativa os editoriais selecionados; retorna quantos"""
+        return self._alterar(~models.Q(status='desativado', ativo=False), status='desativado', ativo=False)
+    desativar.queryset_only = True
+
+    def reativar(self):
+        """Republica os editoriais desativados selecionados; retorna quantos"""
+        return self._alterar(models.Q(status='desativado') | models.Q(ativo=False), status='publicado', ativo=True)
+    reativar.queryset_only = True
 
 
 class Editorial(models.Model):
@@ -107,6 +181,8 @@ class Editorial(models.Model):
         ('desativado', 'Desativado'),
     ]
 
+    CAMPOS_IMAGEM = ('imagem1', 'imagem2', 'imagem3')
+
     titulo = models.CharField(max_length=200)
     texto = models.TextField()
     temas = models.ManyToManyField(Tema, related_name='editoriais')
@@ -124,6 +200,7 @@ class Editorial(models.Model):
     imagem1 = models.ImageField(upload_to='editoriais/', blank=True, null=True)
     imagem2 = models.ImageField(upload_to='editoriais/', blank=True, null=True)
     imagem3 = models.ImageField(upload_to='editoriais/', blank=True, null=True)
+    variantes_imagens = models.JSONField(default=dict, blank=True, editable=False)
     
     # Publicação
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='rascunho')
@@ -139,19 +216,65 @@ class Editorial(models.Model):
     ativo = models.BooleanField(default=True)
     visualizacoes = models.IntegerField(default=0)
 
+    # Seções do texto já renderizadas para o layout ({'layout': ..., 'secoes': [html, ...]})
+    secoes_html = models.JSONField(null=True, blank=True, editable=False)
+
+    objects = EditorialQuerySet.as_manager()
+
     class Meta:
         ordering = ['-data_publicacao', '-data_criacao']
         verbose_name = 'Editorial'
         verbose_name_plural = 'Editoriais'
         indexes = [
             models.Index(fields=['-data_publicacao']),
+            # Paginação por cursor (portal.paginacao) das listagens e dos autores
+            models.Index(fields=['-data_publicacao', '-id'], name='portal_edit_pub_id_idx'),
+            models.Index(fields=['autor', '-data_publicacao', '-id'], name='portal_edit_autor_pub_idx'),
             models.Index(fields=['status']),
             models.Index(fields=['-visualizacoes']),
+            # Fila de agendamento: status='agendado' AND data_agendada <= agora
+            models.Index(fields=['status', 'data_agendada'], name='portal_edit_agenda_idx'),
         ]
 
     def __str__(self):
         return self.titulo
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if self.status == 'publicado' and self.data_publicacao and self.data_publicacao > timezone.now():
+            # Publicação futura vira agendamento: nenhuma invalidação do cache de
+            # páginas aconteceria quando a data chegasse; publicar_agendados a faz
+            self.status = 'agendado'
+            self.data_agendada, self.data_publicacao = self.data_publicacao, None
+            self.agendado = True
+            if update_fields is not None:
+                kwargs['update_fields'] = update_fields = (
+                    set(update_fields) | {'status', 'data_agendada', 'data_publicacao', 'agendado'}
+                )
+        if update_fields is None or {'texto', 'layout'} & set(update_fields):
+            self.secoes_html = self.gerar_secoes_html()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'secoes_html'}
+        super().save(*args, **kwargs)
+
+    def gerar_secoes_html(self):
+        """Divide o texto conforme o layout e renderiza cada seção (linebreaks)"""
+        if self.layout == 'layout2':
+            secoes = [linebreaks(secao, autoescape=False) for secao in self.dividir_texto_em_3()]
+        elif self.layout == 'layout3':
+            secoes = [linebreaks(secao, autoescape=False) for secao in self.dividir_texto_em_6()]
+        else:
+            secoes = [linebreaks(self.texto, autoescape=True)]
+        return {'layout': self.layout, 'secoes': secoes}
+
+    @property
+    def secoes(self):
+        """Seções em HTML do layout atual; gera na hora se ainda não foram salvas"""
+        dados = self.secoes_html
+        if not dados or dados.get('layout') != self.layout:
+            dados = self.gerar_secoes_html()
+        return [mark_safe(secao) for secao in dados['secoes']]
+
     def pode_publicar(self):
         """Verifica se o editorial pode ser publicado"""
         return self.status in ['rascunho', 'agendado']
@@ -162,7 +285,7 @@ class Editorial(models.Model):
             self.status = 'publicado'
             self.data_publicacao = timezone.now()
             self.agendado = False
-            self.save()
+            self.save(update_fields=['status', 'data_publicacao', 'agendado', 'data_atualizacao'])
             return True
         return False
 
@@ -172,7 +295,7 @@ class Editorial(models.Model):
             self.status = 'agendado'
             self.data_agendada = data
             self.agendado = True
-            self.save()
+            self.save(update_fields=['status', 'data_agendada', 'agendado', 'data_atualizacao'])
             return True
         return False
 
@@ -180,38 +303,32 @@ class Editorial(models.Model):
         """Desativa o editorial"""
         self.status = 'desativado'
         self.ativo = False
-        self.save()
+        self.save(update_fields=['status', 'ativo', 'data_atualizacao'])
 
     def reativar(self):
         """Reativa um editorial desativado"""
         self.ativo = True
         self.status = 'publicado'
-        self.save()
+        self.save(update_fields=['status', 'ativo', 'data_atualizacao'])
 
     @staticmethod
     def obter_publicados():
-        """Retorna apenas editoriais publicados e ativos"""
-        return Editorial.objects.filter(
-            status='publicado',
-            ativo=True,
-            data_publicacao__lte=timezone.now()
-        ).order_by('-data_publicacao')
+        """Retorna apenas editoriais publicados e ativos, prontos para listagens"""
+        return Editorial.objects.publicados().feed().defer('secoes_html').order_by('-data_publicacao')
 
     @staticmethod
     def obter_por_tema(tema_slug):
         """Retorna editoriais de um tema específico"""
+        # Um único tema não gera duplicatas (editorial/tema é único), sem DISTINCT
         return Editorial.obter_publicados().filter(
             temas__slug=tema_slug
-        ).distinct()
+        )
 
     @staticmethod
     def buscar(query):
-        """Busca em título, texto e temas"""
-        return Editorial.obter_publicados().filter(
-            Q(titulo__icontains=query) |
-            Q(texto__icontains=query) |
-            Q(temas__nome__icontains=query)
-        ).distinct()
+        """Busca textual em título, texto e temas, ordenada por relevância"""
+        from .busca import obter_backend
+        return obter_backend().buscar(query)
 
     def dividir_texto_em_3(self):
         """
@@ -252,8 +369,7 @@ class Editorial(models.Model):
         else:
             # Se é um único parágrafo, divide por caracteres (procurando quebras naturais)
             # Tenta dividir em sentenças (terminadas com . ! ?)
-            import re
-            sentencas = re.split(r'(?<=[.!?])\s+', texto_limpo)
+            sentencas = SEPARADOR_SENTENCAS.split(texto_limpo)
             
             if len(sentencas) > 3:
                 # Divide por sentenças
@@ -319,8 +435,7 @@ class Editorial(models.Model):
             return [paragrafos[0], paragrafos[1], '', '', '']
         elif len(paragrafos) == 1:
             # Se é um único parágrafo, divide em 5 partes por sentença
-            import re
-            sentencas = re.split(r'(?<=[.!?])\s+', texto_limpo)
+            sentencas = SEPARADOR_SENTENCAS.split(texto_limpo)
             
             if len(sentencas) >= 5:
                 # Distribui as sentenças em 5 seções
@@ -355,6 +470,59 @@ class Editorial(models.Model):
         return ['', '', '', '', '']
 
 
+class EditorialRelacionado(models.Model):
+    """Editorial relacionado pré-calculado (portal.relacionados), com sua pontuação"""
+    editorial = models.ForeignKey(Editorial, on_delete=models.CASCADE, related_name='relacoes')
+    relacionado = models.ForeignKey(Editorial, on_delete=models.CASCADE, related_name='+')
+    pontuacao = models.FloatField()
+
+    class Meta:
+        verbose_name = 'Editorial Relacionado'
+        verbose_name_plural = 'Editoriais Relacionados'
+        constraints = [
+            models.UniqueConstraint(fields=['editorial', 'relacionado'], name='portal_relacionado_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['editorial', '-pontuacao'], name='portal_relacionado_pont_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.editorial_id} -> {self.relacionado_id} ({self.pontuacao:.3f})"
+
+
+class RelacionadoPendente(models.Model):
+    """Editorial à espera do recálculo dos relacionados (portal.relacionados.processar_pendentes)"""
+    # Sem chave estrangeira: remover o editorial não consulta a fila
+    editorial_id = models.BigIntegerField(primary_key=True)
+    marcado_em = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Relacionado Pendente'
+        verbose_name_plural = 'Relacionados Pendentes'
+        indexes = [
+            models.Index(fields=['marcado_em'], name='portal_rel_pendente_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.editorial_id} ({self.marcado_em:%Y-%m-%d %H:%M})"
+
+
+class PaginaPendente(models.Model):
+    """Página exportada à espera de ser regenerada (portal.exportacao.processar_pendentes)"""
+    caminho = models.CharField(max_length=500, primary_key=True)
+    marcado_em = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Página Pendente'
+        verbose_name_plural = 'Páginas Pendentes'
+        indexes = [
+            models.Index(fields=['marcado_em'], name='portal_pagina_pendente_idx'),
+        ]
+
+    def __str__(self):
+        return self.caminho
+
+
 class Newsletter(models.Model):
     """Modelo para inscrição em notificações por email"""
     email = models.EmailField(unique=True, db_index=True)
@@ -369,4 +537,83 @@ class Newsletter(models.Model):
         verbose_name_plural = 'Inscrições Newsletter'
 
     def __str__(self):
-        return f"{self.email} ({self.temas.count()} temas)"
+        return self.email
+
+
+class EnvioNewsletter(models.Model):
+    """Envio de uma mensagem aos inscritos, processado por portal.newsletter"""
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('enviando', 'Enviando'),
+        ('concluido', 'Concluído'),
+    ]
+
+    assunto = models.CharField(max_length=200)
+    mensagem = models.TextField()
+    mensagem_html = models.TextField(blank=True)
+    editorial = models.ForeignKey(
+        Editorial, on_delete=models.SET_NULL, null=True, blank=True, related_name='envios_newsletter'
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente')
+    total = models.PositiveIntegerField(default=0)
+    enviados = models.PositiveIntegerField(default=0)
+    falhas = models.PositiveIntegerField(default=0)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    # Também serve de sinal de vida do processo que está enviando
+    atualizado_em = models.DateTimeField(default=timezone.now)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-criado_em']
+        verbose_name = 'Envio de Newsletter'
+        verbose_name_plural = 'Envios de Newsletter'
+
+    def __str__(self):
+        return f"{self.assunto} ({self.get_status_display()})"
+
+
+class DestinatarioEnvio(models.Model):
+    """Situação do envio para cada destinatário"""
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('enviado', 'Enviado'),
+        ('falhou', 'Falhou'),
+    ]
+
+    envio = models.ForeignKey(EnvioNewsletter, on_delete=models.CASCADE, related_name='destinatarios')
+    inscricao = models.ForeignKey(Newsletter, on_delete=models.SET_NULL, null=True, blank=True)
+    email = models.EmailField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente')
+    tentativas = models.PositiveSmallIntegerField(default=0)
+    erro = models.TextField(blank=True)
+    enviado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Destinatário de Envio'
+        verbose_name_plural = 'Destinatários de Envio'
+        constraints = [
+            models.UniqueConstraint(fields=['envio', 'email'], name='portal_destinatario_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['envio', 'status', 'id'], name='portal_destinatario_fila_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.email} ({self.get_status_display()})"
+
+
+class DocumentoBusca(models.Model):
+    """Documento indexado da busca textual (um por editorial)"""
+    editorial = models.OneToOneField(Editorial, on_delete=models.CASCADE, related_name='documento_busca')
+    titulo = models.CharField(max_length=200)
+    temas = models.TextField(blank=True)
+    corpo = models.TextField(blank=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Documento de Busca'
+        verbose_name_plural = 'Documentos de Busca'
+
+    def __str__(self):
+        return self.titulo
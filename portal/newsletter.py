@@ -0,0 +1,289 @@
+"""
+Envio da newsletter em massa.
+
+Um EnvioNewsletter guarda a mensagem e tem um DestinatarioEnvio por e-mail,
+com a situação de cada um (pendente, enviado ou falhou). O processamento:
+
+- reserva o envio com um UPDATE condicional (um processo por envio; um envio
+  sem sinal de vida há ``NEWSLETTER_TIMEOUT_ENVIO`` segundos pode ser
+  retomado por outro processo, continuando dos destinatários pendentes);
+- lê os pendentes em lotes e envia cada lote em uma thread do pool, usando
+  uma única conexão SMTP por lote e um limite global de mensagens por segundo;
+- grava o resultado dos lotes na thread principal (só ela acessa o banco);
+- repete, com espera crescente, os destinatários com falha temporária até
+  ``NEWSLETTER_MAX_TENTATIVAS``; falhas permanentes não são repetidas.
+"""
+import logging
+import smtplib
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import DestinatarioEnvio, EnvioNewsletter, Newsletter
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_LOTE_CRIACAO = 1000
+
+
+def _config(nome, padrao):
+    return getattr(settings, nome, padrao)
+
+
+def erro_temporario(erro):
+    """Indica se vale a pena tentar de novo o envio que falhou com ``erro``"""
+    if isinstance(erro, smtplib.SMTPRecipientsRefused):
+        return all(400 <= codigo < 500 for codigo, _ in erro.recipients.values())
+    if isinstance(erro, smtplib.SMTPResponseException):
+        return 400 <= erro.smtp_code < 500
+    if isinstance(erro, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(erro, smtplib.SMTPException):
+        return False
+    # Timeout, conexão recusada ou derrubada
+    return isinstance(erro, OSError)
+
+
+def _erro_de_conexao(erro):
+    return isinstance(erro, smtplib.SMTPServerDisconnected) or (
+        isinstance(erro, OSError) and not isinstance(erro, smtplib.SMTPException)
+    )
+
+
+class LimitadorTaxa:
+    """Espaça as mensagens de todas as threads para no máximo ``taxa`` por segundo"""
+
+    def __init__(self, taxa):
+        self.intervalo = 1 / taxa if taxa and taxa > 0 else 0
+        self._proximo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def aguardar(self):
+        if not self.intervalo:
+            return
+        with self._lock:
+            agora = time.monotonic()
+            espera = self._proximo - agora
+            self._proximo = max(agora, self._proximo) + self.intervalo
+        if espera > 0:
+            time.sleep(espera)
+
+
+def criar_envio(assunto, mensagem, inscricoes, mensagem_html='', editorial=None):
+    """Cria um envio com um destinatário por inscrição do queryset informado"""
+    with transaction.atomic():
+        envio = EnvioNewsletter.objects.create(
+            assunto=assunto, mensagem=mensagem, mensagem_html=mensagem_html, editorial=editorial
+        )
+        lote = []
+        for inscricao_id, email in inscricoes.order_by().values_list('pk', 'email').distinct().iterator(
+            chunk_size=TAMANHO_LOTE_CRIACAO
+        ):
+            lote.append(DestinatarioEnvio(envio=envio, inscricao_id=inscricao_id, email=email))
+            if len(lote) >= TAMANHO_LOTE_CRIACAO:
+                DestinatarioEnvio.objects.bulk_create(lote, ignore_conflicts=True)
+                lote = []
+        if lote:
+            DestinatarioEnvio.objects.bulk_create(lote, ignore_conflicts=True)
+        envio.total = envio.destinatarios.count()
+        envio.save(update_fields=['total'])
+    return envio
+
+
+def criar_envio_editorial(editorial):
+    """Cria o envio de um editorial para os inscritos ativos em algum de seus temas"""
+    inscricoes = Newsletter.objects.filter(ativo=True, temas__in=editorial.temas.all())
+    mensagem = f'{editorial.titulo}\n\n{editorial.texto[:500]}'
+    return criar_envio(f'Novo editorial: {editorial.titulo}', mensagem, inscricoes, editorial=editorial)
+
+
+def _montar_mensagem(dados, email, conexao):
+    mensagem = EmailMultiAlternatives(
+        dados['assunto'], dados['mensagem'], settings.DEFAULT_FROM_EMAIL, [email], connection=conexao
+    )
+    if dados['mensagem_html']:
+        mensagem.attach_alternative(dados['mensagem_html'], 'text/html')
+    return mensagem
+
+
+def enviar_lote(dados, destinatarios, limitador):
+    """
+    Envia a mensagem a cada (id, email) do lote por uma única conexão.
+
+    Não acessa o banco; retorna [(id, erro ou None)].
+    """
+    resultados = []
+    conexao = get_connection()
+    try:
+        conexao.open()
+    except Exception as erro:
+        return [(pk, erro) for pk, _ in destinatarios]
+
+    try:
+        for indice, (pk, email) in enumerate(destinatarios):
+            limitador.aguardar()
+            try:
+                conexao.send_messages([_montar_mensagem(dados, email, conexao)])
+            except Exception as erro:
+                resultados.append((pk, erro))
+                if not _erro_de_conexao(erro):
+                    continue
+                # Conexão perdida: reabre uma vez para o restante do lote
+                try:
+                    conexao.close()
+                    conexao.open()
+                except Exception as erro_conexao:
+                    resultados.extend((resto, erro_conexao) for resto, _ in destinatarios[indice + 1:])
+                    break
+            else:
+                resultados.append((pk, None))
+    finally:
+        try:
+            conexao.close()
+        except Exception:
+            pass
+    return resultados
+
+
+def reservar(envio_id):
+    """Reserva o envio para este processo; False se outro processo já o processa"""
+    agora = timezone.now()
+    abandonado = agora - timedelta(seconds=_config('NEWSLETTER_TIMEOUT_ENVIO', 600))
+    reservados = EnvioNewsletter.objects.filter(
+        Q(status='pendente') | Q(status='enviando', atualizado_em__lt=abandonado),
+        pk=envio_id,
+    ).update(status='enviando', atualizado_em=agora)
+    if reservados:
+        EnvioNewsletter.objects.filter(pk=envio_id, iniciado_em__isnull=True).update(iniciado_em=agora)
+    return bool(reservados)
+
+
+def envios_disponiveis():
+    """Ids dos envios pendentes e dos abandonados por processos que pararam"""
+    abandonado = timezone.now() - timedelta(seconds=_config('NEWSLETTER_TIMEOUT_ENVIO', 600))
+    return list(
+        EnvioNewsletter.objects.filter(
+            Q(status='pendente') | Q(status='enviando', atualizado_em__lt=abandonado)
+        ).order_by('criado_em').values_list('pk', flat=True)
+    )
+
+
+class ProcessadorEnvio:
+    """Processa um envio reservado: rodadas de lotes em paralelo até esvaziar a fila"""
+
+    def __init__(self, envio, workers=None, lote=None, taxa=None):
+        self.envio = envio
+        self.workers = max(1, workers or _config('NEWSLETTER_WORKERS', 4))
+        self.lote = max(1, lote or _config('NEWSLETTER_LOTE', 100))
+        self.limitador = LimitadorTaxa(_config('NEWSLETTER_TAXA', 10) if taxa is None else taxa)
+        self.max_tentativas = _config('NEWSLETTER_MAX_TENTATIVAS', 3)
+        self.dados = {
+            'assunto': envio.assunto,
+            'mensagem': envio.mensagem,
+            'mensagem_html': envio.mensagem_html,
+        }
+
+    def pendentes(self):
+        return self.envio.destinatarios.filter(status='pendente')
+
+    def executar(self):
+        rodada = 0
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='newsletter') as pool:
+            while self.pendentes().exists():
+                if rodada:
+                    self.aguardar_nova_tentativa(rodada)
+                self.rodada(pool)
+                rodada += 1
+        return self.finalizar()
+
+    def rodada(self, pool):
+        """Envia uma vez a todos os pendentes, mantendo no máximo ``workers`` lotes em voo"""
+        ultimo = 0
+        em_voo = set()
+        while True:
+            destinatarios = list(
+                self.pendentes().filter(pk__gt=ultimo).order_by('pk').values_list('pk', 'email')[:self.lote]
+            )
+            if destinatarios:
+                ultimo = destinatarios[-1][0]
+                em_voo.add(pool.submit(enviar_lote, self.dados, destinatarios, self.limitador))
+            if not em_voo:
+                return
+            if len(em_voo) >= self.workers or not destinatarios:
+                prontos, em_voo = wait(em_voo, return_when=FIRST_COMPLETED)
+                for futuro in prontos:
+                    self.registrar(futuro.result())
+
+    def registrar(self, resultados):
+        """Grava o resultado de um lote"""
+        agora = timezone.now()
+        enviados = [pk for pk, erro in resultados if erro is None]
+        falhas = [(pk, erro) for pk, erro in resultados if erro is not None]
+        with transaction.atomic():
+            if enviados:
+                DestinatarioEnvio.objects.filter(pk__in=enviados).update(
+                    status='enviado', enviado_em=agora, erro='', tentativas=F('tentativas') + 1
+                )
+            for pk, erro in falhas:
+                DestinatarioEnvio.objects.filter(pk=pk).update(
+                    status='pendente' if erro_temporario(erro) else 'falhou',
+                    erro=f'{type(erro).__name__}: {erro}'[:500],
+                    tentativas=F('tentativas') + 1,
+                )
+            if falhas:
+                DestinatarioEnvio.objects.filter(
+                    pk__in=[pk for pk, _ in falhas], status='pendente', tentativas__gte=self.max_tentativas
+                ).update(status='falhou')
+            EnvioNewsletter.objects.filter(pk=self.envio.pk).update(atualizado_em=agora)
+
+    def aguardar_nova_tentativa(self, rodada):
+        # A espera nunca passa da metade do timeout, para o envio não parecer abandonado
+        limite = _config('NEWSLETTER_TIMEOUT_ENVIO', 600) / 2
+        espera = min(_config('NEWSLETTER_INTERVALO_TENTATIVAS', 30) * 2 ** (rodada - 1), limite)
+        EnvioNewsletter.objects.filter(pk=self.envio.pk).update(atualizado_em=timezone.now())
+        logger.info('Envio %s: nova tentativa dos pendentes em %ss', self.envio.pk, espera)
+        time.sleep(espera)
+
+    def finalizar(self):
+        contagem = self.envio.destinatarios.aggregate(
+            total=Count('pk'),
+            enviados=Count('pk', filter=Q(status='enviado')),
+            falhas=Count('pk', filter=Q(status='falhou')),
+        )
+        agora = timezone.now()
+        EnvioNewsletter.objects.filter(pk=self.envio.pk).update(
+            status='concluido', concluido_em=agora, atualizado_em=agora, **contagem
+        )
+        self.envio.refresh_from_db()
+        return self.envio
+
+
+def processar_envio(envio_id, workers=None, lote=None, taxa=None):
+    """Reserva e processa um envio; retorna o envio concluído ou None se não foi possível reservá-lo"""
+    if not reservar(envio_id):
+        return None
+    envio = EnvioNewsletter.objects.get(pk=envio_id)
+    return ProcessadorEnvio(envio, workers, lote, taxa).executar()
+
+
+def processar_em_segundo_plano(envio_id):
+    """
+    Processa o envio em uma thread do servidor, sem bloquear a requisição
+    (opcional, com ``NEWSLETTER_ENVIO_AUTOMATICO``; o padrão é o comando)
+    """
+    def executar():
+        try:
+            processar_envio(envio_id)
+        except Exception:
+            logger.exception('Falha ao processar o envio %s', envio_id)
+        finally:
+            connection.close()
+
+    threading.Thread(target=executar, name=f'newsletter-{envio_id}', daemon=True).start()
@@ -0,0 +1,72 @@
+"""
+Orçamento de consultas SQL por view.
+
+Cada view pública declara quantas consultas pode executar com o decorator
+``orcamento_consultas``. O orçamento é verificado nos testes
+(``OrcamentoConsultasMixin``) e, em DEBUG, pelo middleware
+``portal.middleware.OrcamentoConsultasMiddleware``; assim um N+1 introduzido
+em um template aparece como falha em vez de lentidão em produção.
+"""
+from contextlib import contextmanager
+
+from django.db import connection
+from django.urls import resolve
+
+
+class OrcamentoConsultasExcedido(AssertionError):
+    pass
+
+
+def orcamento_consultas(limite):
+    """Declara o número máximo de consultas SQL da view"""
+    def decorator(view):
+        view.orcamento_consultas = limite
+        return view
+
+    return decorator
+
+
+def obter_orcamento(view):
+    return getattr(view, 'orcamento_consultas', None)
+
+
+class ContadorConsultas:
+    """execute_wrapper que conta (e guarda) as consultas executadas"""
+
+    def __init__(self):
+        self.consultas = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.consultas.append(sql)
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.consultas)
+
+
+@contextmanager
+def contar_consultas(conexao=connection):
+    contador = ContadorConsultas()
+    with conexao.execute_wrapper(contador):
+        yield contador
+
+
+def verificar_orcamento(nome, limite, contador):
+    if limite is not None and len(contador) > limite:
+        consultas = '\n'.join(f'{i}. {sql}' for i, sql in enumerate(contador.consultas, 1))
+        raise OrcamentoConsultasExcedido(
+            f'{nome} executou {len(contador)} consultas (orçamento: {limite}):\n{consultas}'
+        )
+
+
+class OrcamentoConsultasMixin:
+    """Mixin de TestCase que compara uma requisição ao orçamento da view"""
+
+    def assertDentroDoOrcamento(self, url, **extra):
+        view = resolve(url.split('?')[0]).func
+        limite = obter_orcamento(view)
+        self.assertIsNotNone(limite, f'{view.__name__} não declara orcamento_consultas')
+        with contar_consultas() as contador:
+            resposta = self.client.get(url, **extra)
+        verificar_orcamento(view.__name__, limite, contador)
+        return resposta
@@ -0,0 +1,207 @@
+"""
+Paginação por cursor (keyset).
+
+Em vez de ``OFFSET``, cada página continua a partir da chave de ordenação do
+último item exibido (ex.: ``data_publicacao, id``), com um filtro do tipo
+``(data, id) < (data_do_último, id_do_último)`` que usa o índice. Assim a
+página 500 custa o mesmo que a primeira e não há ``COUNT(*)``.
+
+O cursor é a chave assinada (``django.core.signing``), opaca para o visitante;
+um cursor inválido ou adulterado mostra a primeira página. A página tem a
+mesma interface básica de ``django.core.paginator.Page`` (``object_list``,
+``has_next``, ``has_previous``, ``has_other_pages``) e as URLs de navegação.
+"""
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.core import signing
+from django.db.models import Q
+from django.http import QueryDict
+
+PARAMETRO = 'cursor'
+SALT = 'portal.paginacao'
+
+# Ordenação das listagens de editoriais; o id desempata publicações no mesmo instante
+ORDEM_PUBLICACAO = ('-data_publicacao', '-id')
+
+PROXIMA = 'p'
+ANTERIOR = 'a'
+ULTIMA = 'u'
+
+
+def _serializar(valor):
+    # isoformat completo: o DjangoJSONEncoder corta os microssegundos
+    return valor.isoformat() if isinstance(valor, datetime) else valor
+
+
+def codificar_cursor(direcao, chave=None):
+    valores = None if chave is None else [_serializar(valor) for valor in chave]
+    return signing.dumps({'d': direcao, 'k': valores}, salt=SALT, compress=True)
+
+
+def decodificar_cursor(token):
+    """Retorna (direção, valores da chave) ou (None, None) para a primeira página"""
+    if not token:
+        return None, None
+    try:
+        dados = signing.loads(token, salt=SALT)
+        return dados['d'], dados['k']
+    except (signing.BadSignature, KeyError, TypeError):
+        return None, None
+
+
+class JanelaQuerySet:
+    """Lê janelas de um queryset a partir de uma chave de ordenação única"""
+
+    def __init__(self, queryset, ordenacao=ORDEM_PUBLICACAO):
+        self.queryset = queryset
+        self.ordenacao = tuple(ordenacao)
+        self.campos = tuple(campo.lstrip('-') for campo in self.ordenacao)
+
+    def count(self):
+        return self.queryset.count()
+
+    def chave(self, objeto):
+        return tuple(getattr(objeto, campo) for campo in self.campos)
+
+    def converter_chave(self, valores):
+        opcoes = self.queryset.model._meta
+        return tuple(opcoes.get_field(campo).to_python(valor) for campo, valor in zip(self.campos, valores))
+
+    def _depois_de(self, chave, reverso):
+        """(a, b) depois de (x, y) = a > x OR (a = x AND b > y), no sentido de cada campo"""
+        condicao = None
+        for campo, ordem, valor in reversed(list(zip(self.campos, self.ordenacao, chave))):
+            decrescente = ordem.startswith('-') != reverso
+            passo = Q(**{f'{campo}__{"lt" if decrescente else "gt"}': valor})
+            if condicao is not None:
+                passo |= Q(**{campo: valor}) & condicao
+            condicao = passo
+        return condicao
+
+    def janela(self, chave, quantidade, reverso=False):
+        """Até ``quantidade`` itens depois da chave (antes dela, em ordem invertida, se reverso)"""
+        ordem = self.ordenacao
+        if reverso:
+            ordem = tuple(campo[1:] if campo.startswith('-') else f'-{campo}' for campo in ordem)
+        queryset = self.queryset.order_by(*ordem)
+        if chave is not None:
+            queryset = queryset.filter(self._depois_de(chave, reverso))
+        return list(queryset[:quantidade])
+
+
+class PaginaCursor:
+    """Página de um PaginadorCursor, compatível com o uso básico de Page nos templates"""
+
+    def __init__(self, paginador, object_list, anterior, proxima, request=None):
+        self.paginator = paginador
+        self.object_list = object_list
+        self.cursor_anterior = anterior
+        self.cursor_proxima = proxima
+        self.request = request
+
+    def __repr__(self):
+        return f'<PaginaCursor com {len(self.object_list)} itens>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, indice):
+        return self.object_list[indice]
+
+    def has_next(self):
+        return self.cursor_proxima is not None
+
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def _url(self, cursor):
+        parametros = self.request.GET.copy() if self.request is not None else QueryDict(mutable=True)
+        for nome in (PARAMETRO, 'page'):
+            parametros.pop(nome, None)
+        if cursor:
+            parametros[PARAMETRO] = cursor
+        return '?' + parametros.urlencode()
+
+    @property
+    def url_primeira(self):
+        return self._url(None)
+
+    @property
+    def url_anterior(self):
+        return self._url(self.cursor_anterior)
+
+    @property
+    def url_proxima(self):
+        return self._url(self.cursor_proxima)
+
+    @property
+    def url_ultima(self):
+        return self._url(codificar_cursor(ULTIMA))
+
+
+class PaginadorCursor:
+    """
+    Pagina uma fonte com ``janela(chave, quantidade, reverso)``, ``chave(objeto)``
+    e ``converter_chave(valores)`` (um JanelaQuerySet ou o ResultadoBusca).
+    """
+
+    def __init__(self, fonte, por_pagina):
+        self.fonte = fonte
+        self.per_page = por_pagina
+        self._count = None
+
+    @property
+    def count(self):
+        """Total de itens; só consulta o banco se o template usar"""
+        if self._count is None:
+            self._count = self.fonte.count()
+        return self._count
+
+    def pagina(self, cursor=None, request=None):
+        direcao, valores = decodificar_cursor(cursor)
+        chave = None
+        if valores is not None:
+            try:
+                chave = self.fonte.converter_chave(valores)
+            except Exception:
+                direcao = None
+        if direcao in (PROXIMA, ANTERIOR) and chave is None:
+            direcao = None
+
+        # Um item a mais indica se existe página seguinte na direção lida
+        if direcao in (ANTERIOR, ULTIMA):
+            itens = self.fonte.janela(chave, self.per_page + 1, reverso=True)
+            tem_mais = len(itens) > self.per_page
+            itens = itens[:self.per_page][::-1]
+            tem_anterior, tem_proxima = tem_mais, direcao == ANTERIOR
+        else:
+            itens = self.fonte.janela(chave, self.per_page + 1)
+            tem_mais = len(itens) > self.per_page
+            itens = itens[:self.per_page]
+            tem_anterior, tem_proxima = direcao == PROXIMA, tem_mais
+
+        anterior = proxima = None
+        if itens and tem_anterior:
+            anterior = codificar_cursor(ANTERIOR, self.fonte.chave(itens[0]))
+        if itens and tem_proxima:
+            proxima = codificar_cursor(PROXIMA, self.fonte.chave(itens[-1]))
+        return PaginaCursor(self, itens, anterior, proxima, request)
+
+
+def paginar(request, fonte, por_pagina, ordenacao=ORDEM_PUBLICACAO):
+    """Página do request (parâmetro ``cursor``); querysets são ordenados por ``ordenacao``"""
+    if not hasattr(fonte, 'janela'):
+        fonte = JanelaQuerySet(fonte, ordenacao)
+    return PaginadorCursor(fonte, por_pagina).pagina(request.GET.get(PARAMETRO), request)
+
+
+async def apaginar(request, fonte, por_pagina, ordenacao=ORDEM_PUBLICACAO):
+    """``paginar`` para views assíncronas; a leitura da janela roda em thread"""
+    return await sync_to_async(paginar)(request, fonte, por_pagina, ordenacao)
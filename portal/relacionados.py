@@ -0,0 +1,316 @@
+"""
+Editoriais relacionados pré-calculados.
+
+Para cada editorial publicado guardamos em EditorialRelacionado os
+``RELACIONADOS_QUANTIDADE`` candidatos de maior pontuação, e a página de
+detalhe os lê com uma única consulta pelo índice (editorial, pontuação).
+
+Os candidatos são os editoriais publicados que compartilham um tema ou o
+autor (no máximo ``RELACIONADOS_CANDIDATOS``, os mais recentes). A pontuação
+soma, com os pesos de ``PESOS``:
+
+- temas: sobreposição (Jaccard) dos temas;
+- autor: 1 se o autor é o mesmo;
+- recencia: proximidade das datas de publicação (meia-vida de ``MEIA_VIDA_DIAS``);
+- texto: similaridade de cosseno TF-IDF de título e texto, com o IDF
+  calculado sobre o próprio conjunto de candidatos.
+
+Ao publicar (ou alterar) um editorial, a lista dele é recalculada e ele entra
+na lista dos candidatos em que supera a menor pontuação guardada. As
+alterações (salvar um editorial, ações do admin, agendamento, temas,
+remoções) só põem os ids na fila ``RelacionadoPendente``, na mesma
+transação; ela é processada fora da requisição por
+``calcular_relacionados --pendentes`` com uma invalidação por lote.
+"""
+import math
+import re
+import unicodedata
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from . import cache_paginas
+from .models import Editorial, EditorialRelacionado, RelacionadoPendente
+
+PESOS = {
+    'temas': 0.4,
+    'texto': 0.3,
+    'recencia': 0.2,
+    'autor': 0.1,
+}
+MEIA_VIDA_DIAS = 30
+
+# O título pesa mais que o texto na similaridade
+PESO_TITULO = 3
+
+# Editoriais da fila recalculados por transação
+TAMANHO_LOTE = 200
+
+PALAVRA = re.compile(r'[^\W\d_]{3,}')
+
+STOPWORDS = frozenset('''
+    ainda alem algum alguns antes apos aquela aquele aqueles aquilo area cada com como contra
+    da das de dela dele deles depois desde dessa desse desta deste do dos durante ela elas ele
+    eles em entre era essa esse esta estao este foi foram havia isso isto ja mais mas mesmo
+    muito muitos na nao nas nem no nos nossa nosso num numa obra onde os ou outra outro para
+    pela pelas pelo pelos por porque pois quais qual quando que quem sao se sem ser seu seus
+    sobre sua suas tambem tem tendo ter toda todas todo todos uma umas uns vai voce
+'''.split())
+
+
+def _config(nome, padrao):
+    return getattr(settings, nome, padrao)
+
+
+def termos(texto):
+    """Palavras normalizadas (minúsculas, sem acento, sem stopwords)"""
+    texto = unicodedata.normalize('NFKD', strip_tags(texto or '').lower())
+    texto = ''.join(caractere for caractere in texto if not unicodedata.combining(caractere))
+    return [palavra for palavra in PALAVRA.findall(texto) if palavra not in STOPWORDS]
+
+
+def frequencias(editorial):
+    contagem = Counter(termos(editorial.texto))
+    for palavra in termos(editorial.titulo):
+        contagem[palavra] += PESO_TITULO
+    return contagem
+
+
+def vetores_tfidf(documentos):
+    """{id: Counter} -> {id: {termo: peso}} normalizados (tf sublinear, idf suavizado)"""
+    total = len(documentos)
+    df = Counter()
+    for contagem in documentos.values():
+        df.update(contagem.keys())
+    vetores = {}
+    for chave, contagem in documentos.items():
+        vetor = {
+            termo: (1 + math.log(frequencia)) * (math.log((1 + total) / (1 + df[termo])) + 1)
+            for termo, frequencia in contagem.items()
+        }
+        norma = math.sqrt(sum(peso * peso for peso in vetor.values())) or 1.0
+        vetores[chave] = {termo: peso / norma for termo, peso in vetor.items()}
+    return vetores
+
+
+def cosseno(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(peso * b.get(termo, 0.0) for termo, peso in a.items())
+
+
+def _temas_por_editorial(ids):
+    resultado = {pk: set() for pk in ids}
+    relacoes = Editorial.temas.through.objects.filter(editorial_id__in=ids).values_list('editorial_id', 'tema_id')
+    for editorial_id, tema_id in relacoes:
+        resultado[editorial_id].add(tema_id)
+    return resultado
+
+
+def candidatos(editorial, temas_ids):
+    filtro = Q(temas__in=temas_ids) if temas_ids else Q(pk__in=[])
+    if editorial.autor_id:
+        filtro |= Q(autor_id=editorial.autor_id)
+    return list(
+        Editorial.objects.publicados().filter(filtro).exclude(pk=editorial.pk).distinct()
+        .only('id', 'titulo', 'texto', 'autor_id', 'data_publicacao')
+        .order_by('-data_publicacao')[:_config('RELACIONADOS_CANDIDATOS', 500)]
+    )
+
+
+def pontuar(editorial, lista):
+    """Pontuação de cada candidato em relação ao editorial: {id: pontuação}"""
+    if not lista:
+        return {}
+    temas = _temas_por_editorial([editorial.pk] + [candidato.pk for candidato in lista])
+    documentos = {candidato.pk: frequencias(candidato) for candidato in lista}
+    documentos[editorial.pk] = frequencias(editorial)
+    vetores = vetores_tfidf(documentos)
+
+    referencia = editorial.data_publicacao or timezone.now()
+    pontuacoes = {}
+    for candidato in lista:
+        uniao = temas[editorial.pk] | temas[candidato.pk]
+        sobreposicao = len(temas[editorial.pk] & temas[candidato.pk]) / len(uniao) if uniao else 0.0
+        dias = abs((referencia - candidato.data_publicacao).total_seconds()) / 86400
+        pontuacoes[candidato.pk] = (
+            PESOS['temas'] * sobreposicao
+            + PESOS['texto'] * cosseno(vetores[editorial.pk], vetores[candidato.pk])
+            + PESOS['recencia'] * 0.5 ** (dias / MEIA_VIDA_DIAS)
+            + PESOS['autor'] * (1.0 if editorial.autor_id and editorial.autor_id == candidato.autor_id else 0.0)
+        )
+    return pontuacoes
+
+
+def _publicado(editorial):
+    return (
+        editorial.status == 'publicado' and editorial.ativo
+        and editorial.data_publicacao is not None and editorial.data_publicacao <= timezone.now()
+    )
+
+
+def _invalidar(ids):
+    tags = [f'editorial:{pk}' for pk in ids]
+    if tags:
+        transaction.on_commit(lambda: cache_paginas.invalidar(*tags))
+
+
+def atualizar(editorial_id, reciproco=True):
+    """
+    Recalcula a lista do editorial; com ``reciproco``, também o inclui nas
+    listas dos candidatos em que ele entra no top-k. Retorna os ids dos
+    editoriais cujas listas mudaram.
+    """
+    alterados = _recalcular(editorial_id, reciproco)
+    _invalidar(alterados)
+    return alterados
+
+
+def _recalcular(editorial_id, reciproco=True):
+    """``atualizar`` sem expirar as páginas: quem chama invalida uma vez"""
+    quantidade = _config('RELACIONADOS_QUANTIDADE', 8)
+    editorial = Editorial.objects.filter(pk=editorial_id).only(
+        'id', 'titulo', 'texto', 'autor_id', 'status', 'ativo', 'data_publicacao'
+    ).first()
+    if editorial is None:
+        return set()
+    if not _publicado(editorial):
+        return _remover(editorial_id)
+
+    lista = candidatos(editorial, list(editorial.temas.values_list('pk', flat=True)))
+    pontuacoes = pontuar(editorial, lista)
+    melhores = sorted(pontuacoes.items(), key=lambda item: (-item[1], -item[0]))[:quantidade]
+    alterados = {editorial.pk}
+
+    with transaction.atomic():
+        EditorialRelacionado.objects.filter(editorial_id=editorial.pk).delete()
+        EditorialRelacionado.objects.bulk_create([
+            EditorialRelacionado(editorial_id=editorial.pk, relacionado_id=pk, pontuacao=pontuacao)
+            for pk, pontuacao in melhores
+        ])
+        if reciproco and pontuacoes:
+            alterados |= _incluir_nos_candidatos(editorial.pk, pontuacoes, quantidade)
+    return alterados
+
+
+def _incluir_nos_candidatos(editorial_id, pontuacoes, quantidade):
+    """
+    Insere o editorial nas listas em que supera a menor pontuação guardada e
+    o tira das que não o comportam mais; estas são recalculadas.
+    """
+    anteriores = set(
+        EditorialRelacionado.objects.filter(relacionado_id=editorial_id).values_list('editorial_id', flat=True)
+    )
+    limites = {
+        linha['editorial_id']: linha
+        for linha in EditorialRelacionado.objects.filter(editorial_id__in=pontuacoes.keys())
+        .exclude(relacionado_id=editorial_id)
+        .values('editorial_id').annotate(total=Count('pk'), minimo=Min('pontuacao'))
+    }
+    entrar = [
+        pk for pk, pontuacao in pontuacoes.items()
+        if pk not in limites or limites[pk]['total'] < quantidade or pontuacao > limites[pk]['minimo']
+    ]
+
+    EditorialRelacionado.objects.filter(relacionado_id=editorial_id).exclude(editorial_id__in=entrar).delete()
+    EditorialRelacionado.objects.bulk_create(
+        [EditorialRelacionado(editorial_id=pk, relacionado_id=editorial_id, pontuacao=pontuacoes[pk]) for pk in entrar],
+        update_conflicts=True,
+        unique_fields=['editorial', 'relacionado'],
+        update_fields=['pontuacao'],
+    )
+    # Listas que passaram de k itens perdem o de menor pontuação
+    cheias = [pk for pk in entrar if pk in limites and limites[pk]['total'] >= quantidade]
+    for pk in cheias:
+        excedentes = list(
+            EditorialRelacionado.objects.filter(editorial_id=pk)
+            .order_by('-pontuacao', '-relacionado_id').values_list('pk', flat=True)[quantidade:]
+        )
+        if excedentes:
+            EditorialRelacionado.objects.filter(pk__in=excedentes).delete()
+
+    # Listas que perderam o editorial ficaram com uma vaga
+    for pk in anteriores - set(entrar):
+        _recalcular(pk, reciproco=False)
+    return set(entrar) | anteriores
+
+
+def remover(editorial_id):
+    """Tira o editorial (despublicado) das listas e recalcula as que o continham"""
+    afetados = _remover(editorial_id)
+    _invalidar(afetados)
+    return afetados
+
+
+def _remover(editorial_id):
+    afetados = set(
+        EditorialRelacionado.objects.filter(relacionado_id=editorial_id).values_list('editorial_id', flat=True)
+    )
+    EditorialRelacionado.objects.filter(Q(editorial_id=editorial_id) | Q(relacionado_id=editorial_id)).delete()
+    for pk in afetados:
+        _recalcular(pk, reciproco=False)
+    return afetados
+
+
+def atualizar_varios(ids, reciproco=True):
+    """Recalcula os editoriais com uma única invalidação para todas as listas alteradas"""
+    alterados = set()
+    for editorial_id in ids:
+        alterados |= _recalcular(editorial_id, reciproco)
+    _invalidar(alterados)
+    return alterados
+
+
+def enfileirar(ids):
+    """Põe os editoriais na fila de ``processar_pendentes`` (uma consulta)"""
+    agora = timezone.now()
+    RelacionadoPendente.objects.bulk_create(
+        [RelacionadoPendente(editorial_id=pk, marcado_em=agora) for pk in set(ids)],
+        update_conflicts=True,
+        unique_fields=['editorial_id'],
+        update_fields=['marcado_em'],
+    )
+
+
+def processar_pendentes(lote=TAMANHO_LOTE):
+    """Recalcula a fila, ``lote`` editoriais por transação; retorna o total"""
+    total = 0
+    while True:
+        pendentes = dict(
+            RelacionadoPendente.objects.order_by('marcado_em').values_list('editorial_id', 'marcado_em')[:lote]
+        )
+        if not pendentes:
+            return total
+        with transaction.atomic():
+            atualizar_varios(pendentes)
+            # Os marcados de novo durante o cálculo continuam na fila
+            RelacionadoPendente.objects.filter(
+                editorial_id__in=pendentes, marcado_em__lte=max(pendentes.values())
+            ).delete()
+        total += len(pendentes)
+
+
+def _consulta_relacionados(editorial, limite):
+    agora = timezone.now()
+    return EditorialRelacionado.objects.filter(
+        editorial_id=editorial.pk,
+        relacionado__status='publicado',
+        relacionado__ativo=True,
+        relacionado__data_publicacao__lte=agora,
+    ).select_related('relacionado').only(
+        'relacionado', 'relacionado__id', 'relacionado__titulo', 'relacionado__texto', 'relacionado__imagem1',
+        'relacionado__variantes_imagens', 'relacionado__data_publicacao',
+    ).order_by('-pontuacao')[:limite]
+
+
+def relacionados(editorial, limite=4):
+    """Relacionados publicados do editorial, por pontuação (uma consulta)"""
+    return [item.relacionado for item in _consulta_relacionados(editorial, limite)]
+
+
+async def arelacionados(editorial, limite=4):
+    return [item.relacionado async for item in _consulta_relacionados(editorial, limite)]
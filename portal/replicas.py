@@ -0,0 +1,133 @@
+"""
+Leitura das páginas públicas nas réplicas do banco.
+
+As views públicas marcadas com ``@ler_de_replica`` leem de uma das réplicas de
+``REPLICAS`` (sorteada por requisição, para que a página inteira veja o
+mesmo banco); todo o resto, e todas as escritas, vão para o ``default``.
+
+Para que quem acabou de escrever veja a própria escrita apesar do atraso da
+replicação, a requisição volta ao primário:
+
+- por ``REPLICAS_JANELA`` segundos depois de uma requisição que escreve
+  (POST, PUT, PATCH ou DELETE, como o admin e a newsletter), pelo cookie
+  ``COOKIE``;
+- por ``REPLICAS_JANELA`` segundos depois de qualquer invalidação do cache de
+  páginas, para que a página guardada com a versão nova não seja renderizada
+  a partir de uma réplica ainda desatualizada.
+"""
+import contextvars
+import random
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+from . import cache_paginas
+
+COOKIE = 'primario'
+METODOS_ESCRITA = frozenset({'POST', 'PUT', 'PATCH', 'DELETE'})
+
+# Tabela do cache em banco: as versões das tags precisam ser lidas do primário
+APPS_PRIMARIO = frozenset({'django_cache'})
+
+_replica = contextvars.ContextVar('replica', default=None)
+
+
+def ler_de_replica(view):
+    """
+    Declara que a view pública (GET/HEAD) pode ler de uma réplica.
+
+    A réplica é escolhida e liberada no mesmo escopo, em volta da view: no
+    modo ASGI o middleware e a view não compartilham o contexto das
+    ContextVars. As consultas em ``sync_to_async`` herdam a cópia do contexto.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            # escolher() lê a última invalidação do cache de páginas (pode
+            # bloquear); a ContextVar é definida aqui, no contexto da view
+            alias = await sync_to_async(escolher)(request)
+            token = _replica.set(alias) if alias else None
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                if token is not None:
+                    _replica.reset(token)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            alias = escolher(request)
+            token = _replica.set(alias) if alias else None
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                if token is not None:
+                    _replica.reset(token)
+
+    return wrapper
+
+
+def replicas():
+    return list(getattr(settings, 'REPLICAS', []))
+
+
+def janela():
+    return getattr(settings, 'REPLICAS_JANELA', 10)
+
+
+def escolher(request):
+    """Alias da réplica para a requisição, ou None para ler do primário"""
+    disponiveis = replicas()
+    if not disponiveis or request.method not in ('GET', 'HEAD') or COOKIE in request.COOKIES:
+        return None
+    if time.time_ns() - cache_paginas.ultima_invalidacao() < janela() * 1_000_000_000:
+        return None
+    return random.choice(disponiveis)
+
+
+class RoteadorReplicas:
+    """Leituras na réplica escolhida para a requisição; escritas no default"""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in APPS_PRIMARIO:
+            return 'default'
+        return _replica.get() or 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplicas têm os mesmos dados do primário
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+class ReplicasMiddleware:
+    """
+    Grava o cookie que fixa no primário quem acabou de escrever. Síncrono e
+    assíncrono: no modo ASGI não obriga a cadeia a passar por uma thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.fixar_primario(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.fixar_primario(request, await self.get_response(request))
+
+    def fixar_primario(self, request, response):
+        if replicas() and request.method in METODOS_ESCRITA and response.status_code < 500:
+            response.set_cookie(COOKIE, '1', max_age=janela(), httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,185 @@
+"""
+Sinais do portal: mantêm índices e caches derivados em dia quando o
+conteúdo é alterado pelo admin ou pelos comandos.
+"""
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import busca, cache_paginas, imagens, relacionados
+from .contexto import contexto
+from .models import Autor, ConfiguracaoSite, Editorial, EditorialRelacionado, Tema, editoriais_alterados
+
+
+def tags_editoriais(ids, autores_extras=()):
+    """Tags das páginas em cache que exibem os editoriais informados"""
+    ids = list(ids)
+    tags = {'home'}
+    tags.update(f'editorial:{pk}' for pk in ids)
+    autores = set(Editorial.objects.filter(pk__in=ids).values_list('autor_id', flat=True))
+    autores.update(autores_extras)
+    tags.update(f'autor:{pk}' for pk in autores if pk)
+    temas = Editorial.temas.through.objects.filter(editorial_id__in=ids).values_list('tema_id', flat=True)
+    tags.update(f'tema:{pk}' for pk in set(temas))
+    return tags
+
+
+def invalidar_paginas_editoriais(ids, autores_extras=()):
+    """Expira as páginas em cache que exibem os editoriais informados"""
+    cache_paginas.invalidar(*tags_editoriais(ids, autores_extras))
+
+
+@receiver(post_save, sender=Editorial)
+def indexar_editorial_salvo(sender, instance, raw=False, **kwargs):
+    """Atualiza o documento de busca do editorial salvo"""
+    if raw:
+        return
+    transaction.on_commit(lambda: busca.indexar_editoriais([instance.pk]))
+
+
+def editoriais_com_temas_alterados(instance, action, reverse, pk_set):
+    """Ids dos editoriais cujos temas mudaram em um m2m_changed (None se ainda não mudaram)"""
+    if reverse:
+        # tema.editoriais.add/remove/clear: pk_set são editoriais
+        if action == 'pre_clear':
+            instance._editoriais_antes_clear = list(instance.editoriais.values_list('pk', flat=True))
+            return None
+        if action == 'post_clear':
+            return getattr(instance, '_editoriais_antes_clear', [])
+        if action in ('post_add', 'post_remove'):
+            return list(pk_set or [])
+        return None
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        return [instance.pk]
+    return None
+
+
+@receiver(m2m_changed, sender=Editorial.temas.through)
+def indexar_temas_alterados(sender, instance, action, reverse, pk_set, **kwargs):
+    """Reindexa os editoriais cujos temas mudaram e recalcula seus relacionados"""
+    ids = editoriais_com_temas_alterados(instance, action, reverse, pk_set)
+    if ids:
+        transaction.on_commit(lambda: busca.indexar_editoriais(ids))
+        relacionados.enfileirar(ids)
+
+
+@receiver(post_save, sender=Tema)
+def indexar_tema_salvo(sender, instance, created=False, raw=False, **kwargs):
+    """O nome do tema faz parte do documento dos seus editoriais"""
+    if raw or created:
+        return
+    transaction.on_commit(lambda: busca.indexar_tema(instance.pk))
+
+
+# Campos que alteram a pontuação dos relacionados ou a publicação
+CAMPOS_RELACIONADOS = {'titulo', 'texto', 'autor', 'status', 'ativo', 'data_publicacao'}
+
+
+@receiver(post_save, sender=Editorial)
+def atualizar_relacionados(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Põe o editorial na fila dos relacionados (na mesma transação): o TF-IDF
+    é recalculado fora da requisição do admin
+    """
+    if raw or (update_fields is not None and not CAMPOS_RELACIONADOS & set(update_fields)):
+        return
+    relacionados.enfileirar([instance.pk])
+
+
+@receiver(pre_delete, sender=Editorial)
+def recalcular_relacionados_do_removido(sender, instance, **kwargs):
+    """As listas que continham o editorial removido ficam com uma vaga: vão para a fila"""
+    afetados = list(
+        EditorialRelacionado.objects.filter(relacionado_id=instance.pk).values_list('editorial_id', flat=True)
+    )
+    if afetados:
+        relacionados.enfileirar([pk for pk in afetados if pk != instance.pk])
+
+
+@receiver(pre_save, sender=Editorial)
+def guardar_autor_anterior(sender, instance, raw=False, **kwargs):
+    """Guarda o autor anterior para expirar também a página dele"""
+    if raw or instance.pk is None:
+        return
+    instance._autor_anterior_id = Editorial.objects.filter(pk=instance.pk).values_list('autor_id', flat=True).first()
+
+
+@receiver(post_save, sender=Editorial)
+def invalidar_paginas_editorial(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    extras = [instance.autor_id, getattr(instance, '_autor_anterior_id', None)]
+    transaction.on_commit(lambda: invalidar_paginas_editoriais([instance.pk], extras))
+
+
+@receiver(editoriais_alterados, sender=Editorial)
+def atualizar_editoriais_alterados(sender, ids, **kwargs):
+    """
+    Alterações em lote (update()): uma invalidação para todos; os relacionados
+    vão para a fila, na mesma transação, e são recalculados fora da requisição
+    """
+    ids = list(ids)
+    transaction.on_commit(lambda: invalidar_paginas_editoriais(ids))
+    relacionados.enfileirar(ids)
+
+
+@receiver(pre_delete, sender=Editorial)
+def guardar_tags_editorial_removido(sender, instance, **kwargs):
+    """Depois da remoção os temas do editorial não estão mais no banco"""
+    instance._tags_cache = tags_editoriais([instance.pk], [instance.autor_id])
+
+
+@receiver(post_delete, sender=Editorial)
+def invalidar_paginas_editorial_removido(sender, instance, **kwargs):
+    tags = getattr(instance, '_tags_cache', ())
+    transaction.on_commit(lambda: cache_paginas.invalidar(*tags))
+
+
+@receiver(m2m_changed, sender=Editorial.temas.through)
+def invalidar_paginas_temas_alterados(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        tags = [f'tema:{instance.pk}', 'home']
+        tags += [f'editorial:{pk}' for pk in (pk_set or [])]
+    else:
+        # No clear, os temas removidos ainda estão na tabela (pre_clear)
+        temas = pk_set if pk_set is not None else instance.temas.values_list('pk', flat=True)
+        tags = [f'editorial:{instance.pk}'] + [f'tema:{pk}' for pk in temas]
+    transaction.on_commit(lambda: cache_paginas.invalidar(*tags))
+
+
+@receiver(post_save, sender=Tema)
+@receiver(post_delete, sender=Tema)
+def invalidar_paginas_tema(sender, instance, raw=False, **kwargs):
+    """Os temas ativos aparecem na navegação de todas as páginas"""
+    if raw:
+        return
+    transaction.on_commit(lambda: cache_paginas.invalidar(f'tema:{instance.pk}', 'navegacao'))
+    transaction.on_commit(contexto.invalidar)
+
+
+@receiver(post_save, sender=Autor)
+@receiver(post_delete, sender=Autor)
+def invalidar_paginas_autor(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(lambda: cache_paginas.invalidar(f'autor:{instance.pk}', 'autores'))
+
+
+@receiver(post_save, sender=ConfiguracaoSite)
+def invalidar_paginas_site(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(lambda: cache_paginas.invalidar('site'))
+    transaction.on_commit(contexto.invalidar)
+
+
+@receiver(post_save, sender=Editorial)
+@receiver(post_save, sender=Autor)
+@receiver(post_save, sender=ConfiguracaoSite)
+def gerar_variantes_imagens(sender, instance, raw=False, **kwargs):
+    """Gera, fora da requisição, as variantes das imagens novas"""
+    if raw:
+        return
+    imagens.sincronizar(instance)
@@ -0,0 +1,97 @@
+"""
+Sitemaps XML (protocolo sitemaps.org) para os buscadores.
+
+``/sitemap.xml`` é o índice: aponta para ``sitemap-paginas.xml`` (home, temas
+e autores) e para os sitemaps dos editoriais publicados de cada tema,
+divididos em arquivos de até ``SITEMAP_TAMANHO`` URLs. O índice e o sitemap
+das páginas são pequenos e ficam no cache de páginas; os dos temas são
+gerados em fluxo (``iterator()`` e blocos de XML) e respondem 304 pelas
+versões da tag ``tema:<id>``, trocada a cada publicação no tema.
+"""
+from math import ceil
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Autor, Editorial, Tema
+
+TAMANHO_BLOCO = 1000
+
+CABECALHO = '<?xml version="1.0" encoding="UTF-8"?>\n'
+XMLNS = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+
+
+def tamanho():
+    """URLs por arquivo (o protocolo aceita até 50.000)"""
+    return getattr(settings, 'SITEMAP_TAMANHO', 50000)
+
+
+def raiz(request):
+    """Esquema e domínio das URLs absolutas"""
+    return request.build_absolute_uri('/').rstrip('/')
+
+
+def _entrada(elemento, endereco, alterado=None):
+    lastmod = f'<lastmod>{alterado.isoformat(timespec="seconds")}</lastmod>' if alterado else ''
+    return f'<{elemento}><loc>{escape(endereco)}</loc>{lastmod}</{elemento}>\n'
+
+
+def indice(base):
+    """XML do índice: o sitemap das páginas e os de cada tema com editoriais"""
+    publicados = Q(
+        editoriais__status='publicado', editoriais__ativo=True, editoriais__data_publicacao__lte=timezone.now()
+    )
+    temas = Tema.objects.filter(ativo=True).annotate(
+        total=Count('editoriais', filter=publicados),
+        alterado=Max('editoriais__data_atualizacao', filter=publicados),
+    ).filter(total__gt=0).order_by('slug').values_list('slug', 'total', 'alterado')
+
+    partes = [CABECALHO, f'<sitemapindex {XMLNS}>\n', _entrada('sitemap', base + reverse('portal:sitemap_paginas'))]
+    for slug, total, alterado in temas:
+        for pagina in range(1, ceil(total / tamanho()) + 1):
+            endereco = base + reverse('portal:sitemap_tema', args=[slug, pagina])
+            partes.append(_entrada('sitemap', endereco, alterado))
+    partes.append('</sitemapindex>\n')
+    return ''.join(partes)
+
+
+def paginas(base, temas):
+    """XML com a home, as páginas dos temas ativos e as dos autores ativos"""
+    enderecos = [reverse('portal:home'), reverse('portal:autores')]
+    enderecos += [reverse('portal:tema', args=[tema.slug]) for tema in temas]
+    enderecos += [
+        reverse('portal:detalhe_autor', args=[apelido])
+        for apelido in Autor.objects.filter(ativo=True).order_by('pk').values_list('apelido', flat=True)
+    ]
+    partes = [CABECALHO, f'<urlset {XMLNS}>\n']
+    partes += [_entrada('url', base + endereco) for endereco in enderecos]
+    partes.append('</urlset>\n')
+    return ''.join(partes)
+
+
+def editoriais_do_tema(tema, pagina):
+    """(id, data de atualização) dos editoriais publicados do tema na página do sitemap"""
+    inicio = (pagina - 1) * tamanho()
+    return Editorial.objects.publicados().filter(temas=tema).order_by('pk').values_list(
+        'pk', 'data_atualizacao'
+    )[inicio:inicio + tamanho()]
+
+
+def pagina_existe(tema, pagina):
+    # A primeira página existe mesmo vazia (urlset sem URLs é válido)
+    return pagina == 1 or editoriais_do_tema(tema, pagina).exists()
+
+
+def gerar_tema(base, tema, pagina):
+    """Gerador do XML do sitemap de um tema, em blocos de ``TAMANHO_BLOCO`` URLs"""
+    yield CABECALHO + f'<urlset {XMLNS}>\n'
+    bloco = []
+    for pk, alterado in editoriais_do_tema(tema, pagina).iterator(chunk_size=TAMANHO_BLOCO):
+        bloco.append(_entrada('url', base + reverse('portal:detalhe', args=[pk]), alterado))
+        if len(bloco) >= TAMANHO_BLOCO:
+            yield ''.join(bloco)
+            bloco = []
+    yield ''.join(bloco) + '</urlset>\n'
@@ -0,0 +1,44 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+
+def _srcset(variantes):
+    return ', '.join(f'{default_storage.url(caminho)} {largura}w' for largura, caminho in variantes)
+
+
+def _atributos(atributos):
+    return format_html_join('', ' {}="{}"', ((nome, valor) for nome, valor in atributos.items() if valor))
+
+
+@register.simple_tag
+def imagem(objeto, campo, alt='', sizes='100vw', carregamento='lazy', **atributos):
+    """
+    ``<picture>`` com as variantes WebP/JPEG da imagem, ``width``/``height`` e
+    ``loading``; usa a imagem original enquanto as variantes não existem.
+
+    Uso: ``{% imagem editorial 'imagem1' alt=editorial.titulo sizes='(min-width: 768px) 33vw, 100vw' class='card-img-top' %}``
+    """
+    arquivo = getattr(objeto, campo, None)
+    if not arquivo:
+        return ''
+
+    info = (getattr(objeto, 'variantes_imagens', None) or {}).get(campo)
+    if not info or info.get('nome') != arquivo.name:
+        return format_html(
+            '<img src="{}" alt="{}" loading="{}" decoding="async"{}>',
+            arquivo.url, alt, carregamento, _atributos(atributos)
+        )
+
+    variantes = info['variantes']
+    alternativo = next(formato for formato in variantes if formato != 'webp')
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" loading="{}" decoding="async"{}>'
+        '</picture>',
+        _srcset(variantes['webp']), sizes,
+        default_storage.url(variantes[alternativo][-1][1]), _srcset(variantes[alternativo]), sizes,
+        info['largura'], info['altura'], alt, carregamento, _atributos(atributos),
+    )
@@ -1,3 +1,1573 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import smtplib
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import SyncToAsync, iscoroutinefunction
+from django.conf import settings
+from django.core import mail
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.asgi import ASGIHandler
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import AsyncClient, LiveServerTestCase, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from . import (
+    admin_listas, agendamento, api, cache_paginas, carga, estaticos, exportacao, extracao, inscricoes, massa, metricas,
+    newsletter, paginacao, relacionados, replicas, visualizacoes,
+)
+from . import views
+from .contexto import contexto
+from .models import (
+    Autor, ConfiguracaoSite, DocumentoBusca, Editorial, EditorialRelacionado, EnvioNewsletter, Newsletter,
+    PaginaPendente, RelacionadoPendente, Tema,
+)
+from .orcamento import OrcamentoConsultasExcedido, OrcamentoConsultasMixin
+
+
+def criar_editorial(titulo='Editorial', texto='Texto do editorial.', temas=(), **campos):
+    """Cria um editorial publicado para os testes"""
+    dados = {
+        'status': 'publicado',
+        'ativo': True,
+        'data_publicacao': timezone.now() - timedelta(hours=1),
+    }
+    dados.update(campos)
+    editorial = Editorial.objects.create(titulo=titulo, texto=texto, **dados)
+    if temas:
+        editorial.temas.set(temas)
+    return editorial
+
+
+class BuscaTests(TestCase):
+    def setUp(self):
+        self.economia = Tema.objects.create(nome='Economia', slug='economia')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.inflacao = criar_editorial(
+                'Inflação em queda',
+                'O índice de preços recuou pelo terceiro mês seguido.',
+                temas=[self.economia],
+            )
+            self.futebol = criar_editorial(
+                'Final do campeonato',
+                'A seleção venceu a final. Economistas comentaram a inflação dos ingressos.',
+            )
+
+    def test_documento_atualizado_ao_salvar(self):
+        documento = DocumentoBusca.objects.get(editorial=self.inflacao)
+        self.assertEqual(documento.temas, 'Economia')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.inflacao.titulo = 'Juros sobem'
+            self.inflacao.save()
+        documento.refresh_from_db()
+        self.assertEqual(documento.titulo, 'Juros sobem')
+
+    def test_ordena_por_relevancia_e_destaca_trecho(self):
+        resultados = list(Editorial.buscar('inflacao'))
+        self.assertEqual([e.pk for e in resultados], [self.inflacao.pk, self.futebol.pk])
+        self.assertIn('<mark>', resultados[1].trecho)
+
+    def test_busca_por_nome_do_tema(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.economia.nome = 'Finanças'
+            self.economia.save()
+        self.assertEqual([e.pk for e in Editorial.buscar('finanças')], [self.inflacao.pk])
+
+    def test_ignora_nao_publicados(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.futebol.desativar()
+        self.assertEqual(Editorial.buscar('inflação').count(), 1)
+
+    def test_view_pagina_resultados(self):
+        resposta = self.client.get('/buscar/', {'q': 'inflação'})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.context['page_obj'].paginator.count, 2)
+
+    def test_comando_reindexa(self):
+        DocumentoBusca.objects.all().delete()
+        call_command('reindexar_busca', '--lote', '1', stdout=StringIO())
+        self.assertEqual(DocumentoBusca.objects.count(), 2)
+
+
+@override_settings(VISUALIZACOES_INTERVALO_FLUSH=0)
+class VisualizacoesTests(TestCase):
+    def setUp(self):
+        caches['paginas'].clear()
+        contexto.invalidar()
+        self.editorial = criar_editorial(visualizacoes=5)
+        self.contador = visualizacoes.ContadorVisualizacoes()
+
+    def test_detalhe_nao_grava_visualizacao(self):
+        with mock.patch.object(visualizacoes, 'contador', self.contador):
+            resposta = self.client.get(f'/editorial/{self.editorial.pk}/')
+        self.assertEqual(resposta.status_code, 200)
+        self.editorial.refresh_from_db()
+        self.assertEqual(self.editorial.visualizacoes, 5)
+        self.assertEqual(self.contador.pendentes(self.editorial.pk), 1)
+
+    def test_descarregar_soma_em_lote(self):
+        outro = criar_editorial('Outro')
+        for _ in range(3):
+            self.contador.registrar(self.editorial.pk)
+        self.contador.registrar(outro.pk)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.contador.descarregar(), 4)
+        self.editorial.refresh_from_db()
+        outro.refresh_from_db()
+        self.assertEqual(self.editorial.visualizacoes, 8)
+        self.assertEqual(outro.visualizacoes, 1)
+        self.assertEqual(self.contador.descarregar(), 0)
+
+    def test_falha_mantem_pendentes(self):
+        self.contador.registrar(self.editorial.pk)
+        with mock.patch('portal.models.Editorial.objects.filter', side_effect=RuntimeError):
+            with self.assertLogs('portal.visualizacoes', 'ERROR'):
+                self.assertEqual(self.contador.descarregar(), 0)
+        self.assertEqual(self.contador.pendentes(self.editorial.pk), 1)
+
+
+@override_settings(VISUALIZACOES_INTERVALO_FLUSH=0)
+class CachePaginasTests(TestCase):
+    def setUp(self):
+        caches['paginas'].clear()
+        contexto.invalidar()
+        self.contador = visualizacoes.ContadorVisualizacoes()
+        patcher = mock.patch.object(visualizacoes, 'contador', self.contador)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.config = ConfiguracaoSite.get_config()
+        self.tema = Tema.objects.create(nome='Cultura', slug='cultura')
+        self.autor = Autor.objects.create(nome_completo='Ana Souza', apelido='ana', resumo='Jornalista')
+        self.editorial = criar_editorial('Festival de cinema', temas=[self.tema], autor=self.autor)
+
+    def get(self, url):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.get(url)
+
+    def assertServidaDoCache(self, url):
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+    def test_paginas_servidas_do_cache(self):
+        for url in ['/', '/tema/cultura/', '/autor/ana/', f'/editorial/{self.editorial.pk}/']:
+            with self.subTest(url=url):
+                self.assertEqual(self.get(url).status_code, 200)
+                self.assertServidaDoCache(url)
+
+    def test_chave_inclui_query_string(self):
+        self.get('/tema/cultura/')
+        misses = cache_paginas.estatisticas()['editoriais_por_tema']['misses']
+        self.get('/tema/cultura/?page=2')
+        self.assertEqual(cache_paginas.estatisticas()['editoriais_por_tema']['misses'], misses + 1)
+        self.assertServidaDoCache('/tema/cultura/?page=2')
+
+    def test_publicacao_expira_paginas_afetadas(self):
+        outro_tema = Tema.objects.create(nome='Esportes', slug='esportes')
+        for url in ['/', '/tema/cultura/', '/tema/esportes/', '/autor/ana/']:
+            self.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            novo = Editorial.objects.create(titulo='Mostra de teatro', texto='Texto.', autor=self.autor)
+            novo.temas.add(self.tema)
+            novo.publicar_agora()
+
+        self.assertContains(self.get('/'), 'Mostra de teatro')
+        self.assertContains(self.get('/tema/cultura/'), 'Mostra de teatro')
+        self.assertContains(self.get('/autor/ana/'), 'Mostra de teatro')
+        self.assertServidaDoCache('/tema/esportes/')
+        self.assertEqual(outro_tema.editoriais.count(), 0)
+
+    def test_configuracao_expira_todas_as_paginas(self):
+        self.get('/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.config.nome_site = 'Novo Nome'
+            self.config.save()
+        self.assertContains(self.get('/'), 'Novo Nome')
+
+    def test_usuario_autenticado_nao_usa_cache(self):
+        from django.contrib.auth.models import User
+        self.get('/')
+        self.client.force_login(User.objects.create_user('editor'))
+        ignorados = cache_paginas.estatisticas()['home']['ignorados']
+        self.assertEqual(self.get('/').status_code, 200)
+        self.assertEqual(cache_paginas.estatisticas()['home']['ignorados'], ignorados + 1)
+
+    def test_estatisticas_somente_para_a_equipe(self):
+        from django.contrib.auth.models import User
+        self.assertEqual(self.client.get('/api/cache/estatisticas/').status_code, 302)
+        self.client.force_login(User.objects.create_user('editor', is_staff=True))
+        response = self.client.get('/api/cache/estatisticas/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('rotas', response.json())
+
+    def test_detalhe_em_cache_conta_visualizacao(self):
+        url = f'/editorial/{self.editorial.pk}/'
+        self.get(url)
+        self.assertServidaDoCache(url)
+        self.assertEqual(self.contador.pendentes(self.editorial.pk), 2)
+
+
+class GetCondicionalTests(TestCase):
+    def setUp(self):
+        caches['paginas'].clear()
+        contexto.invalidar()
+        self.contador = visualizacoes.ContadorVisualizacoes()
+        patcher = mock.patch.object(visualizacoes, 'contador', self.contador)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        ConfiguracaoSite.get_config()
+        self.tema = Tema.objects.create(nome='Cultura', slug='cultura')
+        self.autor = Autor.objects.create(nome_completo='Ana Souza', apelido='ana', resumo='Jornalista')
+        self.editorial = criar_editorial('Festival de cinema', temas=[self.tema], autor=self.autor)
+
+    def get(self, url, **cabecalhos):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.get(url, headers=cabecalhos)
+
+    def test_paginas_respondem_304_sem_consultas(self):
+        urls = ['/', '/tema/cultura/', '/autor/ana/', f'/editorial/{self.editorial.pk}/', '/api/temas/']
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('Last-Modified', response)
+                with self.assertNumQueries(0):
+                    condicional = self.client.get(url, headers={'If-None-Match': response['ETag']})
+                self.assertEqual(condicional.status_code, 304)
+                self.assertEqual(condicional.content, b'')
+                condicional = self.client.get(url, headers={'If-Modified-Since': response['Last-Modified']})
+                self.assertEqual(condicional.status_code, 304)
+
+    def test_publicacao_troca_validadores(self):
+        etag = self.get('/tema/cultura/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            novo = Editorial.objects.create(titulo='Mostra de teatro', texto='Texto.')
+            novo.temas.add(self.tema)
+            novo.publicar_agora()
+        response = self.get('/tema/cultura/', **{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Mostra de teatro')
+
+    def test_tema_novo_troca_validador_da_api(self):
+        etag = self.get('/api/temas/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Tema.objects.create(nome='Esportes', slug='esportes')
+        response = self.get('/api/temas/', **{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Esportes')
+
+    def test_304_do_detalhe_conta_visualizacao(self):
+        url = f'/editorial/{self.editorial.pk}/'
+        etag = self.get(url)['ETag']
+        self.assertEqual(self.get(url, **{'If-None-Match': etag}).status_code, 304)
+        self.assertEqual(self.contador.pendentes(self.editorial.pk), 2)
+
+    def test_paginas_validadas_nao_exibem_visualizacoes(self):
+        # Gravar as visualizações não invalida nada: a página não pode mudar com elas
+        urls = ['/', '/tema/cultura/', f'/editorial/{self.editorial.pk}/', f'/api/v1/editoriais/{self.editorial.pk}/']
+        antes = {url: self.get(url) for url in urls}
+        Editorial.objects.filter(pk=self.editorial.pk).update(visualizacoes=98765)
+        for url in urls:
+            # Página renderizada de novo (expirou pelo CACHE_PAGINAS_TIMEOUT), com as mesmas versões
+            with self.subTest(url=url), override_settings(CACHE_PAGINAS_ATIVO=False):
+                depois = self.get(url)
+                self.assertEqual(depois['ETag'], antes[url]['ETag'])
+                self.assertNotContains(depois, '98765')
+
+
+class ContextoSiteTests(TestCase):
+    def setUp(self):
+        caches['paginas'].clear()
+        contexto.invalidar()
+        Tema.objects.create(nome='Ciência', slug='ciencia')
+
+    def test_contexto_em_cache_sem_consultas(self):
+        self.assertEqual(ConfiguracaoSite.get_config().pk, 1)
+        with self.assertNumQueries(0):
+            ConfiguracaoSite.get_config()
+            self.assertEqual([t.nome for t in contexto.temas()], ['Ciência'])
+            self.client.get('/api/temas/')
+
+    def test_salvar_tema_recarrega_contexto(self):
+        contexto.temas()
+        with self.captureOnCommitCallbacks(execute=True):
+            Tema.objects.create(nome='Arte', slug='arte')
+        self.assertEqual([t.nome for t in contexto.temas()], ['Arte', 'Ciência'])
+
+    def test_versao_alterada_em_outro_processo(self):
+        contexto.temas()
+        Tema.objects.filter(slug='ciencia').update(nome='Ciências')
+        with override_settings(CONTEXTO_SITE_VERIFICACAO=0):
+            cache_paginas.invalidar('navegacao')
+            self.assertEqual([t.nome for t in contexto.temas()], ['Ciências'])
+
+    def test_ttl_recarrega_sem_mudanca_de_versao(self):
+        contexto.temas()
+        # A invalidação não chegou a este processo (cache locmem de outro worker)
+        Tema.objects.filter(slug='ciencia').update(nome='Ciências')
+        with override_settings(CONTEXTO_SITE_VERIFICACAO=0):
+            self.assertEqual([t.nome for t in contexto.temas()], ['Ciência'])
+            with override_settings(CONTEXTO_SITE_TTL=0):
+                self.assertEqual([t.nome for t in contexto.temas()], ['Ciências'])
+
+
+@override_settings(VISUALIZACOES_INTERVALO_FLUSH=0, CACHE_PAGINAS_ATIVO=False)
+class OrcamentoConsultasTests(OrcamentoConsultasMixin, TestCase):
+    """Cada view pública executa um número fixo de consultas, sem N+1"""
+
+    @classmethod
+    def setUpTestData(cls):
+        temas = [Tema.objects.create(nome=f'Tema {i}', slug=f'tema-{i}') for i in range(4)]
+        cls.autor = Autor.objects.create(nome_completo='Rui Lima', apelido='rui', resumo='Colunista')
+        Autor.objects.create(nome_completo='Eva Reis', apelido='eva', resumo='Repórter')
+        cls.editoriais = []
+        with cls.captureOnCommitCallbacks(execute=True):
+            for i in range(14):
+                cls.editoriais.append(criar_editorial(
+                    f'Notícia sobre economia {i}', 'Texto sobre economia.', temas=temas[:1 + i % 4], autor=cls.autor,
+                ))
+
+    def setUp(self):
+        contexto.invalidar()
+        contexto.obter()
+        patcher = mock.patch.object(visualizacoes, 'contador', visualizacoes.ContadorVisualizacoes())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_views_publicas(self):
+        urls = [
+            '/',
+            '/tema/tema-0/',
+            '/tema/tema-0/?page=2',
+            f'/editorial/{self.editoriais[3].pk}/',
+            '/buscar/?q=economia',
+            '/autores/',
+            '/autor/rui/',
+            '/api/temas/',
+            '/sitemap.xml',
+            '/sitemap-paginas.xml',
+            '/sitemap-tema-tema-0-1.xml',
+            '/feed/rss/',
+            '/tema/tema-0/feed/atom/',
+            '/autor/rui/feed/rss/',
+            '/api/v1/editoriais/?limite=5',
+            '/api/v1/editoriais/?tema=tema-0&fields=id,titulo,texto',
+            f'/api/v1/editoriais/{self.editoriais[3].pk}/',
+            '/api/v1/temas/',
+            '/api/v1/autores/',
+            '/api/v1/autores/rui/',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.assertDentroDoOrcamento(url).status_code, 200)
+
+    def test_orcamento_excedido(self):
+        with mock.patch.object(views.home, 'orcamento_consultas', 1):
+            with self.assertRaises(OrcamentoConsultasExcedido):
+                self.assertDentroDoOrcamento('/')
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        caches['paginas'].clear()
+        contexto.invalidar()
+        self.economia = Tema.objects.create(nome='Economia', slug='economia')
+        self.politica = Tema.objects.create(nome='Política', slug='politica')
+        self.rui = Autor.objects.create(nome_completo='Rui Lima', apelido='rui')
+        self.eva = Autor.objects.create(nome_completo='Eva Reis', apelido='eva')
+        agora = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.editoriais = [
+                criar_editorial(
+                    f'Editorial {i}', f'Texto {i}', temas=[self.economia if i % 2 else self.politica],
+                    autor=self.rui if i < 3 else self.eva, data_publicacao=agora - timedelta(days=i + 1),
+                )
+                for i in range(5)
+            ]
+            criar_editorial('Rascunho', status='rascunho')
+
+    def test_lista_paginada_por_cursor_sem_texto(self):
+        with CaptureQueriesContext(connection) as consultas:
+            dados = self.client.get('/api/v1/editoriais/?limite=2').json()
+        self.assertFalse(any('"texto"' in consulta['sql'] for consulta in consultas.captured_queries))
+        self.assertEqual([item['id'] for item in dados['resultados']], [e.pk for e in self.editoriais[:2]])
+        primeiro = dados['resultados'][0]
+        self.assertEqual(set(primeiro), set(api.CAMPOS_LISTA_EDITORIAL))
+        self.assertEqual(primeiro['autor'], {'apelido': 'rui', 'nome': 'Rui Lima'})
+        self.assertEqual(primeiro['temas'], [{'slug': 'politica', 'nome': 'Política'}])
+        self.assertIsNone(dados['anterior'])
+
+        vistos = [item['id'] for item in dados['resultados']]
+        while dados['proxima']:
+            dados = self.client.get(dados['proxima']).json()
+            vistos += [item['id'] for item in dados['resultados']]
+        self.assertEqual(vistos, [e.pk for e in self.editoriais])
+        self.assertIn('limite=2', dados['anterior'])
+
+    def test_campos_e_filtros(self):
+        dados = self.client.get('/api/v1/editoriais/?fields=titulo,texto&tema=economia&autor=rui').json()
+        self.assertEqual(dados['resultados'], [{'titulo': 'Editorial 1', 'texto': 'Texto 1'}])
+
+        dia = timezone.localdate(self.editoriais[2].data_publicacao)
+        dados = self.client.get(f'/api/v1/editoriais/?fields=id&desde={dia}&ate={dia}').json()
+        self.assertEqual(dados['resultados'], [{'id': self.editoriais[2].pk}])
+
+        for url in ('/api/v1/editoriais/?fields=id,senha', '/api/v1/editoriais/?limite=500',
+                    '/api/v1/editoriais/?limite=²', '/api/v1/autores/?limite=0',
+                    '/api/v1/editoriais/?desde=ontem'):
+            with self.subTest(url=url):
+                resposta = self.client.get(url)
+                self.assertEqual(resposta.status_code, 400)
+                self.assertIn('error', resposta.json())
+
+    def test_detalhes_e_etag(self):
+        editorial = self.editoriais[0]
+        resposta = self.client.get(f'/api/v1/editoriais/{editorial.pk}/')
+        self.assertEqual(resposta['Content-Type'], 'application/json')
+        self.assertEqual(resposta.json()['texto'], 'Texto 0')
+        revalidacao = self.client.get(f'/api/v1/editoriais/{editorial.pk}/', HTTP_IF_NONE_MATCH=resposta['ETag'])
+        self.assertEqual(revalidacao.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            editorial.titulo = 'Novo título'
+            editorial.save()
+        resposta = self.client.get(f'/api/v1/editoriais/{editorial.pk}/', HTTP_IF_NONE_MATCH=resposta['ETag'])
+        self.assertEqual(resposta.json()['titulo'], 'Novo título')
+
+        rascunho = Editorial.objects.get(titulo='Rascunho')
+        self.assertEqual(self.client.get(f'/api/v1/editoriais/{rascunho.pk}/').status_code, 404)
+
+        autor = self.client.get('/api/v1/autores/rui/?fields=nome,url,foto').json()
+        self.assertEqual(autor, {'nome': 'Rui Lima', 'url': '/autor/rui/', 'foto': None})
+        autores = self.client.get('/api/v1/autores/').json()['resultados']
+        self.assertEqual([item['apelido'] for item in autores], ['rui', 'eva'])
+        temas = self.client.get('/api/v1/temas/?fields=slug').json()['resultados']
+        self.assertEqual(temas, [{'slug': 'economia'}, {'slug': 'politica'}])
+
+
+@override_settings(SITEMAP_TAMANHO=2, FEEDS_ITENS=3)
+class SitemapsFeedsTests(TestCase):
+    def setUp(self):
+        caches['paginas'].clear()
+        self.economia = Tema.objects.create(nome='Economia', slug='economia', descricao='Juros e inflação')
+        self.vazio = Tema.objects.create(nome='Vazio', slug='vazio')
+        self.autor = Autor.objects.create(nome_completo='Rui Lima', apelido='rui')
+        contexto.invalidar()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.editoriais = [
+                criar_editorial(f'Economia {i}', temas=[self.economia], autor=self.autor) for i in range(5)
+            ]
+            criar_editorial('Rascunho', status='rascunho', temas=[self.economia])
+
+    def conteudo(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_indice_divide_os_temas_em_arquivos(self):
+        response = self.client.get('/sitemap.xml')
+        self.assertEqual(response['Content-Type'], 'application/xml')
+        xml = response.content.decode()
+        self.assertIn('<loc>http://testserver/sitemap-paginas.xml</loc>', xml)
+        for pagina in (1, 2, 3):
+            self.assertIn(f'<loc>http://testserver/sitemap-tema-economia-{pagina}.xml</loc>', xml)
+        self.assertNotIn('sitemap-tema-economia-4', xml)
+        self.assertNotIn('vazio', xml)
+        self.assertIn('<loc>http://testserver/autor/rui/</loc>', self.client.get('/sitemap-paginas.xml').content.decode())
+
+    def test_sitemap_do_tema_em_fluxo_e_condicional(self):
+        response = self.client.get('/sitemap-tema-economia-1.xml')
+        self.assertTrue(response.streaming)
+        xml = self.conteudo(response)
+        self.assertEqual(xml.count('<url>'), 2)
+        self.assertIn(f'<loc>http://testserver/editorial/{self.editoriais[0].pk}/</loc>', xml)
+        self.assertIn('<lastmod>', xml)
+        self.assertEqual(self.conteudo(self.client.get('/sitemap-tema-economia-3.xml')).count('<url>'), 1)
+        self.assertEqual(self.client.get('/sitemap-tema-economia-4.xml').status_code, 404)
+        self.assertEqual(self.client.get('/sitemap-tema-inexistente-1.xml').status_code, 404)
+
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.client.get('/sitemap-tema-economia-1.xml', headers={'If-None-Match': etag}).status_code, 304
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            criar_editorial('Nova', temas=[self.economia])
+        response = self.client.get('/sitemap-tema-economia-1.xml', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.conteudo(response)
+
+    async def test_sitemap_em_fluxo_assincrono_no_asgi(self):
+        response = await AsyncClient().get('/sitemap-tema-economia-1.xml')
+        self.assertTrue(response.is_async)
+        xml = ''.join([parte.decode() async for parte in response.streaming_content])
+        self.assertEqual(xml.count('<url>'), 2)
+
+    def test_feeds(self):
+        response = self.client.get('/feed/rss/')
+        self.assertEqual(response['Content-Type'], 'application/rss+xml; charset=utf-8')
+        xml = response.content.decode()
+        self.assertEqual(xml.count('<item>'), 3)
+        self.assertIn('Economia 4', xml)
+        self.assertNotIn('Rascunho', xml)
+        self.assertIn('<category>Economia</category>', xml)
+
+        xml = self.client.get('/tema/economia/feed/atom/').content.decode()
+        self.assertIn('<subtitle>Juros e inflação</subtitle>', xml)
+        self.assertEqual(xml.count('<entry>'), 3)
+        self.assertIn('Rui Lima', self.client.get('/autor/rui/feed/rss/').content.decode())
+        self.assertEqual(self.client.get('/feed/json/').status_code, 404)
+        self.assertEqual(self.client.get('/tema/inexistente/feed/rss/').status_code, 404)
+
+    def test_feed_em_cache_expira_na_publicacao(self):
+        url = '/tema/economia/feed/rss/'
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertIn('Economia 4', self.client.get(url).content.decode())
+        with self.captureOnCommitCallbacks(execute=True):
+            criar_editorial('Publicada agora', temas=[self.economia])
+        self.assertIn('Publicada agora', self.client.get(url).content.decode())
+
+    @override_settings(ALLOWED_HOSTS=['portal.exemplo', 'www.portal.exemplo'])
+    def test_cache_separa_dominio_e_esquema(self):
+        for url in ('/sitemap.xml', '/feed/rss/'):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url, HTTP_HOST='portal.exemplo'), 'http://portal.exemplo/')
+                outro = self.client.get(url, HTTP_HOST='www.portal.exemplo', secure=True)
+                self.assertContains(outro, 'https://www.portal.exemplo/')
+                self.assertNotContains(outro, 'http://portal.exemplo/')
+
+
+class SecoesTests(TestCase):
+    TEXTO = 'Primeiro parágrafo.\n\nSegundo <b>parágrafo</b>.\n\nTerceiro.\n\nQuarto.'
+
+    def test_secoes_geradas_ao_salvar(self):
+        editorial = criar_editorial(texto=self.TEXTO, layout='layout2')
+        editorial.refresh_from_db()
+        self.assertEqual(editorial.secoes_html['layout'], 'layout2')
+        self.assertEqual(editorial.secoes[0], '<p>Primeiro parágrafo.</p>\n\n<p>Segundo <b>parágrafo</b>.</p>')
+
+        editorial.layout = 'layout1'
+        editorial.save(update_fields=['layout'])
+        editorial.refresh_from_db()
+        self.assertEqual(editorial.secoes_html['layout'], 'layout1')
+        self.assertIn('&lt;b&gt;', editorial.secoes[0])
+
+    def test_comando_preenche_existentes(self):
+        editorial = criar_editorial(texto=self.TEXTO, layout='layout3')
+        Editorial.objects.update(secoes_html=None)
+        call_command('gerar_secoes', '--lote', '1', stdout=StringIO())
+        editorial.refresh_from_db()
+        self.assertEqual(len(editorial.secoes_html['secoes']), 5)
+        self.assertEqual(editorial.secoes_html['secoes'], editorial.gerar_secoes_html()['secoes'])
+
+
+class AgendamentoTests(TestCase):
+    def setUp(self):
+        caches['paginas'].clear()
+
+    def test_publicacao_futura_vira_agendamento(self):
+        data = timezone.now() + timedelta(hours=1)
+        editorial = criar_editorial('Futuro', data_publicacao=data)
+        self.assertEqual((editorial.status, editorial.data_agendada, editorial.data_publicacao), ('agendado', data, None))
+        self.assertFalse(Editorial.objects.publicados().exists())
+        # Ao chegar a data, a publicação passa pelo agendamento, que invalida as páginas
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(agendamento.publicar_vencidos(agora=data + timedelta(minutes=1)), 1)
+        editorial.refresh_from_db()
+        self.assertEqual((editorial.status, editorial.data_publicacao), ('publicado', data))
+
+    def test_publica_somente_vencidos(self):
+        agora = timezone.now()
+        vencido = criar_editorial('Vencido', status='agendado', agendado=True,
+                                  data_publicacao=None, data_agendada=agora - timedelta(minutes=5))
+        futuro = criar_editorial('Futuro', status='agendado', agendado=True,
+                                 data_publicacao=None, data_agendada=agora + timedelta(hours=1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(agendamento.publicar_lote(), [vencido.pk])
+        self.assertEqual(agendamento.publicar_lote(), [])
+
+        vencido.refresh_from_db()
+        futuro.refresh_from_db()
+        self.assertEqual(vencido.status, 'publicado')
+        self.assertFalse(vencido.agendado)
+        self.assertEqual(vencido.data_publicacao, vencido.data_agendada)
+        self.assertEqual(futuro.status, 'agendado')
+
+    def test_lote_disputado_retorna_so_o_que_publicou(self):
+        agora = timezone.now()
+        nosso, alheio = [
+            criar_editorial(titulo, status='agendado', data_publicacao=None,
+                            data_agendada=agora - timedelta(minutes=5))
+            for titulo in ('Nosso', 'Alheio')
+        ]
+        # Sem SKIP LOCKED, os dois processos leem o mesmo lote; o outro publica "Alheio" antes do UPDATE
+        selecionados = Editorial.objects.filter(pk__in=[nosso.pk, alheio.pk])
+        Editorial.objects.filter(pk=alheio.pk).update(status='publicado', data_publicacao=agora)
+        with mock.patch.object(agendamento, 'vencidos', return_value=selecionados), \
+                mock.patch.object(relacionados, 'enfileirar') as enfileirar:
+            self.assertEqual(agendamento.publicar_lote(agora=agora), [nosso.pk])
+        self.assertEqual(enfileirar.call_args.args[0], [nosso.pk])
+
+    def test_lote_curto_nao_encerra_a_publicacao(self):
+        # O primeiro lote veio curto porque outro processo publicou parte dele
+        with mock.patch.object(agendamento, 'publicar_lote', side_effect=[[1], [2, 3], []]) as publicar_lote:
+            self.assertEqual(agendamento.publicar_vencidos(tamanho=2), 3)
+        self.assertEqual(publicar_lote.call_count, 3)
+
+    def test_publicacao_expira_paginas(self):
+        versao = cache_paginas.versoes(['home'])
+        criar_editorial(status='agendado', data_publicacao=None,
+                        data_agendada=timezone.now() - timedelta(minutes=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('publicar_agendados', '--lote', '1', stdout=StringIO())
+        self.assertNotEqual(cache_paginas.versoes(['home']), versao)
+        self.assertFalse(agendamento.vencidos().exists())
+
+
+class AlteracoesEmLoteTests(TestCase):
+    def setUp(self):
+        caches['paginas'].clear()
+        self.rascunhos = [criar_editorial(f'Rascunho {i}', status='rascunho', data_publicacao=None) for i in range(3)]
+        self.publicado = criar_editorial('Publicado')
+        # Só a fila das alterações em lote
+        RelacionadoPendente.objects.all().delete()
+
+    def test_publicar_agora_em_um_update(self):
+        with mock.patch.object(relacionados, 'atualizar_varios') as atualizar_varios, \
+                mock.patch.object(cache_paginas, 'invalidar') as invalidar:
+            with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(Editorial.objects.all().publicar_agora(), 3)
+
+        updates = [consulta['sql'] for consulta in consultas if consulta['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('"texto"', updates[0])
+        self.assertEqual(invalidar.call_count, 1)
+        # Os relacionados ficam para a fila, fora da requisição
+        atualizar_varios.assert_not_called()
+        self.assertEqual(
+            sorted(RelacionadoPendente.objects.values_list('editorial_id', flat=True)),
+            sorted(e.pk for e in self.rascunhos),
+        )
+        self.assertEqual(Editorial.objects.publicados().count(), 4)
+
+    def test_fila_de_relacionados_com_uma_invalidacao_por_lote(self):
+        # Candidatos compartilham um tema ou o autor
+        Editorial.objects.update(autor=Autor.objects.create(nome_completo='Rui Lima', apelido='rui'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Editorial.objects.all().publicar_agora()
+        with mock.patch.object(cache_paginas, 'invalidar') as invalidar:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(relacionados.processar_pendentes(lote=10), 3)
+        self.assertEqual(invalidar.call_count, 1)
+        self.assertFalse(RelacionadoPendente.objects.exists())
+        self.assertEqual(
+            set(EditorialRelacionado.objects.filter(editorial=self.publicado).values_list('relacionado_id', flat=True)),
+            {e.pk for e in self.rascunhos},
+        )
+
+    def test_acoes_do_admin_informam_contagens_exatas(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha'))
+        todos = [editorial.pk for editorial in self.rascunhos] + [self.publicado.pk]
+
+        def acao(nome):
+            response = self.client.post(
+                '/admin/portal/editorial/', {'action': nome, '_selected_action': todos}, follow=True
+            )
+            return [str(mensagem) for mensagem in response.context['messages']]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(acao('publicar_agora'), ['3 editorial(is) publicado(s).'])
+            self.assertEqual(acao('publicar_agora'), ['0 editorial(is) publicado(s).'])
+            Editorial.objects.filter(pk=self.publicado.pk).desativar()
+            self.assertEqual(acao('reativar'), ['1 editorial(is) reativado(s).'])
+            self.assertEqual(acao('desativar'), ['4 editorial(is) desativado(s).'])
+        self.assertFalse(Editorial.objects.filter(ativo=True).exists())
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    NEWSLETTER_TAXA=0,
+    NEWSLETTER_INTERVALO_TENTATIVAS=0,
+)
+class NewsletterTests(TestCase):
+    def setUp(self):
+        self.economia = Tema.objects.create(nome='Economia', slug='economia')
+        for indice in range(5):
+            inscricao = Newsletter.objects.create(email=f'leitor{indice}@exemplo.com')
+            inscricao.temas.set([self.economia])
+        Newsletter.objects.create(email='inativo@exemplo.com', ativo=False).temas.set([self.economia])
+
+    def test_envio_editorial_em_lotes(self):
+        editorial = criar_editorial('Juros', temas=[self.economia])
+        envio = newsletter.criar_envio_editorial(editorial)
+        self.assertEqual(envio.total, 5)
+
+        envio = newsletter.processar_envio(envio.pk, workers=2, lote=2)
+        self.assertEqual((envio.status, envio.enviados, envio.falhas), ('concluido', 5, 0))
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [f'leitor{i}@exemplo.com' for i in range(5)])
+        self.assertIsNone(newsletter.processar_envio(envio.pk))
+
+    def test_repete_falhas_temporarias(self):
+        enviar = EmailBackend.send_messages
+        falhas = {'leitor1@exemplo.com': 1, 'leitor2@exemplo.com': 10}
+
+        def send_messages(backend, mensagens):
+            email = mensagens[0].to[0]
+            if email == 'leitor3@exemplo.com':
+                raise smtplib.SMTPRecipientsRefused({email: (550, b'Mailbox unavailable')})
+            if falhas.get(email):
+                falhas[email] -= 1
+                raise smtplib.SMTPServerDisconnected('Conexão encerrada')
+            return enviar(backend, mensagens)
+
+        envio = newsletter.criar_envio('Assunto', 'Mensagem', Newsletter.objects.filter(ativo=True))
+        with mock.patch.object(EmailBackend, 'send_messages', send_messages):
+            envio = newsletter.processar_envio(envio.pk, workers=1)
+
+        self.assertEqual((envio.enviados, envio.falhas), (3, 2))
+        situacao = dict(envio.destinatarios.values_list('email', 'tentativas'))
+        self.assertEqual(situacao['leitor1@exemplo.com'], 2)
+        self.assertEqual(situacao['leitor2@exemplo.com'], 3)
+        self.assertEqual(situacao['leitor3@exemplo.com'], 1)
+
+    def test_retoma_envio_interrompido(self):
+        envio = newsletter.criar_envio('Assunto', 'Mensagem', Newsletter.objects.filter(ativo=True))
+        envio.destinatarios.filter(email__in=['leitor0@exemplo.com', 'leitor1@exemplo.com']).update(status='enviado')
+        EnvioNewsletter.objects.filter(pk=envio.pk).update(status='enviando', atualizado_em=timezone.now())
+        self.assertEqual(newsletter.envios_disponiveis(), [])
+
+        # Sem sinal de vida além do timeout, o envio pode ser retomado
+        EnvioNewsletter.objects.filter(pk=envio.pk).update(atualizado_em=timezone.now() - timedelta(hours=1))
+        call_command('enviar_newsletter', stdout=StringIO())
+        envio.refresh_from_db()
+        self.assertEqual((envio.status, envio.enviados), ('concluido', 5))
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_envio_do_admin_fica_para_o_comando(self):
+        from django.contrib.auth.models import User
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha'))
+        selecionados = list(Newsletter.objects.filter(ativo=True).values_list('pk', flat=True))
+        with mock.patch.object(newsletter, 'processar_em_segundo_plano') as em_segundo_plano, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/admin/portal/newsletter/', {
+                'action': 'enviar_notificacao_teste', '_selected_action': selecionados,
+            })
+        # Nenhuma thread no servidor web: o envio espera o enviar_newsletter
+        em_segundo_plano.assert_not_called()
+        envio = EnvioNewsletter.objects.get()
+        self.assertEqual((envio.status, envio.total), ('pendente', 5))
+        self.assertEqual(newsletter.envios_disponiveis(), [envio.pk])
+
+
+class InscricoesTests(TestCase):
+    def setUp(self):
+        self.economia = Tema.objects.create(nome='Economia', slug='economia')
+        self.politica = Tema.objects.create(nome='Política', slug='politica')
+
+    def temas(self, email):
+        return sorted(Newsletter.objects.get(email=email).temas.values_list('pk', flat=True))
+
+    def test_inscrever_cria_reativa_e_nao_duplica(self):
+        # SAVEPOINT, upsert, temas, RELEASE
+        with self.assertNumQueries(4):
+            situacao, pk = inscricoes.inscrever('leitor@exemplo.com', [self.economia.pk, 9999])
+        self.assertEqual(situacao, inscricoes.CRIADA)
+        self.assertEqual(self.temas('leitor@exemplo.com'), [self.economia.pk])
+
+        self.assertEqual(inscricoes.inscrever('leitor@exemplo.com', [self.politica.pk]), (inscricoes.JA_ATIVA, None))
+        self.assertEqual(self.temas('leitor@exemplo.com'), [self.economia.pk])
+
+        self.assertTrue(inscricoes.cancelar('leitor@exemplo.com'))
+        self.assertFalse(inscricoes.cancelar('outro@exemplo.com'))
+        self.assertEqual(
+            inscricoes.inscrever('leitor@exemplo.com', [self.politica.pk]), (inscricoes.REATIVADA, pk)
+        )
+        self.assertEqual(self.temas('leitor@exemplo.com'), [self.politica.pk])
+        self.assertEqual(Newsletter.objects.filter(ativo=True).count(), 1)
+
+    def test_reativar_sem_temas_mantem_os_salvos(self):
+        inscricoes.inscrever('leitor@exemplo.com', [self.economia.pk, self.politica.pk])
+        inscricoes.cancelar('leitor@exemplo.com')
+        self.assertEqual(inscricoes.inscrever('leitor@exemplo.com')[0], inscricoes.REATIVADA)
+        self.assertEqual(self.temas('leitor@exemplo.com'), [self.economia.pk, self.politica.pk])
+
+    def test_cancelar_ignora_maiusculas_do_email_guardado(self):
+        inscricoes.inscrever(inscricoes.normalizar_email('Leitor.Silva@Exemplo.com'))
+        response = self.client.post('/api/cancelar-newsletter/', {'email': 'leitor.silva@exemplo.com'})
+        self.assertTrue(response.json()['success'])
+        self.assertFalse(Newsletter.objects.get(email='Leitor.Silva@exemplo.com').ativo)
+
+    def test_ids_temas_ignora_valores_nao_decimais(self):
+        self.assertEqual(inscricoes.ids_temas(['2', ' 1 ', '²', 'x', '', 1]), [1, 2])
+        response = self.client.post('/api/inscrever-newsletter/', {'email': 'a@exemplo.com', 'temas': ['²']})
+        self.assertEqual(response.status_code, 200)
+
+    def test_api_normaliza_email_e_responde_ja_inscrito(self):
+        response = self.client.post('/api/inscrever-newsletter/', {'email': ' Leitor@EXEMPLO.com ', 'temas': ['x']})
+        self.assertEqual(response.json()['created'], True)
+        self.assertTrue(Newsletter.objects.filter(email='Leitor@exemplo.com').exists())
+
+        response = self.client.post('/api/inscrever-newsletter/', {'email': 'Leitor@exemplo.com'})
+        self.assertTrue(response.json()['already_subscribed'])
+        response = self.client.post('/api/inscrever-newsletter/', {'email': 'sem-arroba'})
+        self.assertEqual(response.json(), {'success': False, 'error': 'Email inválido'})
+
+        with mock.patch.object(inscricoes, 'inscrever', side_effect=RuntimeError('segredo')):
+            with self.assertLogs('portal.views', 'ERROR'):
+                response = self.client.post('/api/inscrever-newsletter/', {'email': 'novo@exemplo.com'})
+        self.assertEqual(response.status_code, 500)
+        self.assertNotIn('segredo', response.content.decode())
+
+    def test_importar_inscritos_em_lotes(self):
+        Newsletter.objects.create(email='cancelou@exemplo.com', ativo=False)
+        arquivo = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8')
+        self.addCleanup(os.unlink, arquivo.name)
+        with arquivo:
+            arquivo.write(
+                'email,temas,ativo\n'
+                'a@exemplo.com,economia;Política,1\n'
+                'b@exemplo.com,,0\n'
+                'invalido,economia,1\n'
+                f'A@EXEMPLO.COM,{self.economia.pk};esportes,1\n'
+                'cancelou@exemplo.com,economia,1\n'
+                'c@exemplo.com,politica,\n'
+            )
+        saida = StringIO()
+        call_command('importar_inscritos', arquivo.name, '--lote', '2', stdout=saida)
+
+        self.assertIn('5 inscrições importadas', saida.getvalue())
+        self.assertIn('4 novas', saida.getvalue())
+        self.assertIn('esportes', saida.getvalue())
+        self.assertEqual(self.temas('A@exemplo.com'), [self.economia.pk])
+        self.assertEqual(self.temas('a@exemplo.com'), [self.economia.pk, self.politica.pk])
+        self.assertFalse(Newsletter.objects.get(email='b@exemplo.com').ativo)
+        self.assertTrue(Newsletter.objects.get(email='c@exemplo.com').ativo)
+        # Sem --atualizar quem cancelou não é reinscrito
+        self.assertFalse(Newsletter.objects.get(email='cancelou@exemplo.com').ativo)
+
+        call_command('importar_inscritos', arquivo.name, '--atualizar', stdout=StringIO())
+        self.assertTrue(Newsletter.objects.get(email='cancelou@exemplo.com').ativo)
+        self.assertEqual(Newsletter.objects.count(), 5)
+
+
+class AdminListasTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha'))
+        self.autores = [Autor.objects.create(nome_completo=f'Autor {i}', apelido=f'autor-{i}') for i in range(3)]
+        self.economia = Tema.objects.create(nome='Economia', slug='economia')
+
+    def consultas(self, url):
+        with CaptureQueriesContext(connection) as contexto_consultas:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(contexto_consultas)
+
+    def criar(self, quantidade, inicio=0):
+        for indice in range(inicio, inicio + quantidade):
+            criar_editorial(f'Editorial {indice}', temas=[self.economia], autor=self.autores[indice % 3])
+            Newsletter.objects.create(email=f'leitor{indice}@exemplo.com').temas.set([self.economia])
+
+    def test_consultas_nao_crescem_com_as_linhas(self):
+        self.criar(2)
+        editoriais = self.consultas('/admin/portal/editorial/')
+        inscritos = self.consultas('/admin/portal/newsletter/')
+        self.criar(10, inicio=2)
+        self.assertEqual(self.consultas('/admin/portal/editorial/'), editoriais)
+        self.assertEqual(self.consultas('/admin/portal/newsletter/'), inscritos)
+
+    def test_filtro_autocomplete_carrega_so_o_selecionado(self):
+        self.criar(6)
+        response = self.client.get(f'/admin/portal/editorial/?autor__id__exact={self.autores[1].pk}')
+        self.assertContains(response, f'<option value="{self.autores[1].pk}" selected>Autor 1</option>', html=True)
+        self.assertNotContains(response, f'<option value="{self.autores[2].pk}"')
+        self.assertEqual(response.context['cl'].result_count, 2)
+        self.assertContains(response, 'js/admin-filtro-autocomplete.js')
+
+        response = self.client.get('/admin/autocomplete/', {
+            'app_label': 'portal', 'model_name': 'editorial', 'field_name': 'autor', 'term': 'Autor 2',
+        })
+        self.assertEqual([item['text'] for item in response.json()['results']], ['Autor 2'])
+
+    def test_paginador_estimado(self):
+        self.criar(3)
+        # Fora do PostgreSQL a contagem é sempre exata
+        self.assertIsNone(admin_listas.contagem_estimada(Newsletter.objects.all()))
+        with mock.patch.object(admin_listas, 'contagem_estimada', return_value=250000):
+            response = self.client.get('/admin/portal/newsletter/')
+        self.assertEqual(response.context['cl'].result_count, 250000)
+        self.assertFalse(response.context['cl'].show_full_result_count)
+
+
+class ExtracaoTests(TestCase):
+    def setUp(self):
+        self.economia = Tema.objects.create(nome='Economia', slug='economia')
+        self.politica = Tema.objects.create(nome='Política', slug='politica')
+        self.autor = Autor.objects.create(nome_completo='Rui Lima', apelido='rui')
+        self.editoriais = [
+            criar_editorial(f'Título "{i}", com vírgula', temas=[self.economia, self.politica][:1 + i % 2],
+                            autor=self.autor if i % 2 else None)
+            for i in range(5)
+        ]
+        for indice in range(3):
+            Newsletter.objects.create(email=f'leitor{indice}@exemplo.com').temas.set([self.politica])
+
+    def test_ndjson_em_lotes_com_temas_e_autor(self):
+        # Uma consulta para as linhas e uma por lote para os temas
+        with self.assertNumQueries(4):
+            conteudo = b''.join(extracao.gerar('editoriais', lote=2)).decode()
+        registros = [json.loads(linha) for linha in conteudo.splitlines()]
+        self.assertEqual([registro['id'] for registro in registros], [e.pk for e in self.editoriais])
+        self.assertEqual(registros[1]['temas'], ['economia', 'politica'])
+        self.assertEqual((registros[0]['autor'], registros[1]['autor']), (None, 'rui'))
+        self.assertEqual(registros[0]['titulo'], 'Título "0", com vírgula')
+
+    def test_comando_csv_gzip(self):
+        diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, diretorio)
+        destino = os.path.join(diretorio, 'inscritos.csv.gz')
+        call_command('exportar_dados', 'inscritos', '--formato', 'csv', '--saida', destino, '--lote', '2',
+                     stderr=StringIO())
+        with gzip.open(destino, 'rt', encoding='utf-8') as arquivo:
+            linhas = list(csv.DictReader(arquivo))
+        self.assertEqual(len(linhas), 3)
+        self.assertEqual(linhas[0]['temas'], 'politica')
+        self.assertEqual(linhas[0]['ativo'], 'True')
+
+        # Tabela vazia: só o cabeçalho
+        Tema.objects.all().delete()
+        conteudo = b''.join(extracao.gerar('temas', 'csv')).decode()
+        self.assertEqual(conteudo.strip(), 'id,nome,slug,descricao,ativo,criado_em,atualizado_em')
+
+    def test_endpoint_somente_equipe(self):
+        from django.contrib.auth.models import User
+        url = '/api/exportar/autores/'
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(User.objects.create_user('equipe', is_staff=True))
+
+        response = self.client.get(url, {'formato': 'csv', 'gzip': '1'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('.csv.gz"', response['Content-Disposition'])
+        conteudo = gzip.decompress(b''.join(response.streaming_content)).decode()
+        self.assertIn('rui', conteudo)
+        self.assertEqual(self.client.get('/api/exportar/usuarios/').status_code, 400)
+        self.assertEqual(self.client.get(url, {'formato': 'xml'}).status_code, 400)
+
+
+def gerar_imagem(largura, altura, formato='JPEG', modo='RGB', cor=(200, 30, 30)):
+    conteudo = io.BytesIO()
+    Image.new(modo, (largura, altura), cor).save(conteudo, formato)
+    return conteudo.getvalue()
+
+
+class VariantesImagensTests(TestCase):
+    def setUp(self):
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta, ignore_errors=True)
+        configuracao = override_settings(MEDIA_ROOT=pasta, IMAGENS_WORKERS=0, IMAGENS_LARGURAS=(320, 640, 1600))
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def test_variantes_geradas_apos_upload(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            editorial = criar_editorial(imagem1=SimpleUploadedFile('foto.jpg', gerar_imagem(2000, 1000)))
+        editorial.refresh_from_db()
+
+        info = editorial.variantes_imagens['imagem1']
+        self.assertEqual((info['largura'], info['altura']), (2000, 1000))
+        self.assertEqual([largura for largura, _ in info['variantes']['webp']], [320, 640, 1600])
+        self.assertEqual(set(info['variantes']), {'webp', 'jpeg'})
+        for _, caminho in info['variantes']['webp'] + info['variantes']['jpeg']:
+            self.assertTrue(default_storage.exists(caminho))
+
+        html = Template("{% load imagens %}{% imagem editorial 'imagem1' alt='Foto' class='card-img-top' %}").render(
+            Context({'editorial': editorial})
+        )
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('width="2000" height="1000"', html)
+        self.assertIn('loading="lazy"', html)
+        self.assertIn('-640.webp 640w', html)
+
+    def test_comando_processa_imagens_existentes(self):
+        nome = default_storage.save('autores/logo.png', ContentFile(gerar_imagem(200, 100, 'PNG', 'RGBA', (0, 0, 0, 0))))
+        autor = Autor.objects.create(nome_completo='Ana Lima', apelido='ana', resumo='Repórter')
+        Autor.objects.filter(pk=autor.pk).update(foto=nome)
+
+        call_command('gerar_variantes_imagens', '--workers', '1', stdout=StringIO())
+        autor.refresh_from_db()
+        info = autor.variantes_imagens['foto']
+        self.assertEqual(set(info['variantes']), {'webp', 'png'})
+        self.assertEqual([largura for largura, _ in info['variantes']['png']], [200])
+
+        # Imagem removida: as variantes são descartadas
+        autor.foto = None
+        with self.captureOnCommitCallbacks(execute=True):
+            autor.save()
+        autor.refresh_from_db()
+        self.assertEqual(autor.variantes_imagens, {})
+        self.assertFalse(default_storage.exists(info['variantes']['png'][0][1]))
+
+
+class PaginacaoCursorTests(TestCase):
+    def setUp(self):
+        caches['paginas'].clear()
+        self.tema = Tema.objects.create(nome='Economia', slug='economia')
+        # Metade no mesmo instante: o id desempata a ordem
+        agora = timezone.now()
+        self.editoriais = [
+            criar_editorial(f'Mercado {indice}', temas=[self.tema],
+                            data_publicacao=agora - timedelta(minutes=indice // 2))
+            for indice in range(30)
+        ]
+        self.esperado = [e.pk for e in sorted(self.editoriais, key=lambda e: (e.data_publicacao, e.pk), reverse=True)]
+
+    def percorrer(self, cursor=None, proxima=True):
+        """Segue os links de navegação a partir do cursor; retorna as páginas"""
+        paginas = []
+        url = '/tema/economia/' + (f'?cursor={cursor}' if cursor else '')
+        while url:
+            page_obj = self.client.get(url).context['page_obj']
+            paginas.append(page_obj)
+            continua = page_obj.has_next() if proxima else page_obj.has_previous()
+            url = '/tema/economia/' + (page_obj.url_proxima if proxima else page_obj.url_anterior) if continua else None
+        return paginas
+
+    def test_percorre_listagem_do_tema(self):
+        paginas = self.percorrer()
+        self.assertEqual([e.pk for p in paginas for e in p], self.esperado)
+        self.assertEqual([len(p) for p in paginas], [12, 12, 6])
+        self.assertFalse(paginas[0].has_previous())
+
+        # Da última página de volta à primeira (a página incompleta fica no início)
+        paginas = self.percorrer(paginacao.codificar_cursor(paginacao.ULTIMA), proxima=False)
+        self.assertEqual([len(p) for p in paginas], [12, 12, 6])
+        self.assertEqual([e.pk for p in reversed(paginas) for e in p], self.esperado)
+
+    def test_cursor_invalido_mostra_primeira_pagina(self):
+        response = self.client.get('/tema/economia/?cursor=adulterado&page=99')
+        self.assertEqual([e.pk for e in response.context['page_obj']], self.esperado[:12])
+
+    def test_busca_paginada_por_relevancia(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for editorial in self.editoriais:
+                editorial.save()
+        resultado = Editorial.buscar('mercado')
+        esperado = [e.pk for e in resultado[0:30]]
+
+        paginador = paginacao.PaginadorCursor(resultado, 7)
+        ids, cursor = [], None
+        while True:
+            pagina = paginador.pagina(cursor)
+            ids.extend(e.pk for e in pagina)
+            if not pagina.has_next():
+                break
+            cursor = pagina.cursor_proxima
+        self.assertEqual(ids, esperado)
+        self.assertEqual(paginador.count, 30)
+
+
+@override_settings(RELACIONADOS_QUANTIDADE=2)
+class RelacionadosTests(TestCase):
+    def setUp(self):
+        caches['paginas'].clear()
+        self.economia = Tema.objects.create(nome='Economia', slug='economia')
+        self.esporte = Tema.objects.create(nome='Esporte', slug='esporte')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.juros = criar_editorial('Banco Central sobe juros', 'A taxa de juros subiu para conter a inflação.',
+                                         temas=[self.economia])
+            self.inflacao = criar_editorial('Inflação desacelera', 'A inflação caiu com os juros altos.',
+                                            temas=[self.economia])
+            self.bolsa = criar_editorial('Bolsa em alta', 'O mercado de ações fechou em alta.', temas=[self.economia])
+            self.futebol = criar_editorial('Final do campeonato', 'O time venceu a final.', temas=[self.esporte])
+            relacionados.processar_pendentes()
+
+    def ids_relacionados(self, editorial):
+        return [e.pk for e in relacionados.relacionados(editorial)]
+
+    def test_pontuacao_por_tema_e_texto(self):
+        self.assertEqual(self.ids_relacionados(self.juros), [self.inflacao.pk, self.bolsa.pk])
+        self.assertEqual(self.ids_relacionados(self.futebol), [])
+        self.assertFalse(EditorialRelacionado.objects.filter(relacionado=self.futebol).exists())
+
+    def test_publicacao_entra_nas_listas_dos_candidatos(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            copom = criar_editorial('Juros e inflação: Copom decide', 'O Copom manteve os juros e a inflação recuou.',
+                                    temas=[self.economia])
+        # Salvar só põe o editorial na fila: o cálculo fica fora da requisição
+        self.assertEqual(list(RelacionadoPendente.objects.values_list('editorial_id', flat=True)), [copom.pk])
+        self.assertNotIn(copom.pk, self.ids_relacionados(self.juros))
+        with self.captureOnCommitCallbacks(execute=True):
+            relacionados.processar_pendentes()
+        self.assertIn(copom.pk, self.ids_relacionados(self.juros))
+        self.assertEqual(EditorialRelacionado.objects.filter(editorial=self.juros).count(), 2)
+
+        # Despublicado: sai das listas, que são completadas de novo
+        with self.captureOnCommitCallbacks(execute=True):
+            copom.desativar()
+            relacionados.processar_pendentes()
+        self.assertNotIn(copom.pk, self.ids_relacionados(self.juros))
+        self.assertEqual(len(self.ids_relacionados(self.juros)), 2)
+
+    def test_detalhe_le_relacionados_pre_calculados(self):
+        patcher = mock.patch.object(visualizacoes, 'contador', visualizacoes.ContadorVisualizacoes())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        response = self.client.get(f'/editorial/{self.juros.pk}/')
+        self.assertEqual([e.pk for e in response.context['editoriais_relacionados']], [self.inflacao.pk, self.bolsa.pk])
+
+    def test_comando_recalcula_tudo(self):
+        EditorialRelacionado.objects.all().delete()
+        call_command('calcular_relacionados', stdout=StringIO())
+        self.assertEqual(self.ids_relacionados(self.inflacao), [self.juros.pk, self.bolsa.pk])
+
+
+class EstaticosTests(TestCase):
+    def setUp(self):
+        self.raiz = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.raiz, ignore_errors=True)
+        armazenamentos = {
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+            'staticfiles': {'BACKEND': 'portal.estaticos.ArmazenamentoEstaticoComprimido'},
+        }
+        configuracao = override_settings(STATIC_ROOT=self.raiz, STORAGES=armazenamentos)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def test_collectstatic_grava_nomes_com_hash_e_copias_comprimidas(self):
+        if estaticos.brotli is None:
+            with self.assertLogs('portal.estaticos', 'WARNING'):
+                call_command('collectstatic', interactive=False, verbosity=0)
+        else:
+            call_command('collectstatic', interactive=False, verbosity=0)
+        with open(os.path.join(self.raiz, 'staticfiles.json')) as arquivo:
+            manifesto = json.load(arquivo)['paths']
+        css = manifesto['css/style.css']
+        self.assertRegex(css, r'^css/style\.[0-9a-f]{12}\.css$')
+
+        caminho = os.path.join(self.raiz, css)
+        with open(caminho, 'rb') as original, gzip.open(caminho + '.gz') as comprimido:
+            self.assertEqual(comprimido.read(), original.read())
+        self.assertEqual(os.path.exists(caminho + '.br'), estaticos.brotli is not None)
+        self.assertIn(css, Template('{% load static %}{% static "css/style.css" %}').render(Context()))
+
+    def test_arquivo_pequeno_nao_e_comprimido(self):
+        caminho = os.path.join(self.raiz, 'pequeno.css')
+        with open(caminho, 'w') as arquivo:
+            arquivo.write('a{color:red}')
+        self.assertEqual(estaticos.comprimir_arquivo(caminho), [])
+        self.assertFalse(os.path.exists(caminho + '.gz'))
+
+
+class ViewsAssincronasTests(TestCase):
+    """As views públicas servidas pelo handler ASGI"""
+
+    def setUp(self):
+        caches['paginas'].clear()
+        contexto.invalidar()
+        self.contador = visualizacoes.ContadorVisualizacoes()
+        patcher = mock.patch.object(visualizacoes, 'contador', self.contador)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        ConfiguracaoSite.get_config()
+        self.tema = Tema.objects.create(nome='Cultura', slug='cultura')
+        self.autor = Autor.objects.create(nome_completo='Ana Souza', apelido='ana', resumo='Jornalista')
+        self.editorial = criar_editorial('Festival de cinema', temas=[self.tema], autor=self.autor)
+        self.cliente = AsyncClient()
+
+    async def test_paginas_publicas(self):
+        urls = [
+            '/', '/tema/cultura/', f'/editorial/{self.editorial.pk}/', '/autor/ana/', '/autores/',
+            '/buscar/?q=cinema', '/api/temas/',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = await self.cliente.get(url)
+                self.assertEqual(response.status_code, 200)
+        self.assertContains(await self.cliente.get('/'), 'Festival de cinema')
+        self.assertEqual((await self.cliente.get('/tema/inexistente/')).status_code, 404)
+
+    async def test_server_timing_conta_as_consultas_da_view_assincrona(self):
+        response = await self.cliente.get('/tema/cultura/')
+        self.assertIn('desc="3 consultas"', response['Server-Timing'])
+
+    async def test_pagina_em_cache_e_304(self):
+        url = f'/editorial/{self.editorial.pk}/'
+        etag = (await self.cliente.get(url))['ETag']
+        self.assertEqual((await self.cliente.get(url, headers={'If-None-Match': etag})).status_code, 304)
+        self.assertEqual(self.contador.pendentes(self.editorial.pk), 2)
+
+    async def test_inscricao_e_cancelamento_da_newsletter(self):
+        response = await self.cliente.post(
+            '/api/inscrever-newsletter/', {'email': 'leitor@exemplo.com', 'temas': [self.tema.pk]}
+        )
+        self.assertTrue(response.json()['success'])
+        inscricao = await Newsletter.objects.aget(email='leitor@exemplo.com')
+        self.assertEqual([tema.pk async for tema in inscricao.temas.all()], [self.tema.pk])
+
+        response = await self.cliente.post('/api/cancelar-newsletter/', {'email': 'leitor@exemplo.com'})
+        self.assertTrue(response.json()['success'])
+        self.assertFalse((await Newsletter.objects.aget(email='leitor@exemplo.com')).ativo)
+
+
+class CargaTests(TestCase):
+    def test_percentil_pelo_posto_mais_proximo(self):
+        valores = list(range(1, 101))
+        self.assertEqual(carga.percentil(valores, 50), 50)
+        self.assertEqual(carga.percentil(valores, 99), 99)
+        self.assertEqual(carga.percentil(valores, 100), 100)
+        self.assertIsNone(carga.percentil([], 50))
+
+    def test_resumo_por_rota(self):
+        medicoes = carga.Medicoes()
+        for indice in range(10):
+            medicoes.registrar('home', 0.01 * (indice + 1))
+        medicoes.registrar('busca', 0.5, erro=True)
+        medicoes.duracao = 2.0
+        resumo = medicoes.resumo()
+        self.assertEqual(resumo['total']['requisicoes'], 11)
+        self.assertEqual(resumo['total']['erros'], 1)
+        self.assertEqual(resumo['rotas']['home']['vazao'], 5.0)
+        self.assertEqual(resumo['rotas']['home']['p99_ms'], 100.0)
+
+
+class MetricasTests(TestCase):
+    def setUp(self):
+        caches['paginas'].clear()
+        contexto.invalidar()
+        ConfiguracaoSite.get_config()
+        self.diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.diretorio, ignore_errors=True)
+        configuracao = override_settings(METRICAS_DIRETORIO=self.diretorio, METRICAS_INTERVALO=0)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        metricas.registro.reiniciar()
+        self.addCleanup(metricas.registro.reiniciar)
+        criar_editorial('Festival de cinema', temas=[Tema.objects.create(nome='Cultura', slug='cultura')])
+
+    def test_server_timing_traz_sql_e_template(self):
+        response = self.client.get('/tema/cultura/')
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^total;dur=[\d.]+, sql;dur=[\d.]+;desc="3 consultas", template;dur=[\d.]+$',
+        )
+
+    def test_cadeia_asgi_sem_thread(self):
+        # Um middleware só síncrono embrulharia a cadeia inteira em SyncToAsync
+        self.assertNotIsInstance(ASGIHandler()._middleware_chain, SyncToAsync)
+
+    async def test_server_timing_sob_asgi(self):
+        response = await AsyncClient().get('/tema/cultura/')
+        self.assertRegex(response['Server-Timing'], r'sql;dur=[\d.]+;desc="3 consultas"')
+
+    def test_metrics_soma_os_processos(self):
+        self.client.get('/')
+        self.client.get('/')
+        # Arquivo de outro worker
+        outro = metricas.Registro()
+        outro.incrementar('portal_requisicoes_total', {'rota': 'portal:home', 'metodo': 'GET', 'status': '200'})
+        outro.observar('portal_sql_consultas', {'rota': 'portal:home', 'metodo': 'GET'}, 7)
+        outro._arquivo = 'outro.json'
+        outro.gravar()
+
+        with override_settings(METRICAS_TOKEN='segredo'):
+            response = self.client.get('/metrics', headers={'Authorization': 'Bearer segredo'})
+        self.assertEqual(response['Content-Type'], metricas.CONTENT_TYPE)
+        texto = response.content.decode()
+        self.assertIn('portal_requisicoes_total{metodo="GET",rota="portal:home",status="200"} 3.0', texto)
+        self.assertIn('portal_sql_consultas_bucket{metodo="GET",rota="portal:home",le="5.0"} 2.0', texto)
+        self.assertIn('portal_sql_consultas_bucket{metodo="GET",rota="portal:home",le="10.0"} 3.0', texto)
+        self.assertIn('portal_sql_consultas_count{metodo="GET",rota="portal:home"} 3.0', texto)
+        self.assertIn('# TYPE portal_template_segundos histogram', texto)
+
+    def test_fork_descarta_os_dados_do_pai(self):
+        self.client.get('/')
+        self.assertTrue(metricas.registro.valores())
+        metricas.registro.reiniciar()
+        self.assertEqual(metricas.registro.valores(), {})
+
+    @override_settings(METRICAS_TOKEN='')
+    def test_sem_token_so_a_equipe(self):
+        from django.contrib.auth.models import User
+
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.client.force_login(User.objects.create_user('leitor'))
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.client.force_login(User.objects.create_user('equipe', is_staff=True))
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(METRICAS_TOKEN='segredo')
+    def test_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer segredo'})
+        self.assertEqual(response.status_code, 200)
+
+
+# Banco definido em config.settings_testes
+TEM_REPLICA_TESTE = 'replica_teste' in settings.DATABASES
+
+
+@skipUnless(TEM_REPLICA_TESTE, 'requer --settings=config.settings_testes')
+@override_settings(REPLICAS=['replica_teste'], REPLICAS_JANELA=10)
+class ReplicasTests(TestCase):
+    """O banco replica_teste é independente: o que só existe nele prova a leitura na réplica"""
+
+    databases = {'default', 'replica_teste'} if TEM_REPLICA_TESTE else {'default'}
+
+    def setUp(self):
+        ConfiguracaoSite.get_config()
+        self.tema = Tema.objects.create(nome='Cultura', slug='cultura')
+        Autor.objects.create(nome_completo='Ana no Primário', apelido='ana', resumo='')
+        Autor.objects.using('replica_teste').create(nome_completo='Bia na Réplica', apelido='bia', resumo='')
+        # Sem invalidações recentes
+        caches['paginas'].clear()
+        contexto.invalidar()
+
+    def test_views_publicas_leem_da_replica(self):
+        response = self.client.get('/autores/')
+        self.assertContains(response, 'Bia na Réplica')
+        self.assertNotContains(response, 'Ana no Primário')
+
+    async def test_views_assincronas_sob_asgi(self):
+        for url in ('/autores/', '/api/v1/autores/'):
+            with self.subTest(url=url):
+                response = await AsyncClient().get(url)
+                self.assertContains(response, 'Bia na R')
+                self.assertNotContains(response, 'Ana no Prim')
+        self.assertIsNone(replicas._replica.get())
+
+    def test_escrita_fixa_no_primario_pela_janela(self):
+        response = self.client.post('/api/inscrever-newsletter/', {'email': 'leitor@exemplo.com', 'temas': [self.tema.pk]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cookies[replicas.COOKIE]['max-age'], 10)
+        self.assertTrue(Newsletter.objects.using('default').filter(email='leitor@exemplo.com').exists())
+        caches['paginas'].clear()
+        self.assertContains(self.client.get('/autores/'), 'Ana no Primário')
+
+    async def test_middleware_assincrono_grava_o_cookie(self):
+        self.assertFalse(iscoroutinefunction(replicas.ReplicasMiddleware(lambda request: HttpResponse())))
+
+        async def view(request):
+            return HttpResponse()
+
+        middleware = replicas.ReplicasMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(RequestFactory().post('/'))
+        self.assertEqual(response.cookies[replicas.COOKIE]['max-age'], 10)
+
+    def test_invalidacao_recente_le_do_primario(self):
+        cache_paginas.invalidar('autores')
+        self.assertContains(self.client.get('/autores/'), 'Ana no Primário')
+
+    def test_escritas_e_cache_em_banco_usam_o_primario(self):
+        token = replicas._replica.set('replica_teste')
+        self.addCleanup(replicas._replica.reset, token)
+        roteador = replicas.RoteadorReplicas()
+        self.assertEqual(roteador.db_for_read(Autor), 'replica_teste')
+        self.assertEqual(roteador.db_for_write(Autor), 'default')
+        cache_em_banco = DatabaseCache('portal_cache_paginas', {})
+        self.assertEqual(roteador.db_for_read(cache_em_banco.cache_model_class), 'default')
+
+    @override_settings(REPLICAS=[])
+    def test_sem_replicas(self):
+        self.assertContains(self.client.get('/autores/'), 'Ana no Primário')
+        response = self.client.post('/api/inscrever-newsletter/', {'email': 'leitor@exemplo.com', 'temas': [self.tema.pk]})
+        self.assertNotIn(replicas.COOKIE, response.cookies)
+
+
+class ExportacaoTests(TestCase):
+    def setUp(self):
+        caches['paginas'].clear()
+        contexto.invalidar()
+        self.contador = visualizacoes.ContadorVisualizacoes()
+        patcher = mock.patch.object(visualizacoes, 'contador', self.contador)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, diretorio, ignore_errors=True)
+        configuracao = override_settings(EXPORTACAO_DIRETORIO=diretorio, EXPORTACAO_ATIVA=True)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        ConfiguracaoSite.get_config()
+        self.cultura = Tema.objects.create(nome='Cultura', slug='cultura')
+        self.esportes = Tema.objects.create(nome='Esportes', slug='esportes')
+        self.autor = Autor.objects.create(nome_completo='Ana Souza', apelido='ana', resumo='Jornalista')
+        self.festival = criar_editorial('Festival de cinema', temas=[self.cultura], autor=self.autor)
+        self.final = criar_editorial('Final do campeonato', temas=[self.esportes])
+        criar_editorial('Rascunho', status='rascunho', temas=[self.cultura])
+
+    def ler(self, caminho):
+        return exportacao.arquivo(caminho).read_text(encoding='utf-8')
+
+    def test_exporta_as_paginas_publicas(self):
+        call_command('exportar_site', '--workers', '1', stdout=StringIO())
+        self.assertEqual(
+            exportacao._existentes(),
+            {'/', '/tema/cultura/', '/tema/esportes/', '/autor/ana/',
+             f'/editorial/{self.festival.pk}/', f'/editorial/{self.final.pk}/'},
+        )
+        self.assertIn('Festival de cinema', self.ler('/'))
+        detalhe = self.ler(f'/editorial/{self.festival.pk}/')
+        assinatura = visualizacoes.assinatura(self.festival.pk)
+        self.assertIn(f"sendBeacon('/api/visualizacao/{self.festival.pk}/?t={assinatura}')", detalhe)
+        self.assertEqual(self.contador.pendentes(), 0)
+        # A página dinâmica conta no servidor, sem beacon
+        self.assertNotContains(self.client.get(f'/editorial/{self.festival.pk}/'), 'sendBeacon')
+
+    def test_publicar_regenera_so_as_paginas_afetadas(self):
+        call_command('exportar_site', '--workers', '1', stdout=StringIO())
+        esportes = self.ler('/tema/esportes/')
+        final = self.ler(f'/editorial/{self.final.pk}/')
+        with mock.patch.object(exportacao, 'renderizar', wraps=exportacao.renderizar) as renderizar:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.festival.titulo = 'Festival de teatro'
+                self.festival.save()
+            # Na requisição, as páginas só entram na fila
+            renderizar.assert_not_called()
+            self.assertEqual(exportacao.processar_pendentes(), 4)
+        self.assertFalse(PaginaPendente.objects.exists())
+        renderizadas = {chamada.args[0] for chamada in renderizar.call_args_list}
+        self.assertEqual(renderizadas, {'/', f'/editorial/{self.festival.pk}/', '/tema/cultura/', '/autor/ana/'})
+        self.assertIn('Festival de teatro', self.ler('/tema/cultura/'))
+        self.assertIn('Festival de teatro', self.ler(f'/editorial/{self.festival.pk}/'))
+        self.assertEqual(self.ler('/tema/esportes/'), esportes)
+        self.assertEqual(self.ler(f'/editorial/{self.final.pk}/'), final)
+
+    def test_desativar_remove_o_editorial(self):
+        call_command('exportar_site', '--workers', '1', stdout=StringIO())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.festival.ativo = False
+            self.festival.save()
+        exportacao.processar_pendentes()
+        self.assertFalse(exportacao.arquivo(f'/editorial/{self.festival.pk}/').exists())
+        self.assertNotIn('Festival de cinema', self.ler('/'))
+
+    def test_alterar_autor_regenera_todas_as_paginas_de_autor(self):
+        bia = Autor.objects.create(nome_completo='Bia Lima', apelido='bia', resumo='Colunista')
+        call_command('exportar_site', '--workers', '1', stdout=StringIO())
+        self.assertIn('/autor/bia/', self.ler('/autor/ana/'))
+        with self.captureOnCommitCallbacks(execute=True):
+            bia.ativo = False
+            bia.save()
+        self.assertEqual(
+            set(PaginaPendente.objects.values_list('caminho', flat=True)), {'/autor/ana/', '/autor/bia/'}
+        )
+        exportacao.processar_pendentes()
+        self.assertNotIn('/autor/bia/', self.ler('/autor/ana/'))
+        self.assertFalse(exportacao.arquivo('/autor/bia/').exists())
+
+    def test_alterar_a_navegacao_descarta_a_exportacao(self):
+        call_command('exportar_site', '--workers', '1', stdout=StringIO())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.esportes.nome = 'Esporte'
+            self.esportes.save()
+        self.assertEqual(exportacao._existentes(), set())
+
+    def test_beacon_registra_a_visualizacao(self):
+        assinatura = visualizacoes.assinatura(self.festival.pk)
+        with self.assertNumQueries(0):
+            response = self.client.post(f'/api/visualizacao/{self.festival.pk}/?t={assinatura}')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.contador.pendentes(self.festival.pk), 1)
+
+    def test_beacon_recusa_ids_sem_o_token_da_pagina(self):
+        outro = visualizacoes.assinatura(self.final.pk)
+        for url in (
+            f'/api/visualizacao/{self.festival.pk}/',
+            f'/api/visualizacao/{self.festival.pk}/?t=invalido',
+            f'/api/visualizacao/{self.festival.pk}/?t={outro}',
+            '/api/visualizacao/999999/',
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.post(url).status_code, 403)
+        self.assertEqual(self.contador.pendentes(), 0)
+
+
+class MassaTests(TestCase):
+    def test_mesma_semente_gera_os_mesmos_dados(self):
+        quantidades = massa.gerar(20, temas=3, autores=4, inscritos=5, semente=7)
+        self.assertEqual(quantidades, {'temas': 3, 'autores': 4, 'editoriais': 20, 'inscritos': 5})
+        self.assertEqual(Editorial.objects.publicados().count(), 20)
+        self.assertFalse(Editorial.objects.filter(temas__isnull=True).exists())
+        titulos = list(Editorial.objects.order_by('pk').values_list('titulo', flat=True))
+
+        Editorial.objects.all().delete()
+        massa.gerar(20, temas=3, autores=4, semente=7)
+        self.assertEqual(list(Editorial.objects.order_by('pk').values_list('titulo', flat=True)), titulos)
+
+    def test_titulos_sao_unicos(self):
+        base = massa.textos(7)
+        titulos = [base.titulo(indice) for indice in range(5000)]
+        self.assertEqual(len(set(titulos)), len(titulos))
+        self.assertNotEqual(base.titulo(base.combinacoes), base.titulo(0))
+
+    def test_popular_dados_continua_a_numeracao(self):
+        with mock.patch.object(massa, 'TAMANHO_LOTE', 4):
+            call_command(
+                'popular_dados', '--editoriais', '10', '--temas', '2', '--autores', '2', '--inscritos', '3',
+                '--seed', '3', stdout=StringIO(),
+            )
+            call_command(
+                'popular_dados', '--editoriais', '5', '--temas', '2', '--autores', '1', '--inscritos', '2',
+                '--seed', '3', stdout=StringIO(),
+            )
+        self.assertEqual(Editorial.objects.count(), 15)
+        self.assertEqual(Editorial.objects.values('titulo').distinct().count(), 15)
+        self.assertEqual(Tema.objects.count(), 2)
+        self.assertEqual(Autor.objects.count(), 3)
+        self.assertEqual(Newsletter.objects.filter(email__endswith='@massa.exemplo').count(), 5)
+
+    def test_limpar_apaga_sem_o_coletor_do_orm(self):
+        massa.gerar(12, temas=3, autores=2, inscritos=4, semente=5)
+        call_command('reindexar_busca', '--workers', '1', stdout=StringIO())
+        leitor = Newsletter.objects.create(email='leitor@exemplo.com')
+        leitor.temas.set(Tema.objects.all()[:1])
+        with mock.patch('portal.signals.tags_editoriais') as tags_editoriais, \
+                self.assertNumQueries(13):
+            massa.limpar()
+        tags_editoriais.assert_not_called()
+        self.assertFalse(Editorial.objects.exists() or Tema.objects.exists() or DocumentoBusca.objects.exists())
+        self.assertEqual(list(Newsletter.objects.values_list('email', flat=True)), ['leitor@exemplo.com'])
+
+
+class BenchmarkTests(LiveServerTestCase):
+    def test_mede_as_rotas_e_grava_o_resultado(self):
+        caches['paginas'].clear()
+        contexto.invalidar()
+        saida = os.path.join(tempfile.mkdtemp(), 'resultado.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(saida), ignore_errors=True)
+        with mock.patch.object(visualizacoes, 'contador', visualizacoes.ContadorVisualizacoes()):
+            call_command(
+                'benchmark', '--semear', '--editoriais', '30', '--temas', '3', '--autores', '3',
+                '--url', self.live_server_url, '--requisicoes', '40', '--aquecimento', '0',
+                '--concorrencia', '1', '--profundidade', '5', '--saida', saida, stdout=StringIO(),
+            )
+        with open(saida) as arquivo:
+            resultado = json.load(arquivo)
+        self.assertEqual(resultado['massa']['editoriais'], 30)
+        self.assertEqual(resultado['total']['requisicoes'], 40)
+        self.assertEqual(resultado['total']['erros'], 0)
+        self.assertEqual(resultado['rotas']['home']['consultas'], 2)
+        self.assertIn('p99_ms', resultado['rotas']['detalhe'])
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = 'portal'
 
@@ -10,7 +10,21 @@ urlpatterns = [
     path('buscar/', views.buscar, name='buscar'),
     path('autores/', views.listar_autores, name='autores'),
     path('autor/<str:apelido>/', views.detalhe_autor, name='detalhe_autor'),
+    path('sitemap.xml', views.sitemap_indice, name='sitemap'),
+    path('sitemap-paginas.xml', views.sitemap_paginas, name='sitemap_paginas'),
+    path('sitemap-tema-<slug:tema_slug>-<int:pagina>.xml', views.sitemap_tema, name='sitemap_tema'),
+    path('feed/<str:formato>/', views.feed_editoriais, name='feed'),
+    path('tema/<slug:tema_slug>/feed/<str:formato>/', views.feed_tema, name='feed_tema'),
+    path('autor/<str:apelido>/feed/<str:formato>/', views.feed_autor, name='feed_autor'),
     path('api/inscrever-newsletter/', views.inscrever_newsletter, name='inscrever_newsletter'),
     path('api/cancelar-newsletter/', views.cancelar_newsletter, name='cancelar_newsletter'),
     path('api/temas/', views.listar_temas_api, name='listar_temas'),
+    path('api/visualizacao/<int:pk>/', views.registrar_visualizacao, name='registrar_visualizacao'),
+    path('api/cache/estatisticas/', views.estatisticas_cache_api, name='estatisticas_cache'),
+    path('api/exportar/<str:tabela>/', views.exportar_dados_api, name='exportar_dados'),
+    path('api/v1/editoriais/', api.editoriais, name='api_editoriais'),
+    path('api/v1/editoriais/<int:pk>/', api.editorial, name='api_editorial'),
+    path('api/v1/temas/', api.temas, name='api_temas'),
+    path('api/v1/autores/', api.autores, name='api_autores'),
+    path('api/v1/autores/<str:apelido>/', api.autor, name='api_autor'),
 ]
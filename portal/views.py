@@ -1,76 +1,96 @@
-from django.shortcuts import render, get_object_or_404
-from django.core.paginator import Paginator
+import logging
+import os
+
+from asgiref.sync import sync_to_async
+from django.contrib.admin.views.decorators import staff_member_required
+from django.shortcuts import render, aget_object_or_404
 from django.db.models import Q
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
-from .models import Editorial, Tema, Autor, ConfiguracaoSite, Newsletter
+from .models import Editorial, Tema, Autor
+from . import cache_paginas, extracao, feeds, fluxo, inscricoes, paginacao, relacionados, sitemaps, visualizacoes
+from .cache_paginas import cache_pagina
+from .contexto import contexto
+from .orcamento import orcamento_consultas
+from .replicas import ler_de_replica
+
+logger = logging.getLogger(__name__)
+
+# As views públicas são assíncronas. A renderização roda em thread: os context
+# processors e os templates ainda podem consultar o banco (contexto do site,
+# querysets preguiçosos), o que não é permitido no event loop.
+arender = sync_to_async(render)
 
 
-def home(request):
+@ler_de_replica
+@orcamento_consultas(2)
+@cache_pagina('home')
+async def home(request):
     """Página inicial com os últimos editoriais"""
-    editoriais = Editorial.obter_publicados()[:10]
-    temas = Tema.objects.filter(ativo=True)
-    site_config = ConfiguracaoSite.get_config()
+    editoriais = [editorial async for editorial in Editorial.obter_publicados()[:10]]
     
     context = {
         'editoriais': editoriais,
-        'temas': temas,
-        'site_config': site_config,
         'pagina_atual': 'home',
     }
-    return render(request, 'portal/home.html', context)
+    return await arender(request, 'portal/home.html', context)
 
 
-def editoriais_por_tema(request, tema_slug):
+@ler_de_replica
+@orcamento_consultas(3)
+@cache_pagina()
+async def editoriais_por_tema(request, tema_slug):
     """Exibe editoriais de um tema específico"""
-    tema = get_object_or_404(Tema, slug=tema_slug, ativo=True)
+    tema = await aget_object_or_404(Tema, slug=tema_slug, ativo=True)
+    cache_paginas.marcar(request, f'tema:{tema.pk}')
     editoriais = Editorial.obter_por_tema(tema_slug)
     
-    # Paginação
-    paginator = Paginator(editoriais, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    temas = Tema.objects.filter(ativo=True)
+    # Paginação por cursor (data de publicação, id)
+    page_obj = await paginacao.apaginar(request, editoriais, 12)
     
     context = {
         'tema': tema,
         'page_obj': page_obj,
         'editoriais': page_obj.object_list,
-        'temas': temas,
         'pagina_atual': 'tema',
     }
-    return render(request, 'portal/tema.html', context)
+    return await arender(request, 'portal/tema.html', context)
 
 
-def detalhe_editorial(request, pk):
+@ler_de_replica
+@orcamento_consultas(3)
+@visualizacoes.contar_visualizacao
+@cache_pagina()
+async def detalhe_editorial(request, pk):
     """Exibe o detalhe completo de um editorial"""
-    editorial = get_object_or_404(Editorial, pk=pk, status='publicado', ativo=True)
-    
-    # Incrementar visualizações
-    editorial.visualizacoes += 1
-    editorial.save(update_fields=['visualizacoes'])
+    editorial = await aget_object_or_404(Editorial.objects.feed(), pk=pk, status='publicado', ativo=True)
+    temas_ids = [tema.pk for tema in editorial.temas.all()]
     
-    # Editoriais relacionados (mesmo tema)
-    editoriais_relacionados = Editorial.obter_publicados().filter(
-        temas__in=editorial.temas.all()
-    ).exclude(pk=editorial.pk)[:4]
+    # Editoriais relacionados pré-calculados (portal.relacionados)
+    editoriais_relacionados = await relacionados.arelacionados(editorial, 4)
     
-    temas = Tema.objects.filter(ativo=True)
-    site_config = ConfiguracaoSite.get_config()
+    # A página muda com o editorial, seu autor e os temas (relacionados)
+    cache_paginas.marcar(
+        request,
+        f'editorial:{editorial.pk}',
+        f'autor:{editorial.autor_id}',
+        *[f'tema:{tema_id}' for tema_id in temas_ids],
+    )
     
     context = {
         'editorial': editorial,
         'editoriais_relacionados': editoriais_relacionados,
-        'temas': temas,
-        'site_config': site_config,
         'pagina_atual': 'detalhe',
     }
-    return render(request, 'portal/detalhe.html', context)
+    if getattr(request, 'exportacao', False):
+        context['assinatura_visualizacao'] = visualizacoes.assinatura(editorial.pk)
+    return await arender(request, 'portal/detalhe.html', context)
 
 
-def buscar(request):
+@ler_de_replica
+@orcamento_consultas(4)
+async def buscar(request):
     """Busca de editoriais"""
     query = request.GET.get('q', '')
     resultados = []
@@ -78,160 +98,240 @@ def buscar(request):
     if query:
         resultados = Editorial.buscar(query)
         
-        # Paginação
-        paginator = Paginator(resultados, 12)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
+        # Paginação por cursor (relevância, data de publicação, id)
+        page_obj = await paginacao.apaginar(request, resultados, 12)
     else:
         page_obj = None
     
-    temas = Tema.objects.filter(ativo=True)
-    
     context = {
         'query': query,
         'page_obj': page_obj,
-        'temas': temas,
         'pagina_atual': 'busca',
     }
-    return render(request, 'portal/busca.html', context)
+    return await arender(request, 'portal/busca.html', context)
 
 
-def listar_autores(request):
+@ler_de_replica
+@orcamento_consultas(1)
+async def listar_autores(request):
     """Exibe lista de todos os autores"""
-    autores = Autor.objects.filter(ativo=True).order_by('nome_completo')
+    autores = Autor.objects.filter(ativo=True)
     
-    # Paginação
-    paginator = Paginator(autores, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    temas = Tema.objects.filter(ativo=True)
+    # Paginação por cursor (nome, id)
+    page_obj = await paginacao.apaginar(request, autores, 12, ordenacao=('nome_completo', 'id'))
     
     context = {
         'page_obj': page_obj,
         'autores': page_obj.object_list,
-        'temas': temas,
         'pagina_atual': 'autores',
     }
-    return render(request, 'portal/autores.html', context)
+    return await arender(request, 'portal/autores.html', context)
 
 
-def detalhe_autor(request, apelido):
+@ler_de_replica
+@orcamento_consultas(4)
+@cache_pagina('autores')
+async def detalhe_autor(request, apelido):
     """Exibe detalhes do autor e seus editoriais"""
-    autor = get_object_or_404(Autor, apelido=apelido, ativo=True)
+    autor = await aget_object_or_404(Autor, apelido=apelido, ativo=True)
+    cache_paginas.marcar(request, f'autor:{autor.pk}')
     
     # Editoriais do autor
     editoriais = Editorial.obter_publicados().filter(autor=autor)
     
-    # Paginação
-    paginator = Paginator(editoriais, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Paginação por cursor (data de publicação, id)
+    page_obj = await paginacao.apaginar(request, editoriais, 12)
     
     # Outros autores (excluir o atual)
-    outros_autores = Autor.objects.filter(ativo=True).exclude(pk=autor.pk)
-    temas = Tema.objects.filter(ativo=True)
+    outros_autores = [outro async for outro in Autor.objects.filter(ativo=True).exclude(pk=autor.pk)]
     
     context = {
         'autor': autor,
         'page_obj': page_obj,
         'editoriais': page_obj.object_list,
         'outros_autores': outros_autores,
-        'temas': temas,
         'pagina_atual': 'detalhe_autor',
     }
-    return render(request, 'portal/detalhe_autor.html', context)
+    return await arender(request, 'portal/detalhe_autor.html', context)
+
+
+@ler_de_replica
+@orcamento_consultas(1)
+@cache_pagina('home')
+async def sitemap_indice(request):
+    """Índice dos sitemaps (portal.sitemaps)"""
+    xml = await sync_to_async(sitemaps.indice)(sitemaps.raiz(request))
+    return HttpResponse(xml, content_type='application/xml')
+
+
+@ler_de_replica
+@orcamento_consultas(1)
+@cache_pagina('autores')
+async def sitemap_paginas(request):
+    """Sitemap da home, dos temas e dos autores"""
+    temas = await sync_to_async(contexto.temas)()
+    xml = await sync_to_async(sitemaps.paginas)(sitemaps.raiz(request), temas)
+    return HttpResponse(xml, content_type='application/xml')
+
+
+@ler_de_replica
+@orcamento_consultas(1)
+async def sitemap_tema(request, tema_slug, pagina):
+    """Sitemap dos editoriais de um tema, gerado em fluxo"""
+    tema = next((tema for tema in await sync_to_async(contexto.temas)() if tema.slug == tema_slug), None)
+    if tema is None or pagina < 1:
+        raise Http404('Sitemap não encontrado')
+    nao_modificada, versoes_tags = await sync_to_async(cache_paginas.verificar_condicional)(
+        request, [f'tema:{tema.pk}']
+    )
+    if nao_modificada is not None:
+        return nao_modificada
+    if not await sync_to_async(sitemaps.pagina_existe)(tema, pagina):
+        raise Http404('Sitemap não encontrado')
+    response = fluxo.resposta_em_fluxo(
+        request, sitemaps.gerar_tema(sitemaps.raiz(request), tema, pagina), 'application/xml'
+    )
+    if versoes_tags is None:
+        return response
+    return cache_paginas.responder_condicional(request, response, versoes_tags)
+
+
+@ler_de_replica
+@orcamento_consultas(2)
+@cache_pagina('home')
+def feed_editoriais(request, formato):
+    """Feed RSS/Atom dos últimos editoriais (portal.feeds)"""
+    return feeds.obter('editoriais', formato)(request)
+
+
+@ler_de_replica
+@orcamento_consultas(2)
+@cache_pagina()
+def feed_tema(request, tema_slug, formato):
+    return feeds.obter('tema', formato)(request, tema_slug=tema_slug)
+
+
+@ler_de_replica
+@orcamento_consultas(3)
+@cache_pagina()
+def feed_autor(request, apelido, formato):
+    return feeds.obter('autor', formato)(request, apelido=apelido)
 
 
 @require_http_methods(["POST"])
 @csrf_exempt
-def inscrever_newsletter(request):
-    """API para inscrição na newsletter"""
+async def inscrever_newsletter(request):
+    """API para inscrição na newsletter (um upsert; ver portal.inscricoes)"""
+    email = request.POST.get('email', '').strip()
+    if not email:
+        return JsonResponse({'success': False, 'error': 'Email é obrigatório'})
+    email = inscricoes.normalizar_email(email)
+    if email is None:
+        return JsonResponse({'success': False, 'error': 'Email inválido'})
+
     try:
-        email = request.POST.get('email', '').strip()
-        temas_ids = request.POST.getlist('temas', [])
-        
-        if not email:
-            return JsonResponse({'success': False, 'error': 'Email é obrigatório'})
-        
-        # Verificar se email já existe e está ativo
-        try:
-            newsletter = Newsletter.objects.get(email=email)
-            
-            # Se já está ativo, informar que já está assinando
-            if newsletter.ativo:
-                return JsonResponse({
-                    'success': False,
-                    'error': 'Este email já está assinando a newsletter.',
-                    'already_subscribed': True,
-                    'email': email
-                })
-            
-            # Se estava inativo, reativar
-            newsletter.ativo = True
-            if temas_ids:
-                newsletter.temas.set(temas_ids)
-            newsletter.save()
-            
-            return JsonResponse({
-                'success': True,
-                'message': 'Bem-vindo de volta à nossa newsletter!',
-                'created': False
-            })
-        
-        except Newsletter.DoesNotExist:
-            # Criar nova inscrição
-            newsletter = Newsletter.objects.create(
-                email=email,
-                ativo=True
-            )
-            
-            # Adicionar temas
-            if temas_ids:
-                newsletter.temas.set(temas_ids)
-            
-            return JsonResponse({
-                'success': True,
-                'message': 'Bem-vindo à nossa newsletter!',
-                'created': True
-            })
-    
-    except Exception as e:
-        return JsonResponse({'success': False, 'error': str(e)})
+        situacao, _ = await sync_to_async(inscricoes.inscrever)(
+            email, inscricoes.ids_temas(request.POST.getlist('temas', []))
+        )
+    except Exception:
+        logger.exception('Falha ao inscrever %s na newsletter', email)
+        return JsonResponse({'success': False, 'error': 'Não foi possível concluir a inscrição.'}, status=500)
+
+    if situacao == inscricoes.JA_ATIVA:
+        return JsonResponse({
+            'success': False,
+            'error': 'Este email já está assinando a newsletter.',
+            'already_subscribed': True,
+            'email': email
+        })
+    if situacao == inscricoes.REATIVADA:
+        return JsonResponse({
+            'success': True,
+            'message': 'Bem-vindo de volta à nossa newsletter!',
+            'created': False
+        })
+    return JsonResponse({
+        'success': True,
+        'message': 'Bem-vindo à nossa newsletter!',
+        'created': True
+    })
 
 
 @require_http_methods(["POST"])
 @csrf_exempt
-def cancelar_newsletter(request):
-    """API para cancelar inscrição na newsletter"""
+async def cancelar_newsletter(request):
+    """API para cancelar inscrição na newsletter (um UPDATE)"""
+    email = request.POST.get('email', '').strip()
+    if not email:
+        return JsonResponse({'success': False, 'error': 'Email é obrigatório'})
+
     try:
-        email = request.POST.get('email', '').strip()
-        
-        if not email:
-            return JsonResponse({'success': False, 'error': 'Email é obrigatório'})
-        
-        # Encontrar e desativar inscrição
-        try:
-            newsletter = Newsletter.objects.get(email=email)
-            newsletter.ativo = False
-            newsletter.save()
-            
-            return JsonResponse({
-                'success': True,
-                'message': 'Sua assinatura foi cancelada. Sentiremos sua falta!'
-            })
-        except Newsletter.DoesNotExist:
-            return JsonResponse({
-                'success': False,
-                'error': 'Email não encontrado na newsletter.'
-            })
-    
-    except Exception as e:
-        return JsonResponse({'success': False, 'error': str(e)})
+        cancelada = await sync_to_async(inscricoes.cancelar)(inscricoes.normalizar_email(email) or email)
+    except Exception:
+        logger.exception('Falha ao cancelar a inscrição de %s', email)
+        return JsonResponse({'success': False, 'error': 'Não foi possível cancelar a inscrição.'}, status=500)
 
+    if not cancelada:
+        return JsonResponse({
+            'success': False,
+            'error': 'Email não encontrado na newsletter.'
+        })
+    return JsonResponse({
+        'success': True,
+        'message': 'Sua assinatura foi cancelada. Sentiremos sua falta!'
+    })
 
+
+@ler_de_replica
+@orcamento_consultas(0)
 @require_http_methods(["GET"])
-def listar_temas_api(request):
+@cache_paginas.condicional('navegacao')
+async def listar_temas_api(request):
     """API para listar temas (usado no modal)"""
-    temas = Tema.objects.filter(ativo=True).values('id', 'nome')
-    return JsonResponse({'temas': list(temas)})
+    temas = [{'id': tema.id, 'nome': tema.nome} for tema in await sync_to_async(contexto.temas)()]
+    return JsonResponse({'temas': temas})
+
+
+@require_http_methods(["POST"])
+@csrf_exempt
+def registrar_visualizacao(request, pk):
+    """
+    Beacon das páginas exportadas (portal.exportacao); não acessa o banco.
+    Recusa os ids sem o token assinado da página exportada.
+    """
+    if not visualizacoes.assinatura_valida(pk, request.GET.get('t', '')):
+        return HttpResponse(status=403)
+    visualizacoes.registrar(pk)
+    return HttpResponse(status=204)
+
+
+@staff_member_required
+@require_http_methods(["GET"])
+def estatisticas_cache_api(request):
+    """API com hits e misses do cache de páginas neste processo (somente equipe)"""
+    return JsonResponse({
+        'pid': os.getpid(),
+        'rotas': cache_paginas.estatisticas(),
+    })
+
+
+@staff_member_required
+@require_http_methods(["GET"])
+def exportar_dados_api(request, tabela):
+    """Exportação em fluxo de uma tabela (portal.extracao); ?formato=csv e ?gzip=1"""
+    formato = request.GET.get('formato', 'ndjson')
+    comprimir = request.GET.get('gzip') in ('1', 'true', 'sim')
+    try:
+        blocos = extracao.gerar(tabela, formato, comprimir)
+    except ValueError as erro:
+        return JsonResponse({'error': str(erro)}, status=400)
+    return fluxo.resposta_em_fluxo(
+        request,
+        blocos,
+        'application/gzip' if comprimir else extracao.FORMATOS[formato],
+        headers={
+            'Content-Disposition': f'attachment; filename="{extracao.nome_arquivo(tabela, formato, comprimir)}"',
+            # O nginx repassa os blocos à medida que chegam, sem juntar a resposta em disco
+            'X-Accel-Buffering': 'no',
+        },
+    )
@@ -0,0 +1,171 @@
+"""
+Contador de visualizações com buffer em memória.
+
+Cada processo acumula as visualizações em um Counter e uma thread em segundo
+plano grava o acumulado periodicamente, em UPDATEs em lote do tipo
+``visualizacoes = visualizacoes + CASE id WHEN ... END``. A página do
+editorial não faz nenhuma escrita e não há perda de atualizações entre
+workers, pois o incremento é feito pelo banco.
+
+As páginas exportadas contam pelo beacon, que só aceita o token assinado
+(``assinatura``) gravado na página de cada editorial: ids arbitrários não
+entram no buffer, e a validação não acessa o banco.
+
+O buffer herdado em um fork é descartado no processo filho (ele pertence ao
+pai), e o que estiver pendente é gravado na saída do processo; uma gravação
+que falha devolve ao buffer só os lotes não aplicados, sem contagem dupla.
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import Counter
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, F, Value, When
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_LOTE = 500
+
+
+def gravar(pendentes):
+    """
+    Soma as visualizações pendentes ({editorial_id: quantidade}) no banco.
+
+    Retorna os itens que não puderam ser gravados.
+    """
+    from .models import Editorial
+
+    itens = sorted(pendentes.items())
+    for inicio in range(0, len(itens), TAMANHO_LOTE):
+        lote = itens[inicio:inicio + TAMANHO_LOTE]
+        try:
+            Editorial.objects.filter(pk__in=[pk for pk, _ in lote]).update(
+                visualizacoes=F('visualizacoes') + Case(
+                    *[When(pk=pk, then=Value(quantidade)) for pk, quantidade in lote],
+                    default=Value(0),
+                )
+            )
+        except Exception:
+            logger.exception('Falha ao gravar visualizações; mantidas no buffer')
+            return Counter(dict(itens[inicio:]))
+    return Counter()
+
+
+class ContadorVisualizacoes:
+    """Acumula visualizações por editorial e grava em lote periodicamente"""
+
+    def __init__(self):
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Descarta o buffer (usado no processo filho após um fork)"""
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._pendentes = Counter()
+        self._thread = None
+
+    @property
+    def intervalo(self):
+        return getattr(settings, 'VISUALIZACOES_INTERVALO_FLUSH', 10)
+
+    @property
+    def limite(self):
+        return getattr(settings, 'VISUALIZACOES_LIMITE_BUFFER', 1000)
+
+    def registrar(self, editorial_id, quantidade=1):
+        """Registra visualizações sem acessar o banco"""
+        with self._lock:
+            self._pendentes[editorial_id] += quantidade
+            cheio = len(self._pendentes) >= self.limite
+        self._garantir_thread()
+        if cheio:
+            self._acordar.set()
+
+    def pendentes(self, editorial_id=None):
+        with self._lock:
+            if editorial_id is None:
+                return sum(self._pendentes.values())
+            return self._pendentes[editorial_id]
+
+    def descarregar(self):
+        """Grava o buffer no banco; retorna quantas visualizações foram gravadas"""
+        with self._lock:
+            pendentes, self._pendentes = self._pendentes, Counter()
+        if not pendentes:
+            return 0
+        restantes = gravar(pendentes)
+        if restantes:
+            with self._lock:
+                self._pendentes.update(restantes)
+        return sum(pendentes.values()) - sum(restantes.values())
+
+    def _garantir_thread(self):
+        if self._thread is not None or self.intervalo <= 0:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._executar, name='contador-visualizacoes', daemon=True
+            )
+            self._thread.start()
+
+    def _executar(self):
+        while True:
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+            try:
+                self.descarregar()
+            finally:
+                connection.close()
+
+
+contador = ContadorVisualizacoes()
+
+# O buffer herdado no fork pertence ao processo pai; o do processo é gravado na saída
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=contador.reiniciar)
+atexit.register(contador.descarregar)
+
+
+def registrar(editorial_id):
+    contador.registrar(editorial_id)
+
+
+def assinatura(editorial_id):
+    """Token do beacon gravado na página exportada do editorial"""
+    return salted_hmac('portal.visualizacoes', str(editorial_id)).hexdigest()[:20]
+
+
+def assinatura_valida(editorial_id, token):
+    return constant_time_compare(assinatura(editorial_id), token)
+
+
+def contar_visualizacao(view):
+    """
+    Decorator das views de detalhe: registra a visualização de ``pk`` quando
+    a página é servida, inclusive a partir do cache de páginas ou com 304.
+    As páginas exportadas (portal.exportacao) contam pelo beacon.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, pk, *args, **kwargs):
+            response = await view(request, pk, *args, **kwargs)
+            if response.status_code in (200, 304) and not getattr(request, 'exportacao', False):
+                registrar(pk)
+            return response
+    else:
+        @wraps(view)
+        def wrapper(request, pk, *args, **kwargs):
+            response = view(request, pk, *args, **kwargs)
+            if response.status_code in (200, 304) and not getattr(request, 'exportacao', False):
+                registrar(pk)
+            return response
+
+    return wrapper
@@ -0,0 +1,26 @@
+/**
+ * Filtros do admin com busca (portal.admin_listas.FiltroAutocomplete)
+ * Ao escolher um item no autocomplete, recarrega a listagem filtrada
+ */
+
+(function($) {
+    'use strict';
+
+    $(function() {
+        $('.filtro-autocomplete').each(function() {
+            const filtro = $(this);
+            filtro.find('select').on('change', function() {
+                // data-url é a listagem sem este filtro ("?" + demais parâmetros)
+                const url = filtro.data('url');
+                const valor = $(this).val();
+                if (!valor) {
+                    window.location = url;
+                    return;
+                }
+                const separador = url.endsWith('?') ? '' : '&';
+                window.location = url + separador + encodeURIComponent(filtro.data('parametro')) +
+                    '=' + encodeURIComponent(valor);
+            });
+        });
+    });
+})(django.jQuery);